@@ -89,6 +89,7 @@ setup(
         ],
         'extras': [
             'setproctitle',
+            'lz4',
         ]
     },
     setup_requires=[
@@ -7,5 +7,12 @@
 # @date: 2019-10-16 19:28
 # @version: 1.0
 #
+from ._base import AtomicInteger, ShardedCounter, SharedCounter, SharedInteger
 from ._thread import ThreadWrapper
 from ._process import ProcessWrapper
+from ._consumer import EMPTY, ConsumerProcessWrapper, ConsumerThreadWrapper, ConsumerWrapperMixin
+from ._consumer import PopSource, ProcessQueueSource, PublisherSource, QueueSource
+from ._metrics import StreamingHistogram, WorkerMetrics
+from ._schedule import TickScheduler
+from ._supervisor import ProcessPoolSupervisor
+from ._pipeline import BoundedQueue, Pipeline, ProcessBoundedQueue, QueuePolicy
@@ -7,16 +7,25 @@
 # @date: 2019-10-16 19:52
 # @version: 1.0
 #
+import ctypes
+import math
+import multiprocessing
+import os
 import threading
 import time
+import weakref
 
 from evision.lib.log import logutil
+from evision.lib.resource.cpu import CpuAllocator, set_affinity
 from evision.lib.util import SysUtil
+from ._metrics import WorkerMetrics
+from ._schedule import TickScheduler
 
 logger = logutil.get_logger()
 
 __all__ = [
-    'AtomicInteger', 'ParallelWrapperMixin'
+    'AtomicInteger', 'SharedInteger', 'ShardedCounter', 'SharedCounter',
+    'ParallelWrapperMixin'
 ]
 
 
@@ -48,26 +57,206 @@ class AtomicInteger(object):
             self._value = v
 
 
+class SharedInteger(object):
+    """`AtomicInteger` in shared memory, visible to parent and child processes"""
+
+    def __init__(self, value=0, context=None):
+        self._value = (context or multiprocessing).Value(ctypes.c_longlong, value)
+
+    def add(self, value=1):
+        with self._value.get_lock():
+            self._value.value += value
+            return self._value.value
+
+    count = add
+
+    def minus(self, value=1):
+        return self.add(-value)
+
+    @property
+    def value(self):
+        return self._value.value
+
+    @value.setter
+    def value(self, v):
+        self._value.value = v
+
+
+class ShardedCounter(object):
+    """Counter with a cell per thread, adding without locks
+
+    Each thread only writes its own cell, reading sums up cells of all
+    threads, with cells of finished threads folded once they exit. Unlike
+    `AtomicInteger`, `add` does not return the new value, and setting value
+    is not atomic against concurrent adds.
+    """
+
+    def __init__(self, value=0):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (retired, cells) replaced as a whole, so that reads need no lock
+        self._state = (value, ())
+
+    def _cell(self):
+        cell = [0]
+        # dropped with the thread-local storage when the thread exits
+        holder = self._local.holder = _CellHolder()
+        weakref.finalize(holder, self._retire, cell).atexit = False
+        with self._lock:
+            retired, cells = self._state
+            self._state = (retired, cells + (cell,))
+        self._local.cell = cell
+        return cell
+
+    def _retire(self, cell):
+        with self._lock:
+            retired, cells = self._state
+            self._state = (retired + cell[0], tuple(_ for _ in cells if _ is not cell))
+
+    def add(self, value=1):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._cell()
+        cell[0] += value
+
+    count = add
+
+    def minus(self, value=1):
+        self.add(-value)
+
+    @property
+    def value(self):
+        value, cells = self._state
+        for cell in cells:
+            value += cell[0]
+        return value
+
+    @value.setter
+    def value(self, v):
+        with self._lock:
+            retired, cells = self._state
+            for cell in cells:
+                cell[0] = 0
+            self._state = (v, cells)
+
+
+class _CellHolder(object):
+    __slots__ = ('__weakref__',)
+
+
+class SharedCounter(object):
+    """Counter with a slot per thread of each process in shared memory
+
+    Threads claim one of `slots` slots on first add, and write it without
+    locks later on. Once all slots claimed, threads share an overflow slot
+    guarded by a lock. Reading sums up all slots. Lock is created with
+    `context` of multiprocessing, which should match start method of the
+    processes.
+    """
+
+    def __init__(self, value=0, slots=64, context=None):
+        context = context or multiprocessing
+        self.slots = slots
+        self._values = context.RawArray(ctypes.c_longlong, slots + 1)
+        self._values[slots] = value
+        self._claimed = context.RawValue(ctypes.c_int, 0)
+        self._lock = context.Lock()
+        self._local = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _slot(self):
+        with self._lock:
+            slot = self._claimed.value
+            if slot < self.slots:
+                self._claimed.value += 1
+        # slots inherited by forked child are owned by parent
+        self._local.pid, self._local.slot = os.getpid(), slot
+        return slot
+
+    def add(self, value=1):
+        local = self._local
+        slot = local.slot if getattr(local, 'pid', None) == os.getpid() else self._slot()
+        if slot < self.slots:
+            self._values[slot] += value
+        else:
+            with self._lock:
+                self._values[slot] += value
+
+    count = add
+
+    def minus(self, value=1):
+        self.add(-value)
+
+    @property
+    def value(self):
+        return sum(self._values[:self._claimed.value]) + self._values[self.slots]
+
+    @value.setter
+    def value(self, v):
+        with self._lock:
+            for slot in range(self.slots):
+                self._values[slot] = 0
+            self._values[self.slots] = v
+
+
 class ParallelWrapperMixin(object):
-    """后台服务（进程或线程）公共方法封装"""
+    """后台服务（进程或线程）公共方法封装
+
+    `interval` sleeps after each `process()` for the rest of interval, while
+    `fps` or `schedule` (a `TickScheduler`) runs ticks on absolute deadlines.
+
+    `affinity` pins the worker thread (or process) to a list of CPU ids, or
+    to CPUs of a number of physical cores reserved exclusively with
+    `CpuAllocator.default()`, released when thread wrappers end, or by
+    `release_affinity()` after process wrappers joined.
+
+    `stop()` exits after the current tick, while `drain(timeout)` stops
+    accepting input (`on_drain()`), keeps ticking until `pending()` work is
+    done or the deadline passed, then `flush()` outputs and exits. Work left
+    on exit is counted as dropped, see `report()`.
+    """
 
     def __init__(self, name=None, interval=None,
                  show_error=False, fail_on_error=False,
-                 exclusive_init_lock=False, **kwargs):
+                 exclusive_init_lock=False, fps=None, schedule=None,
+                 affinity=None, **kwargs):
         if not hasattr(self, 'name'):
             self.name = name
         self.interval = interval
+        self.schedule = TickScheduler(fps=fps) if fps and schedule is None else schedule
+        if self.schedule is not None:
+            # stats visible to parent of process wrappers
+            self.schedule.share(self._make_value)
+
+        self._reserved_affinity = isinstance(affinity, int)
+        self.affinity = CpuAllocator.default().allocate(affinity) \
+            if self._reserved_affinity else affinity
 
         self.show_error = show_error
         self.fail_on_error = fail_on_error
 
         self._init_lock = exclusive_init_lock
 
-        self._stop_event = threading.Event()
+        self._stop_event = self._make_event()
         self._stop_event.clear()
 
-        self.__tick = AtomicInteger()
-        self.__total_time = 0
+        self.__tick = self._make_counter()
+        self._idle_beats = self._make_value(ctypes.c_longlong, 0)
+        self.metrics = self._make_metrics()
+
+        self._drain_event = self._make_event()
+        self._drain_deadline = self._make_value(ctypes.c_double, 0.)
+        self._dropped = self._make_value(ctypes.c_longlong, 0)
+        self._drain_started = False
 
         self._inited = False
         self._running = False
@@ -75,6 +264,33 @@ class ParallelWrapperMixin(object):
 
         self._init()
 
+    def _make_event(self):
+        return threading.Event()
+
+    def _make_counter(self):
+        return ShardedCounter()
+
+    def _make_metrics(self):
+        return WorkerMetrics()
+
+    def _make_value(self, ctype, value):
+        return ctype(value)
+
+    def _apply_affinity(self):
+        if not self.affinity:
+            return
+        try:
+            set_affinity(self.affinity)
+            logger.info('[{}] Pinned to CPUs {}', self.name, self.affinity)
+        except (AttributeError, OSError) as e:
+            logger.warning('[{}] Failed pinning to CPUs {}: {}', self.name, self.affinity, e)
+
+    def release_affinity(self):
+        """Release physical cores reserved by `affinity`"""
+        if self._reserved_affinity:
+            CpuAllocator.default().release(self.affinity)
+            self._reserved_affinity = False
+
     def is_inited(self):
         return self._inited
 
@@ -110,6 +326,7 @@ class ParallelWrapperMixin(object):
             logger.info(f'Job not inited, please call {self.__class__}.init() first')
             return
         SysUtil.disable_sys_stdin()
+        self._apply_affinity()
 
         try:
             if self._stop_event.is_set():
@@ -121,33 +338,52 @@ class ParallelWrapperMixin(object):
             self._stop_event.set()
 
         self._running = True
+        if self.schedule is not None:
+            self.schedule.start()
+        self.metrics.start()
         while not self._stop_event.is_set():
+            if self._drain_event.is_set() and not self._continue_draining():
+                break
+            if not self._wait_ready():
+                # alive though idle, e.g. waiting for input timed out
+                self._idle_beats.value += 1
+                continue
             tick = time.perf_counter()
+            failed = False
             try:
                 self.process()
             except (KeyboardInterrupt, SystemExit):
                 pass
             except Exception as e:
+                failed = True
                 if self.show_error:
                     logger.exception(
                         f'[{self.name}] Failed processing {self.__class__}', e
                     )
                 if self.fail_on_error:
                     logger.error('[{}] Failed on error: {}', self.name, e)
+                    self.metrics.observe(time.perf_counter() - tick, failed)
                     break
 
             self.__tick.count()
             toc = time.perf_counter()
             elapsed = toc - tick
-            if self.interval and self.interval > 0 and elapsed < self.interval:
+            self.metrics.observe(elapsed, failed)
+            if self._drain_event.is_set():
+                # catch up with pending work without waiting
+                continue
+            if self.schedule is not None:
+                self.schedule.wait(elapsed, self._stop_event)
+            elif self.interval and self.interval > 0 and elapsed < self.interval:
                 # logger.debug('Waiting for next tick, sleep {}s', max(self.interval - elapsed, 0))
                 time.sleep(max(self.interval - elapsed, 0))
-            self.__total_time += elapsed
 
+        self._finish()
         self._ended = True
         self._running = False
         logger.info('[{}] Finished with {} ticks', self.name, self.ticks)
         self.on_stop()
+        self.release_affinity()
 
     def stop(self):
         if self._ended:
@@ -160,18 +396,76 @@ class ParallelWrapperMixin(object):
         except Exception as e:
             logger.exception(f'[{self.name}] Failed setting stop event', e)
 
+    def drain(self, timeout=None):
+        """Stop accepting input, and exit once pending work done, or after
+        `timeout` seconds dropping the rest"""
+        if self._ended:
+            return
+        self._drain_deadline.value = math.inf if timeout is None else time.time() + timeout
+        self._drain_event.set()
+
+    @property
+    def draining(self):
+        return self._drain_event.is_set()
+
+    def _continue_draining(self):
+        if not self._drain_started:
+            self._drain_started = True
+            logger.info('[{}] Draining with {} pending', self.name, self.pending())
+            self.on_drain()
+        return self.pending() > 0 and time.time() < self._drain_deadline.value
+
+    def _finish(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.exception(f'[{self.name}] Failed flushing', e)
+        try:
+            self._dropped.value = self.pending()
+        except Exception as e:
+            logger.exception(f'[{self.name}] Failed counting pending work', e)
+        if self._dropped.value:
+            logger.warning('[{}] Dropped {} pending on exit', self.name, self._dropped.value)
+
+    def pending(self):
+        """Number of work accepted but not processed yet"""
+        return 0
+
+    def on_drain(self):
+        """Stop accepting input when draining started"""
+        pass
+
+    def flush(self):
+        """Flush outputs before exit"""
+        pass
+
     def on_stop(self):
         pass
 
+    @property
+    def dropped(self):
+        """Work pending on exit"""
+        return self._dropped.value
+
+    def report(self):
+        """Summary of work done and dropped, after exit"""
+        snapshot = self.metrics.snapshot()
+        return dict(name=self.name, ended=bool(self.ended), drained=self.draining,
+                    ticks=self.ticks, errors=snapshot['errors'], dropped=self.dropped)
+
     def reload(self):
         pass
 
+    def _wait_ready(self):
+        """Wait before next tick, False for skipping the tick"""
+        return True
+
     def process(self):
         raise NotImplementedError()
 
     def avg_time(self):
         """ avg handling time in millisecond """
-        return self.__total_time / (self.__tick or 1)
+        return self.metrics.latency.mean * 1000
 
     @property
     def ended(self):
@@ -184,3 +478,8 @@ class ParallelWrapperMixin(object):
     @property
     def ticks(self):
         return self.__tick.value
+
+    @property
+    def heartbeat(self):
+        """Ticks and idle waits, increasing as long as the loop is alive"""
+        return self.__tick.value + self._idle_beats.value
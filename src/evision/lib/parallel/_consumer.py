@@ -0,0 +1,282 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 21:00
+# @version: 1.0
+#
+import multiprocessing.queues
+import time
+from queue import Empty, Queue
+
+from evision.lib.log import logutil
+from evision.lib.sse import Publisher
+from ._base import ParallelWrapperMixin
+from ._process import ProcessWrapper
+from ._thread import ThreadWrapper
+
+logger = logutil.get_logger()
+
+__all__ = [
+    'EMPTY',
+    'ConsumerWrapperMixin',
+    'ConsumerThreadWrapper',
+    'ConsumerProcessWrapper',
+    'QueueSource',
+    'PopSource',
+    'ProcessQueueSource',
+    'PublisherSource'
+]
+
+
+class _Empty(object):
+    def __repr__(self):
+        return 'EMPTY'
+
+
+EMPTY = _Empty()
+
+
+class QueueSource(object):
+    """Items of a `queue.Queue`, waited on its `not_empty` condition, so that
+    waiting consumers could be woken up by `interrupt`"""
+
+    def __init__(self, queue: Queue):
+        self.queue = queue
+        self._interrupts = 0
+
+    def get(self, timeout, stop_event):
+        """Next item, or `EMPTY` if timed out, stopped or interrupted"""
+        queue = self.queue
+        with queue.not_empty:
+            interrupts = self._interrupts
+            if not queue.not_empty.wait_for(
+                    lambda: queue._qsize() or stop_event.is_set()
+                    or interrupts != self._interrupts, timeout) \
+                    or not queue._qsize():
+                return EMPTY
+            item = queue._get()
+            queue.not_full.notify()
+            return item
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def interrupt(self):
+        with self.queue.not_empty:
+            self._interrupts += 1
+            self.queue.not_empty.notify_all()
+
+    def close_input(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PopSource(object):
+    """Items of a queue with blocking `pop(block, timeout)`, e.g. `RedisQueue`
+    (BRPOP), waiting in slices of `wait_slice` seconds to check stop event"""
+
+    def __init__(self, queue, wait_slice=0.1):
+        self.queue = queue
+        self.wait_slice = wait_slice
+        self._interrupts = 0
+
+    def get(self, timeout, stop_event):
+        waited, interrupts = 0., self._interrupts
+        while not stop_event.is_set() and interrupts == self._interrupts:
+            wait = self.wait_slice if timeout is None else min(self.wait_slice, timeout - waited)
+            if wait <= 0:
+                break
+            item = self.queue.pop(block=True, timeout=wait)
+            if item is not None:
+                return item
+            waited += wait
+        return EMPTY
+
+    def pending(self):
+        return self.queue.size() if hasattr(self.queue, 'size') else 0
+
+    def interrupt(self):
+        self._interrupts += 1
+
+    def close_input(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ProcessQueueSource(object):
+    """Items of a `multiprocessing.Queue`, or queue with `get(block, timeout)`
+    raising `Empty`, waiting in slices of `wait_slice` seconds"""
+
+    def __init__(self, queue, wait_slice=0.1):
+        self.queue = queue
+        self.wait_slice = wait_slice
+        self._interrupts = 0
+
+    def get(self, timeout, stop_event):
+        waited, interrupts = 0., self._interrupts
+        while not stop_event.is_set() and interrupts == self._interrupts:
+            wait = self.wait_slice if timeout is None else min(self.wait_slice, timeout - waited)
+            if wait <= 0:
+                break
+            try:
+                return self.queue.get(True, wait)
+            except Empty:
+                waited += wait
+        return EMPTY
+
+    def pending(self):
+        try:
+            return self.queue.qsize()
+        except NotImplementedError:
+            # qsize of multiprocessing.Queue not implemented on macOS
+            return 0
+
+    def interrupt(self):
+        self._interrupts += 1
+
+    def close_input(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PublisherSource(QueueSource):
+    """Data published to channel of a `sse.Publisher`, subscribed on creation
+    and unsubscribed on draining or close, consumers stop once publisher
+    closed"""
+
+    def __init__(self, publisher: Publisher, channel='default channel', properties=None):
+        self.publisher = publisher
+        self.channel = channel
+        self.subscriber = publisher.add_subscriber(channel, properties)
+        self._buffer = ''
+        self.closed = False
+        super().__init__(self.subscriber[0])
+
+    def get(self, timeout, stop_event):
+        """Data of next event, lines joined by newline"""
+        while '\n\n' not in self._buffer:
+            chunk = super().get(timeout if not self._buffer else None, stop_event)
+            if chunk is EMPTY:
+                return EMPTY
+            if chunk is Publisher.END_STREAM:
+                self.closed = True
+                stop_event.set()
+                return EMPTY
+            self._buffer += chunk
+        event, self._buffer = self._buffer.split('\n\n', 1)
+        return '\n'.join(line[len('data: '):] for line in event.split('\n')
+                         if line.startswith('data: '))
+
+    def pending(self):
+        return self.queue.qsize() + self._buffer.count('\n\n')
+
+    def close_input(self):
+        self.publisher.remove_subscriber(self.subscriber, self.channel)
+
+    def close(self):
+        self.close_input()
+
+
+class ConsumerWrapperMixin(ParallelWrapperMixin):
+    """Wrapper calling `consume(item)` for items of a source, blocked waiting
+    for items up to `timeout` seconds instead of polling
+
+    Source is a `queue.Queue`, `multiprocessing.Queue`, `sse.Publisher`, queue
+    with blocking `pop` (e.g. `RedisQueue`), or any object with `get(timeout, stop_event)`
+    returning `EMPTY` if no item, and `interrupt()` waking up waiters, and
+    optionally `pending()`, `close_input()` and `close()`.
+    `on_idle()` is called when timed out without items, `stop()` interrupts
+    the waiting immediately. Time waiting is not counted as ticks in metrics,
+    but each wait timed out beats `heartbeat`, so that idle consumers are not
+    taken as stalled by `ProcessPoolSupervisor`.
+
+    When draining, items left in the source are consumed until deadline,
+    and the rest counted as dropped. Workers sharing a source all report
+    items left in it.
+    """
+
+    @staticmethod
+    def make_source(source):
+        if isinstance(source, Queue):
+            return QueueSource(source)
+        if isinstance(source, Publisher):
+            return PublisherSource(source)
+        if hasattr(source, 'interrupt') and hasattr(source, 'get'):
+            return source
+        if hasattr(source, 'pop'):
+            return PopSource(source)
+        if isinstance(source, multiprocessing.queues.Queue):
+            return ProcessQueueSource(source)
+        raise TypeError(f'Unsupported consumer source: {type(source)}')
+
+    def _wait_ready(self):
+        timeout = self.timeout
+        if self.draining:
+            remaining = max(self._drain_deadline.value - time.time(), 0.)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        self._item = self.source.get(timeout, self._stop_event)
+        if self._item is EMPTY:
+            if not self._stop_event.is_set() and not self.draining:
+                self.on_idle()
+            return False
+        return True
+
+    def process(self):
+        item, self._item = self._item, EMPTY
+        self.consume(item)
+
+    def consume(self, item):
+        raise NotImplementedError
+
+    def on_idle(self):
+        pass
+
+    def pending(self):
+        pending = getattr(self.source, 'pending', None)
+        return pending() if pending else 0
+
+    def stop(self):
+        super().stop()
+        self.source.interrupt()
+
+    def drain(self, timeout=None):
+        super().drain(timeout)
+        self.source.interrupt()
+
+    def on_drain(self):
+        close_input = getattr(self.source, 'close_input', None)
+        if close_input:
+            close_input()
+
+    def on_stop(self):
+        close = getattr(self.source, 'close', None)
+        if close:
+            close()
+
+
+class ConsumerThreadWrapper(ConsumerWrapperMixin, ThreadWrapper):
+    def __init__(self, source, name=None, timeout=1., *args, **kwargs):
+        self.source = self.make_source(source)
+        self.timeout = timeout
+        self._item = EMPTY
+        ThreadWrapper.__init__(self, name, *args, **kwargs)
+
+
+class ConsumerProcessWrapper(ConsumerWrapperMixin, ProcessWrapper):
+    """Consumer in a child process, source should be shared across
+    processes, e.g. `multiprocessing.Queue` or `RedisQueue`"""
+
+    def __init__(self, source, name=None, timeout=1., *args, **kwargs):
+        self.source = self.make_source(source)
+        self.timeout = timeout
+        self._item = EMPTY
+        ProcessWrapper.__init__(self, name, *args, **kwargs)
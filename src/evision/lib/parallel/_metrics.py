@@ -0,0 +1,219 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 20:00
+# @version: 1.0
+#
+import ctypes
+import math
+import multiprocessing
+import threading
+import time
+
+__all__ = [
+    'StreamingHistogram',
+    'WorkerMetrics'
+]
+
+
+def _make_array(ctype, size, shared, context=None):
+    if shared:
+        return (context or multiprocessing).RawArray(ctype, size)
+    return [ctype(0).value] * size
+
+
+def _make_lock(shared, context=None):
+    return (context or multiprocessing).Lock() if shared else threading.Lock()
+
+
+class StreamingHistogram(object):
+    """Histogram of fixed memory over log-scale buckets
+
+    Values between `lowest` and `highest` fall into buckets growing by
+    `growth` times, so quantiles are exact within `growth - 1` relative error.
+    With `shared`, buckets are kept in shared memory, to be observed in a
+    child process and read from parent, the lock is created with `context`
+    of multiprocessing, matching start method of the child.
+
+    >>> histogram = StreamingHistogram()
+    >>> for _ in range(1, 101): histogram.add(_ / 1000)
+    >>> round(histogram.quantile(0.5), 2), histogram.count
+    (0.05, 100)
+    """
+    _COUNT, _SUM, _MIN, _MAX = range(4)
+
+    def __init__(self, lowest=1e-6, highest=1e3, growth=1.05, shared=False, context=None):
+        self.lowest = lowest
+        self.highest = highest
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.size = int(math.ceil(math.log(highest / lowest) / self._log_growth)) + 2
+        self._counts = _make_array(ctypes.c_longlong, self.size, shared, context)
+        self._stats = _make_array(ctypes.c_double, 4, shared, context)
+        self._lock = _make_lock(shared, context)
+        self.reset()
+
+    def _index(self, value):
+        if value < self.lowest:
+            return 0
+        if value >= self.highest:
+            return self.size - 1
+        return min(1 + int(math.log(value / self.lowest) / self._log_growth), self.size - 2)
+
+    def add(self, value):
+        index = self._index(value)
+        with self._lock:
+            self._counts[index] += 1
+            stats = self._stats
+            stats[self._COUNT] += 1
+            stats[self._SUM] += value
+            if value < stats[self._MIN]:
+                stats[self._MIN] = value
+            if value > stats[self._MAX]:
+                stats[self._MAX] = value
+
+    def reset(self):
+        with self._lock:
+            for index in range(self.size):
+                self._counts[index] = 0
+            self._stats[:] = [0., 0., math.inf, -math.inf]
+
+    def merge(self, other: 'StreamingHistogram'):
+        """Add values of another histogram of the same buckets"""
+        if (other.lowest, other.highest, other.growth) != (self.lowest, self.highest, self.growth):
+            raise ValueError('Histograms of different buckets')
+        with other._lock:
+            counts, stats = list(other._counts), list(other._stats)
+        with self._lock:
+            for index, count in enumerate(counts):
+                self._counts[index] += count
+            self._stats[self._COUNT] += stats[self._COUNT]
+            self._stats[self._SUM] += stats[self._SUM]
+            self._stats[self._MIN] = min(self._stats[self._MIN], stats[self._MIN])
+            self._stats[self._MAX] = max(self._stats[self._MAX], stats[self._MAX])
+        return self
+
+    @property
+    def count(self):
+        return int(self._stats[self._COUNT])
+
+    @property
+    def sum(self):
+        return self._stats[self._SUM]
+
+    @property
+    def min(self):
+        return self._stats[self._MIN] if self.count else 0.
+
+    @property
+    def max(self):
+        return self._stats[self._MAX] if self.count else 0.
+
+    @property
+    def mean(self):
+        return self.sum / (self.count or 1)
+
+    def quantile(self, q):
+        """Value of quantile `q` (0~1), 0 if empty"""
+        with self._lock:
+            counts = list(self._counts)
+            low, high = self.min, self.max
+        total = sum(counts)
+        if not total:
+            return 0.
+        rank = max(math.ceil(q * total), 1)
+        cumulative = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= rank:
+                break
+        if index == 0:
+            return low
+        if index == self.size - 1:
+            return high
+        # geometric middle of bucket, bounded by observed values
+        value = self.lowest * self.growth ** (index - 0.5)
+        return min(max(value, low), high)
+
+    def snapshot(self, quantiles=(0.5, 0.95, 0.99)):
+        snapshot = dict(count=self.count, sum=self.sum, min=self.min, max=self.max,
+                        mean=self.mean)
+        for q in quantiles:
+            snapshot[f'p{q * 100:g}'] = self.quantile(q)
+        return snapshot
+
+
+class WorkerMetrics(object):
+    """Latency of `process()`, errors, busy ratio and ticks per second of a
+    worker loop"""
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    _STARTED, _ERRORS = range(2)
+
+    def __init__(self, shared=False, context=None):
+        self.latency = StreamingHistogram(shared=shared, context=context)
+        self._values = _make_array(ctypes.c_double, 2, shared, context)
+
+    def start(self):
+        self._values[self._STARTED] = time.monotonic()
+
+    def observe(self, elapsed, error=False):
+        self.latency.add(elapsed)
+        if error:
+            self._values[self._ERRORS] += 1
+
+    @property
+    def errors(self):
+        return int(self._values[self._ERRORS])
+
+    @property
+    def uptime(self):
+        started = self._values[self._STARTED]
+        return time.monotonic() - started if started else 0.
+
+    def snapshot(self):
+        uptime = self.uptime
+        ticks = self.latency.count
+        busy_ratio = min(self.latency.sum / uptime, 1.) if uptime else 0.
+        return dict(
+            ticks=ticks, errors=self.errors, uptime=uptime,
+            tps=ticks / uptime if uptime else 0.,
+            busy_ratio=busy_ratio, idle_ratio=1. - busy_ratio if uptime else 0.,
+            latency=self.latency.snapshot(self.QUANTILES)
+        )
+
+    @staticmethod
+    def _label(value):
+        value = str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        return f'worker="{value}"'
+
+    @classmethod
+    def to_prometheus(cls, snapshots, prefix='evision_worker'):
+        """Format snapshots by worker name in Prometheus text format"""
+        gauges = [
+            ('ticks_total', 'counter', 'Ticks processed', 'ticks'),
+            ('errors_total', 'counter', 'Ticks failed with errors', 'errors'),
+            ('uptime_seconds', 'gauge', 'Seconds since worker started', 'uptime'),
+            ('ticks_per_second', 'gauge', 'Average ticks per second', 'tps'),
+            ('busy_ratio', 'gauge', 'Ratio of time spent in process()', 'busy_ratio'),
+        ]
+        lines = []
+        for name, metric_type, description, field in gauges:
+            lines.append(f'# HELP {prefix}_{name} {description}')
+            lines.append(f'# TYPE {prefix}_{name} {metric_type}')
+            for worker, snapshot in snapshots.items():
+                lines.append(f'{prefix}_{name}{{{cls._label(worker)}}} {snapshot[field]}')
+
+        name = f'{prefix}_process_seconds'
+        lines.append(f'# HELP {name} Latency of process()')
+        lines.append(f'# TYPE {name} summary')
+        for worker, snapshot in snapshots.items():
+            label, latency = cls._label(worker), snapshot['latency']
+            for q in cls.QUANTILES:
+                lines.append(f'{name}{{{label},quantile="{q}"}} {latency[f"p{q * 100:g}"]}')
+            lines.append(f'{name}_sum{{{label}}} {latency["sum"]}')
+            lines.append(f'{name}_count{{{label}}} {latency["count"]}')
+        return '\n'.join(lines) + '\n'
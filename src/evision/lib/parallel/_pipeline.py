@@ -0,0 +1,353 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 22:00
+# @version: 1.0
+#
+import ctypes
+import multiprocessing
+import time
+from queue import Empty, Full, Queue
+
+from evision.lib.log import logutil
+from ._consumer import ConsumerProcessWrapper, ConsumerThreadWrapper, ProcessQueueSource
+from ._metrics import StreamingHistogram
+
+logger = logutil.get_logger()
+
+__all__ = [
+    'BoundedQueue',
+    'ProcessBoundedQueue',
+    'Pipeline',
+    'QueuePolicy'
+]
+
+
+class QueuePolicy(object):
+    """What to do when putting into a full queue"""
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+
+    ALL = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+    @classmethod
+    def check(cls, policy):
+        if policy not in cls.ALL:
+            raise ValueError(f'Unknown queue policy: {policy}')
+        return policy
+
+
+class BoundedQueue(Queue):
+    """Queue between thread stages, `offer` applies policy when full"""
+
+    def __init__(self, maxsize, policy=QueuePolicy.BLOCK, block_slice=0.1):
+        super().__init__(maxsize)
+        self.policy = QueuePolicy.check(policy)
+        self.block_slice = block_slice
+        self.dropped = 0
+
+    def offer(self, item, timeout=None, stop_event=None):
+        """Put item with the policy, blocking up to `timeout` seconds or until
+        `stop_event` set with `BLOCK` policy
+
+        :return: False if item or the oldest item dropped
+        """
+        if self.policy == QueuePolicy.DROP_OLDEST:
+            with self.not_full:
+                dropped = 0 < self.maxsize <= self._qsize()
+                if dropped:
+                    self._get()
+                    self.dropped += 1
+                self._put(item)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+            return not dropped
+        if self.policy == QueuePolicy.DROP_NEWEST:
+            timeout = 0
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.block_slice if deadline is None \
+                else min(self.block_slice, deadline - time.monotonic())
+            try:
+                if wait > 0:
+                    self.put(item, timeout=wait)
+                else:
+                    self.put_nowait(item)
+                return True
+            except Full:
+                if wait <= 0 or (stop_event is not None and stop_event.is_set()):
+                    with self.mutex:
+                        self.dropped += 1
+                    return False
+
+
+class ProcessBoundedQueue(object):
+    """Queue between stages of processes, over `multiprocessing.Queue`"""
+
+    def __init__(self, maxsize, policy=QueuePolicy.BLOCK, block_slice=0.1):
+        self.maxsize = maxsize
+        self.policy = QueuePolicy.check(policy)
+        self.block_slice = block_slice
+        self.queue = multiprocessing.Queue(maxsize)
+        self._dropped = multiprocessing.Value(ctypes.c_longlong, 0)
+
+    @property
+    def dropped(self):
+        return self._dropped.value
+
+    def _drop(self):
+        with self._dropped.get_lock():
+            self._dropped.value += 1
+
+    def offer(self, item, timeout=None, stop_event=None):
+        if self.policy == QueuePolicy.DROP_OLDEST:
+            dropped = False
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    return not dropped
+                except Full:
+                    try:
+                        self.queue.get_nowait()
+                        self._drop()
+                        dropped = True
+                    except Empty:
+                        pass
+        if self.policy == QueuePolicy.DROP_NEWEST:
+            timeout = 0
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.block_slice if deadline is None \
+                else min(self.block_slice, deadline - time.monotonic())
+            try:
+                if wait > 0:
+                    self.queue.put(item, timeout=wait)
+                else:
+                    self.queue.put_nowait(item)
+                return True
+            except Full:
+                if wait <= 0 or (stop_event is not None and stop_event.is_set()):
+                    self._drop()
+                    return False
+
+    def get(self, block=True, timeout=None):
+        return self.queue.get(block, timeout)
+
+    def qsize(self):
+        return self.queue.qsize()
+
+
+class _StageWorkerMixin(object):
+    def consume(self, item):
+        result = self.func(item)
+        if result is not None and self.output is not None:
+            self.output.offer(result, stop_event=self._stop_event)
+
+
+class _ThreadStageWorker(_StageWorkerMixin, ConsumerThreadWrapper):
+    def __init__(self, func, source, output, name=None, **kwargs):
+        self.func = func
+        self.output = output
+        super().__init__(source, name=name, **kwargs)
+
+
+class _ProcessStageWorker(_StageWorkerMixin, ConsumerProcessWrapper):
+    def __init__(self, func, source, output, name=None, **kwargs):
+        self.func = func
+        self.output = output
+        super().__init__(source, name=name, **kwargs)
+
+
+class _Stage(object):
+    def __init__(self, name, func, workers, mode, queue_size, policy):
+        if mode not in Pipeline.MODES:
+            raise ValueError(f'Unknown stage mode: {mode}')
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.mode = mode
+        self.queue_size = queue_size
+        self.policy = QueuePolicy.check(policy)
+        self.input = None
+        self.wrappers = []
+
+
+class Pipeline(object):
+    """Stages connected by bounded queues, each stage runs `func(item)` in
+    threads or processes, results other than None are passed to next stage
+
+    Queue in front of each stage applies its policy when full: `BLOCK` for
+    backpressure to upstream, `DROP_OLDEST` to keep the freshest frames, or
+    `DROP_NEWEST`. Results of the last stage are kept in an output queue of
+    `output_size` to `get`, or discarded if 0. `stats` reports queue depth,
+    drops and latency by stage, with the busiest one as `bottleneck`.
+    `drain` finishes items queued stage by stage before stopping.
+
+    >>> pipeline = Pipeline('camera', queue_size=4, output_size=4)
+    >>> pipeline.stage('double', lambda x: x * 2).stage('inc', lambda x: x + 1, workers=2)
+    Pipeline(camera: double -> inc)
+    """
+    THREAD = 'thread'
+    PROCESS = 'process'
+    MODES = (THREAD, PROCESS)
+
+    def __init__(self, name='pipeline', queue_size=8, policy=QueuePolicy.BLOCK,
+                 output_size=0, timeout=1.):
+        self.name = name
+        self.queue_size = queue_size
+        self.policy = QueuePolicy.check(policy)
+        self.output_size = output_size
+        self.timeout = timeout
+        self.stages = []
+        self.output = None
+        self._started = False
+        self._draining = False
+
+    def __repr__(self):
+        return f'Pipeline({self.name}: {" -> ".join(_.name for _ in self.stages)})'
+
+    def stage(self, name, func, workers=1, mode=THREAD, queue_size=None, policy=None):
+        """Append a stage, returns the pipeline for chaining"""
+        if self._started:
+            raise RuntimeError(f'Pipeline {self.name} already started')
+        if name in {_.name for _ in self.stages}:
+            raise ValueError(f'Duplicated stage: {name}')
+        self.stages.append(_Stage(
+            name, func, workers, mode,
+            self.queue_size if queue_size is None else queue_size,
+            self.policy if policy is None else policy))
+        return self
+
+    @staticmethod
+    def _make_queue(size, policy, shared):
+        return ProcessBoundedQueue(size, policy) if shared else BoundedQueue(size, policy)
+
+    def start(self):
+        if not self.stages:
+            raise ValueError(f'No stage in pipeline {self.name}')
+        self._draining = False
+        previous = None
+        for stage in self.stages:
+            # queue written or read by a process stage should be shared
+            shared = stage.mode == self.PROCESS or (previous and previous.mode == self.PROCESS)
+            stage.input = self._make_queue(stage.queue_size, stage.policy, shared)
+            previous = stage
+        if self.output_size:
+            self.output = self._make_queue(self.output_size, QueuePolicy.DROP_OLDEST,
+                                           previous.mode == self.PROCESS)
+
+        try:
+            for index, stage in enumerate(self.stages):
+                self._start_stage(stage, self.stages[index + 1].input
+                                  if index + 1 < len(self.stages) else self.output)
+        except Exception:
+            self.stop()
+            raise
+        self._started = True
+        logger.info('[{}] Started {}', self.name, self)
+        return self
+
+    def _start_stage(self, stage, output):
+        worker_class = _ProcessStageWorker if stage.mode == self.PROCESS else _ThreadStageWorker
+        source = stage.input
+        if isinstance(source, ProcessBoundedQueue):
+            source = ProcessQueueSource(source)
+        stage.wrappers = []
+        for i in range(stage.workers):
+            wrapper = worker_class(stage.func, source, output, name=f'{self.name}-{stage.name}-{i}',
+                                   timeout=self.timeout, show_error=True)
+            stage.wrappers.append(wrapper)
+            wrapper.start()
+
+    def put(self, item, timeout=None):
+        """Feed item to the first stage, with its queue policy
+
+        :return: False if item or the oldest item dropped, or drained
+        """
+        if self._draining:
+            return False
+        return self.stages[0].input.offer(item, timeout)
+
+    def get(self, timeout=None):
+        """Result of the last stage, None if not available in time"""
+        if self.output is None:
+            raise ValueError(f'Pipeline {self.name} without output')
+        try:
+            return self.output.get(True, timeout)
+        except Empty:
+            return None
+
+    def _join_stage(self, stage, timeout):
+        for wrapper in stage.wrappers:
+            if not wrapper.is_alive():
+                continue
+            wrapper.join(timeout)
+            if stage.mode == self.PROCESS and wrapper.is_alive():
+                wrapper.terminate()
+
+    def stop(self, timeout=5.):
+        for stage in self.stages:
+            [_.stop() for _ in stage.wrappers]
+        for stage in self.stages:
+            self._join_stage(stage, timeout)
+        self._started = False
+
+    def drain(self, timeout=None, join_timeout=5.):
+        """Stop accepting input, then drain stages in order within `timeout`
+        seconds, so that items queued are passed down to following stages.
+        Workers still running after deadline are stopped.
+
+        :return: report of each stage, with items `left` in its queue and
+            reports of its workers
+        """
+        self._draining = True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        report = {}
+        for stage in self.stages:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.)
+            [_.drain(remaining) for _ in stage.wrappers]
+            for wrapper in stage.wrappers:
+                if wrapper.is_alive():
+                    wrapper.join(None if deadline is None
+                                 else max(deadline - time.monotonic(), 0.))
+            [_.stop() for _ in stage.wrappers if _.is_alive()]
+            self._join_stage(stage, join_timeout)
+            report[stage.name] = dict(
+                left=stage.input.qsize() if stage.input else 0,
+                dropped=stage.input.dropped if stage.input else 0,
+                workers=[_.report() for _ in stage.wrappers]
+            )
+        self._started = False
+        logger.info('[{}] Drained {}', self.name, self)
+        return report
+
+    def stats(self):
+        """Queue depth, drops and worker metrics by stage"""
+        stats = {}
+        for stage in self.stages:
+            latency = StreamingHistogram()
+            snapshots = [_.metrics.snapshot() for _ in stage.wrappers]
+            [latency.merge(_.metrics.latency) for _ in stage.wrappers]
+            stats[stage.name] = dict(
+                mode=stage.mode, workers=stage.workers,
+                depth=stage.input.qsize() if stage.input else 0,
+                capacity=stage.queue_size,
+                dropped=stage.input.dropped if stage.input else 0,
+                ticks=sum(_['ticks'] for _ in snapshots),
+                errors=sum(_['errors'] for _ in snapshots),
+                tps=sum(_['tps'] for _ in snapshots),
+                busy_ratio=sum(_['busy_ratio'] for _ in snapshots) / (len(snapshots) or 1),
+                latency=latency.snapshot()
+            )
+        return stats
+
+    def bottleneck(self):
+        """Name of stage with workers busy the most"""
+        stats = self.stats()
+        if not stats:
+            return None
+        return max(stats, key=lambda name: stats[name]['busy_ratio'])
@@ -7,11 +7,14 @@
 # @date: 2019-10-18 10:34
 # @version: 1.0
 #
+import ctypes
+import multiprocessing
 import signal
 from multiprocessing import Process
 
 from evision.lib.log import logutil
-from ._base import ParallelWrapperMixin
+from ._base import ParallelWrapperMixin, SharedCounter
+from ._metrics import WorkerMetrics
 
 logger = logutil.get_logger()
 
@@ -21,36 +24,111 @@ __all__ = [
 
 
 class ProcessWrapper(ParallelWrapperMixin, Process):
+    """Process running `process()` in a loop
+
+    Stop event, ticks and running state are kept in shared memory, so that
+    `stop()`, `ticks` and `running` work from the parent process as well.
+
+    `start_method` (`fork`, `spawn` or `forkserver`) overrides the default
+    start method of multiprocessing for this process. With `forkserver`,
+    call `preload()` before starting any worker, so that heavy modules are
+    imported once by the fork server, and workers are forked ready-to-run.
+
+    With `answer_sigterm`, the first signal drains the process within
+    `drain_timeout` seconds, the second one stops it after the current tick,
+    and only the third one exits immediately.
+    """
+    start_method = None
+    drain_timeout = 5.
+    PRELOAD_MODULES = ['numpy', 'cv2', 'pydantic', 'evision.lib.parallel']
+
     def __init__(self, name=None, paths=None,
                  answer_sigint=False, answer_sigterm=False,
-                 *args, **kwargs):
+                 *args, start_method=None, **kwargs):
+        if start_method is not None:
+            self.start_method = start_method
         self._paths = paths
 
         self.answer_sigint = answer_sigint
         self.answer_sigterm = answer_sigterm
 
-        self._update_sys_path()
+        self._shared_running = multiprocessing.RawValue(ctypes.c_bool, False)
+        self._shared_ended = multiprocessing.RawValue(ctypes.c_bool, False)
 
         Process.__init__(self, name=name, args=args, kwargs=kwargs)
+        self._update_sys_path()
         ParallelWrapperMixin.__init__(self, *args, **kwargs)
 
+    @classmethod
+    def preload(cls, modules=None, start=True):
+        """Modules imported by fork server before forking workers, and start
+        the fork server right away with `start`"""
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(list(cls.PRELOAD_MODULES if modules is None else modules))
+        if start:
+            from multiprocessing import forkserver
+            forkserver.ensure_running()
+
+    def _get_context(self):
+        return multiprocessing.get_context(self.start_method)
+
+    def _Popen(self, process_obj):
+        # Process.start calls `self._Popen(self)`
+        return self._get_context().Process._Popen(process_obj)
+
+    def _make_event(self):
+        return self._get_context().Event()
+
+    def _make_counter(self):
+        return SharedCounter(context=self._get_context())
+
+    def _make_metrics(self):
+        return WorkerMetrics(shared=True, context=self._get_context())
+
+    def _make_value(self, ctype, value):
+        return self._get_context().RawValue(ctype, value)
+
+    @property
+    def _running(self):
+        return self._shared_running.value
+
+    @_running.setter
+    def _running(self, value):
+        self._shared_running.value = value
+
+    @property
+    def _ended(self):
+        return self._shared_ended.value
+
+    @_ended.setter
+    def _ended(self, value):
+        self._shared_ended.value = value
+
     def process(self):
         raise NotImplementedError
 
-    def init(self):
+    def run(self):
+        # signal handlers are installed in the child, not the parent where
+        # `init()` is called on creation
         if self.answer_sigint:
             signal.signal(signal.SIGINT, signal.SIG_IGN)
         if self.answer_sigterm:
             signal.signal(signal.SIGINT, self._sig_kill_handler)
             signal.signal(signal.SIGTERM, self._sig_kill_handler)
+        super().run()
 
     def _sig_kill_handler(self, sig, frame):
-        logger.info('[{}] Stopping with signal={}, frame={}',
-                    self.name, sig, frame)
-        self._stop_event.set()
         if self._ended:
             return
-        raise SystemExit()
+        if not self.draining:
+            logger.info('[{}] Draining in {}s with signal={}', self.name, self.drain_timeout, sig)
+            self.drain(self.drain_timeout)
+        elif not self._stop_event.is_set():
+            logger.info('[{}] Stopping with signal={}', self.name, sig)
+            self._stop_event.set()
+        else:
+            logger.warning('[{}] Exiting with signal={}', self.name, sig)
+            raise SystemExit()
 
     def _update_sys_path(self):
         if not self._paths:
@@ -62,5 +140,7 @@ class ProcessWrapper(ParallelWrapperMixin, Process):
         assert isinstance(_path, str)
         _path = _path.split(':') if ':' in _path else [_path, ]
         _path = [os.path.abspath(os.path.expanduser(_)) for _ in _path]
+        _path = [_ for _ in _path if _ not in sys.path]
         [sys.path.insert(0, _) for _ in _path[::-1]]
-        logger.info(f'[{self.name}] Paths updated to: {sys.path}')
+        if _path:
+            logger.info(f'[{self.name}] Paths added to sys.path: {_path}')
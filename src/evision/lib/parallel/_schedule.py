@@ -0,0 +1,170 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 19:05
+# @version: 1.0
+#
+import ctypes
+import math
+import time
+
+__all__ = [
+    'TickScheduler'
+]
+
+
+class _Stat(object):
+    """Attribute kept in a ctypes value, replaced by `TickScheduler.share`"""
+
+    def __init__(self, ctype):
+        self.ctype = ctype
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.field = '_' + name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return getattr(instance, self.field).value
+
+    def __set__(self, instance, value):
+        if self.field in instance.__dict__:
+            getattr(instance, self.field).value = value
+        else:
+            setattr(instance, self.field, self.ctype(value))
+
+
+class TickScheduler(object):
+    """Ticks on absolute deadlines `start + n * interval`, free of drift
+
+    Ticks started late run immediately, deadlines missed meanwhile are
+    skipped (or caught up in a burst with `skip_missed=False`), so the loop
+    stays on the same grid. With `adaptive`, interval backs off while
+    `process()` keeps overrunning it, by `backoff` times up to `max_interval`,
+    and recovers to the target interval once it keeps up again.
+
+    Counters and current interval are shared with the parent process by
+    `share`, as wrappers do for process workers.
+
+    >>> scheduler = TickScheduler(fps=25)
+    >>> scheduler.interval
+    0.04
+    """
+    _STATS = ('interval', 'started_at', 'ticks', 'skipped', 'overrun_ticks',
+              'jitter_max', 'jitter_sum')
+    interval = _Stat(ctypes.c_double)
+    started_at = _Stat(ctypes.c_double)
+    ticks = _Stat(ctypes.c_longlong)
+    skipped = _Stat(ctypes.c_longlong)
+    overrun_ticks = _Stat(ctypes.c_longlong)
+    jitter_max = _Stat(ctypes.c_double)
+    jitter_sum = _Stat(ctypes.c_double)
+
+    def __init__(self, interval=None, fps=None, skip_missed=True, adaptive=False,
+                 backoff=1.25, max_interval=None, overrun_limit=3, clock=time.perf_counter):
+        if fps:
+            interval = 1. / fps
+        if not interval or interval <= 0:
+            raise ValueError(f'Invalid tick interval: {interval}')
+        self.target_interval = interval
+        self.interval = interval
+        self.skip_missed = skip_missed
+        self.adaptive = adaptive
+        self.backoff = backoff
+        self.max_interval = max_interval or interval * 4
+        self.overrun_limit = overrun_limit
+        self.clock = clock
+
+        self._deadline = None
+        self._overruns = 0
+        self._underruns = 0
+        self.started_at = math.nan
+        self.ticks = 0
+        self.skipped = 0
+        self.overrun_ticks = 0
+        self.jitter_max = 0.
+        self.jitter_sum = 0.
+
+    def share(self, make_value):
+        """Keep stats in values made by `make_value(ctype, value)`, e.g. in
+        shared memory of a process wrapper"""
+        for name in self._STATS:
+            stat = getattr(type(self), name)
+            setattr(self, stat.field, make_value(stat.ctype, getattr(self, name)))
+
+    def start(self, now=None):
+        self.started_at = self.clock() if now is None else now
+        self._deadline = self.started_at
+
+    def _adapt(self, elapsed, now):
+        if elapsed > self.interval:
+            self._overruns, self._underruns = self._overruns + 1, 0
+        elif elapsed < self.target_interval:
+            self._overruns, self._underruns = 0, self._underruns + 1
+        else:
+            self._overruns = self._underruns = 0
+
+        interval = self.interval
+        if self._overruns >= self.overrun_limit:
+            interval = min(self.interval * self.backoff, self.max_interval)
+            self._overruns = 0
+        elif self._underruns >= self.overrun_limit and self.interval > self.target_interval:
+            interval = max(self.interval / self.backoff, self.target_interval)
+            self._underruns = 0
+        if interval != self.interval:
+            # anchor new grid at the current tick
+            self.interval, self._deadline = interval, now
+
+    def wait(self, elapsed=0., stop_event=None):
+        """Wait for deadline of next tick after a tick of `elapsed` seconds
+
+        :return: False if stopped while waiting
+        """
+        if self._deadline is None:
+            self.start()
+        now = self.clock()
+        if elapsed > self.interval:
+            self.overrun_ticks += 1
+        if self.adaptive:
+            self._adapt(elapsed, now)
+
+        deadline = self._deadline + self.interval
+        if now > deadline and self.skip_missed:
+            missed = math.floor((now - deadline) / self.interval)
+            self.skipped += missed
+            deadline += missed * self.interval
+        self._deadline = deadline
+
+        if now < deadline:
+            delay = deadline - now
+            if stop_event is not None:
+                if stop_event.wait(delay):
+                    return False
+            else:
+                time.sleep(delay)
+            now = self.clock()
+        jitter = now - deadline
+        self.ticks += 1
+        self.jitter_sum += jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+        return True
+
+    @property
+    def fps(self):
+        """Actual ticks per second since started"""
+        if math.isnan(self.started_at):
+            return 0.
+        elapsed = self.clock() - self.started_at
+        return self.ticks / elapsed if elapsed > 0 else 0.
+
+    def stats(self):
+        return dict(
+            interval=self.interval, target_interval=self.target_interval,
+            ticks=self.ticks, skipped=self.skipped, overruns=self.overrun_ticks,
+            fps=self.fps, jitter_avg=self.jitter_sum / (self.ticks or 1),
+            jitter_max=self.jitter_max
+        )
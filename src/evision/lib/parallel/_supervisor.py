@@ -0,0 +1,259 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 18:10
+# @version: 1.0
+#
+import threading
+import time
+
+from evision.lib.log import logutil
+from evision.lib.util import ConsistentHashRing
+from ._thread import ThreadWrapper
+
+logger = logutil.get_logger()
+
+__all__ = [
+    'ProcessPoolSupervisor'
+]
+
+
+class _WorkerSlot(object):
+    """Shard of keys served by one worker process, with its restart state"""
+
+    def __init__(self, worker_id, keys):
+        self.worker_id = worker_id
+        self.keys = keys
+        self.process = None
+        self.started_at = None
+        self.next_start = 0
+        self.failures = 0
+        self.restarts = 0
+        self.heartbeat = 0
+        self.progressed_at = None
+
+
+class ProcessPoolSupervisor(ThreadWrapper):
+    """Run a pool of `ProcessWrapper` workers over shards of keys
+
+    Keys (e.g. camera ids) are assigned to workers by consistent hashing.
+    Workers are created with `worker_factory(worker_id, keys)` each time
+    they are (re)started, since processes could only be started once.
+
+    Workers exited, or with `heartbeat` (ticks and idle waits) not increasing
+    for `heartbeat_timeout` seconds while `running`, are restarted after an
+    exponential backoff from `backoff` up to `max_backoff` seconds. Idle
+    consumers beat once per wait `timeout`, which should be shorter than
+    `heartbeat_timeout`. `scale` and `assign` rebalance shards, restarting
+    only workers whose keys changed. `join_workers` drains all workers before
+    stopping, with a report of work dropped by each.
+    """
+
+    def __init__(self, worker_factory, workers=1, keys=(), name=None,
+                 interval=0.5, heartbeat_timeout=None, backoff=1., max_backoff=60.,
+                 join_timeout=5., replicas=160, **kwargs):
+        self.worker_factory = worker_factory
+        self.heartbeat_timeout = heartbeat_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.join_timeout = join_timeout
+
+        self._keys = list(dict.fromkeys(keys))
+        self._ring = ConsistentHashRing(range(workers), replicas)
+        self._slots = {}
+        self._lock = threading.RLock()
+        self._closing = False
+        super().__init__(name=name, interval=interval, **kwargs)
+
+    @property
+    def size(self):
+        return len(self._ring)
+
+    @property
+    def assignments(self):
+        """Keys of each worker, by worker id"""
+        assignments = {worker_id: [] for worker_id in self._ring.nodes}
+        for key in self._keys:
+            assignments[self._ring.get(key)].append(key)
+        return assignments
+
+    def owner(self, key):
+        """Id of the worker serving the key"""
+        return self._ring.get(key)
+
+    def scale(self, workers):
+        """Change number of workers, moving keys of removed workers, or
+        part of keys to new workers"""
+        if workers < 1:
+            raise ValueError(f'Invalid number of workers: {workers}')
+        with self._lock:
+            for worker_id in range(len(self._ring), workers):
+                self._ring.add(worker_id)
+            for worker_id in range(workers, len(self._ring)):
+                self._ring.remove(worker_id)
+            self._rebalance()
+
+    def assign(self, keys):
+        """Replace keys sharded across workers"""
+        with self._lock:
+            self._keys = list(dict.fromkeys(keys))
+            self._rebalance()
+
+    def _rebalance(self):
+        if not self._slots:
+            return
+        assignments = self.assignments
+        for worker_id in [_ for _ in self._slots if _ not in assignments]:
+            logger.info('[{}] Stopping worker {}', self.name, worker_id)
+            self._stop_worker(self._slots.pop(worker_id))
+        for worker_id, keys in assignments.items():
+            slot = self._slots.get(worker_id)
+            if slot is None:
+                self._slots[worker_id] = _WorkerSlot(worker_id, keys)
+            elif slot.keys != keys:
+                logger.info('[{}] Restarting worker {} with {} keys',
+                            self.name, worker_id, len(keys))
+                self._stop_worker(slot)
+                slot.keys, slot.next_start = keys, 0
+        self._check_workers()
+
+    def _start_worker(self, slot, now):
+        process = self.worker_factory(slot.worker_id, list(slot.keys))
+        process.start()
+        if slot.started_at is not None:
+            slot.restarts += 1
+        slot.process = process
+        slot.started_at = slot.progressed_at = now
+        slot.heartbeat = 0
+        logger.info('[{}] Started worker {}, pid={}', self.name, slot.worker_id, process.pid)
+
+    def _stop_worker(self, slot, terminate=False):
+        process, slot.process = slot.process, None
+        if process is None:
+            return
+        if not terminate:
+            process.stop()
+            process.join(self.join_timeout)
+        if process.is_alive():
+            process.terminate()
+            process.join(self.join_timeout)
+        # cores reserved in this process, the worker only released its copy
+        process.release_affinity()
+
+    def _fail_worker(self, slot, now, reason):
+        self._stop_worker(slot, terminate=True)
+        slot.failures += 1
+        delay = min(self.backoff * 2 ** (slot.failures - 1), self.max_backoff)
+        slot.next_start = now + delay
+        logger.warning('[{}] Worker {} {}, restarting in {:.1f}s',
+                       self.name, slot.worker_id, reason, delay)
+
+    def _check_worker(self, slot, now):
+        process = slot.process
+        if process is None:
+            if now >= slot.next_start:
+                self._start_worker(slot, now)
+            return
+        if not process.is_alive():
+            self._fail_worker(slot, now, f'exited with code {process.exitcode}')
+            return
+        heartbeat = process.heartbeat
+        if heartbeat != slot.heartbeat:
+            slot.heartbeat, slot.progressed_at = heartbeat, now
+        elif self.heartbeat_timeout and process.running \
+                and now - slot.progressed_at > self.heartbeat_timeout:
+            self._fail_worker(slot, now, f'stalled at {process.ticks} ticks')
+            return
+        if slot.failures and now - slot.started_at > self.max_backoff:
+            slot.failures = 0
+
+    def _check_workers(self):
+        if self._closing:
+            return
+        now = time.monotonic()
+        for slot in list(self._slots.values()):
+            try:
+                self._check_worker(slot, now)
+            except Exception as e:
+                self._fail_worker(slot, now, f'failed starting: {e}')
+
+    def on_start(self):
+        with self._lock:
+            self._slots = {worker_id: _WorkerSlot(worker_id, keys)
+                           for worker_id, keys in self.assignments.items()}
+            self._check_workers()
+
+    def process(self):
+        with self._lock:
+            self._check_workers()
+
+    def on_stop(self):
+        with self._lock:
+            for slot in self._slots.values():
+                self._stop_worker(slot)
+            self._slots = {}
+
+    def join_workers(self, timeout=None, drain=True):
+        """Stop restarting workers, drain (or stop) and join them within
+        `timeout` seconds, terminating the rest, then stop the supervisor
+
+        :return: report of each worker by worker id, `dropped` is None for
+            workers terminated, whose pending work was never counted
+        """
+        with self._lock:
+            self._closing = True
+            slots, self._slots = self._slots, {}
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            return None if deadline is None else max(deadline - time.monotonic(), 0.)
+
+        for slot in slots.values():
+            if slot.process is None:
+                continue
+            if drain:
+                slot.process.drain(remaining())
+            else:
+                slot.process.stop()
+
+        report = {}
+        for worker_id, slot in slots.items():
+            process = slot.process
+            report[worker_id] = dict(keys=list(slot.keys), restarts=slot.restarts,
+                                     pid=None, exitcode=None, terminated=False)
+            if process is None:
+                continue
+            process.join(remaining())
+            terminated = process.is_alive()
+            if terminated:
+                logger.warning('[{}] Terminating worker {} not exited in time',
+                               self.name, worker_id)
+                process.terminate()
+                process.join(self.join_timeout)
+            process.release_affinity()
+            report[worker_id].update(process.report(), pid=process.pid,
+                                     exitcode=process.exitcode, terminated=terminated)
+            if terminated:
+                report[worker_id]['dropped'] = None
+        self.stop()
+        return report
+
+    @property
+    def workers(self):
+        """Worker processes currently started"""
+        with self._lock:
+            return [slot.process for slot in self._slots.values() if slot.process]
+
+    def stats(self):
+        """State of each worker, by worker id"""
+        with self._lock:
+            return {worker_id: dict(
+                pid=slot.process.pid if slot.process else None,
+                alive=bool(slot.process and slot.process.is_alive()),
+                running=bool(slot.process and slot.process.running),
+                ticks=slot.process.ticks if slot.process else 0,
+                keys=list(slot.keys), restarts=slot.restarts, failures=slot.failures
+            ) for worker_id, slot in self._slots.items()}
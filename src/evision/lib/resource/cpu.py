@@ -8,7 +8,10 @@
 # @version: 1.0
 #
 import os
+import re
 import sys
+import threading
+from collections import namedtuple
 
 from evision.lib.log import logutil
 
@@ -19,8 +22,15 @@ except ImportError:
 logger = logutil.get_logger()
 
 __all__ = [
+    'CpuAllocator',
+    'CpuInfo',
+    'CpuTopology',
+    'get_affinity',
+    'online_cpus',
+    'parse_cpu_list',
     'reserve',
-    'select'
+    'select',
+    'set_affinity'
 ]
 
 _proc_name = None
@@ -53,27 +63,168 @@ def reserve(wanted_cores, queue):
 
 
 def select(cpu_list, all_=False, name=None):
+    """Pin calling thread to CPUs of `cpu_list`, or all online CPUs"""
     if not cpu_list and not all_:
         raise AttributeError('invalid cpu list: {}'.format(cpu_list))
     if cpu_list and all_:
         raise AttributeError('invalid argument all=True when cpu list is not empty')
-    if os.name == 'nt':
+    if not hasattr(os, 'sched_setaffinity'):
         return
-    import ctypes
-    libc = ctypes.cdll.LoadLibrary('libc.so.6')
-    # System dependent, see e.g. /usr/include/x86_64-linux-gnu/asm/unistd_64.h
-    sys_gettid = 186
-    pid = libc.syscall(sys_gettid)
-    import subprocess
-    cmd = ['taskset']
-    cmd += ['-ap'] if all_ else [
-        '-cp',
-        ','.join(str(cpu) for cpu in cpu_list),
-    ]
-    cmd += [str(pid)]
-    taskset = subprocess.run(cmd, stdout=subprocess.DEVNULL)
-    if taskset.returncode != 0:
-        logger.info('[set-cpu] #{} failed: {}'.format(name or get_proc_name(), taskset.returncode))
+    try:
+        # not CPUs of current affinity, which is restricted once pinned
+        set_affinity(online_cpus() if all_ else cpu_list)
+    except OSError as e:
+        logger.info('[set-cpu] #{} failed: {}'.format(name or get_proc_name(), e))
         return False
     logger.info('[set-cpu] #{} succeed: {}'.format(name or get_proc_name(), 'all' if all_ else cpu_list))
     return True
+
+
+def parse_cpu_list(text):
+    """Parse CPU list of sysfs, e.g. `0-3,8,10-11`
+
+    >>> parse_cpu_list('0-3,8,10-11')
+    [0, 1, 2, 3, 8, 10, 11]
+    """
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def online_cpus(root=None):
+    """CPUs online, read from sysfs, or all CPUs counted without sysfs"""
+    online = CpuTopology._read(os.path.join(root or CpuTopology.SYSFS_ROOT, 'online'))
+    return parse_cpu_list(online) if online else list(range(os.cpu_count() or 1))
+
+
+def get_affinity(pid=0):
+    """CPUs allowed for the process, or calling thread if `pid` is 0"""
+    return sorted(os.sched_getaffinity(pid))
+
+
+def set_affinity(cpus, pid=0):
+    """Pin the process, or calling thread if `pid` is 0, to CPUs"""
+    os.sched_setaffinity(pid, set(cpus))
+
+
+CpuInfo = namedtuple('CpuInfo', ['cpu', 'core', 'package', 'node'])
+
+
+class CpuTopology(object):
+    """CPUs with their physical core, package and NUMA node
+
+    Read from `/sys/devices/system/cpu`, limited to CPUs allowed for the
+    current process. Without sysfs, each CPU is taken as a physical core.
+    """
+    SYSFS_ROOT = '/sys/devices/system/cpu'
+
+    def __init__(self, infos):
+        self.infos = {info.cpu: info for info in sorted(infos)}
+
+    @staticmethod
+    def _read(path, default=None):
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except OSError:
+            return default
+
+    @classmethod
+    def read(cls, root=SYSFS_ROOT, allowed=None):
+        if allowed is None:
+            allowed = set(get_affinity()) if hasattr(os, 'sched_getaffinity') \
+                else set(range(os.cpu_count() or 1))
+        online = cls._read(os.path.join(root, 'online'))
+        cpus = [_ for _ in parse_cpu_list(online) if _ in allowed] if online else sorted(allowed)
+        infos = []
+        for cpu in cpus:
+            path = os.path.join(root, f'cpu{cpu}')
+            core = cls._read(os.path.join(path, 'topology', 'core_id'))
+            package = cls._read(os.path.join(path, 'topology', 'physical_package_id'), 0)
+            nodes = [int(_[4:]) for _ in (os.listdir(path) if os.path.isdir(path) else [])
+                     if re.fullmatch(r'node\d+', _)]
+            infos.append(CpuInfo(cpu, cpu if core is None else int(core), int(package),
+                                 nodes[0] if nodes else 0))
+        return cls(infos)
+
+    @property
+    def cpus(self):
+        return list(self.infos)
+
+    def nodes(self):
+        """CPUs by NUMA node"""
+        nodes = {}
+        for info in self.infos.values():
+            nodes.setdefault(info.node, []).append(info.cpu)
+        return nodes
+
+    def cores(self):
+        """CPUs by physical core, SMT siblings share a core"""
+        cores = {}
+        for info in self.infos.values():
+            cores.setdefault((info.package, info.core), []).append(info.cpu)
+        return cores
+
+    def siblings(self, cpu):
+        info = self.infos[cpu]
+        return self.cores()[(info.package, info.core)]
+
+
+class CpuAllocator(object):
+    """Allocate CPUs of distinct physical cores to workers
+
+    Each allocation takes whole physical cores, and pins to one CPU of each
+    core (all SMT siblings with `smt`), so that allocated workers never share
+    physical cores. Cores of a single NUMA node are preferred. Once all cores
+    allocated, least allocated cores are shared.
+    """
+    _default = None
+
+    def __init__(self, topology: CpuTopology = None, smt=False):
+        self.topology = topology or CpuTopology.read()
+        self.smt = smt
+        self._lock = threading.Lock()
+        self._cores = self.topology.cores()
+        self._nodes = {core: self.topology.infos[cpus[0]].node for core, cpus in self._cores.items()}
+        self._allocated = {core: 0 for core in self._cores}
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def allocate(self, cores=1, node=None):
+        """CPUs of `cores` physical cores, on NUMA `node` if given"""
+        with self._lock:
+            candidates = [_ for _ in self._allocated if node is None or self._nodes[_] == node]
+            if not candidates:
+                raise ValueError(f'No CPU available on NUMA node {node}')
+            # least allocated first, on the node with most free cores
+            free_by_node = {}
+            for core in candidates:
+                if not self._allocated[core]:
+                    free_by_node[self._nodes[core]] = free_by_node.get(self._nodes[core], 0) + 1
+            candidates.sort(key=lambda _: (self._allocated[_], -free_by_node.get(self._nodes[_], 0),
+                                           self._nodes[_], _))
+            selected = candidates[:cores]
+            if self._allocated[selected[-1]]:
+                logger.info('[set-cpu] not enough free cores for {}, sharing cores', cores)
+            for core in selected:
+                self._allocated[core] += 1
+        return sorted(cpu for core in selected
+                      for cpu in (self._cores[core] if self.smt else self._cores[core][:1]))
+
+    def release(self, cpus):
+        with self._lock:
+            for core in {(self.topology.infos[_].package, self.topology.infos[_].core)
+                         for _ in cpus if _ in self.topology.infos}:
+                self._allocated[core] = max(self._allocated[core] - 1, 0)
+
+    @property
+    def free_cores(self):
+        return sum(1 for _ in self._allocated.values() if not _)
@@ -1,5 +1,97 @@
-from collections import defaultdict
-from queue import Queue
+import asyncio
+import threading
+import time
+import weakref
+from collections import defaultdict, deque
+from queue import Empty, Full, Queue
+
+_FULL = (Full, asyncio.QueueFull)
+_EMPTY = (Empty, asyncio.QueueEmpty)
+
+
+class Subscriber(tuple):
+    """
+    A subscriber of `Publisher`, unpacked as the tuple of `(queue,
+    properties)`, with counters of events published to it, dropped, and
+    pending in its queue (`lag`).
+
+    When its queue is full, the oldest event is dropped with `DROP_OLDEST`
+    policy, or the subscriber is unsubscribed and its stream ended with
+    `DISCONNECT` policy.
+    """
+    DROP_OLDEST = 'drop_oldest'
+    DISCONNECT = 'disconnect'
+
+    def __new__(cls, queue, properties, channel='default channel', policy=DROP_OLDEST):
+        if policy not in (cls.DROP_OLDEST, cls.DISCONNECT):
+            raise ValueError('Unknown subscriber policy: {}'.format(policy))
+        subscriber = super().__new__(cls, (queue, properties))
+        subscriber.channel = channel
+        subscriber.policy = policy
+        subscriber.published = 0
+        subscriber.dropped = 0
+        subscriber.disconnected = False
+        return subscriber
+
+    @property
+    def queue(self):
+        return self[0]
+
+    @property
+    def properties(self):
+        return self[1]
+
+    @property
+    def lag(self):
+        """
+        Number of events waiting in queue to be sent.
+        """
+        return self.queue.qsize()
+
+    def _drop_oldest(self):
+        try:
+            self.queue.get_nowait()
+            self.dropped += 1
+        except _EMPTY:
+            pass
+
+    def put(self, data):
+        """
+        Puts data into queue with the policy.
+
+        Returns False if data or the oldest data dropped, or disconnected.
+        """
+        if self.disconnected:
+            return False
+        self.published += 1
+        dropped = False
+        while True:
+            try:
+                self.queue.put_nowait(data)
+                return not dropped
+            except _FULL:
+                if self.policy == self.DISCONNECT:
+                    self.disconnected = True
+                    self.dropped += 1
+                    self.end()
+                    return False
+                self._drop_oldest()
+                dropped = True
+
+    def end(self):
+        """
+        Ends the stream, dropping the oldest event if queue full.
+        """
+        while True:
+            try:
+                self.queue.put_nowait(Publisher.END_STREAM)
+                return
+            except _FULL:
+                self._drop_oldest()
+
+    def stats(self):
+        return dict(channel=self.channel, published=self.published, dropped=self.dropped,
+                    lag=self.lag, disconnected=self.disconnected)
 
 
 class Publisher(object):
@@ -8,15 +100,32 @@ class Publisher(object):
 
     Each subscriber can have its own private data and may subscribe to
     different channel.
+
+    Each subscriber buffers up to `max_queue_size` events (0 for unbounded),
+    and applies `policy` of `Subscriber` when full, so that a stalled client
+    does not grow memory without limit.
+
+    With `replay_size`, recent events of each channel are kept, up to
+    `replay_size` events of no older than `replay_age` seconds, with ids
+    increasing monotonically, so that clients reconnected with the id of
+    the last event received are replayed with events missed.
     """
     END_STREAM = {}
     ALL_CHANNELS = '__ALL_CHANNELS__'
 
-    def __init__(self):
+    def __init__(self, max_queue_size=1024, policy=Subscriber.DROP_OLDEST,
+                 replay_size=0, replay_age=None):
         """
         Creates a new publisher with an empty list of subscribers.
         """
         self.subscribers_by_channel = defaultdict(list)
+        self.max_queue_size = max_queue_size
+        self.policy = policy
+        self.replay_size = replay_size
+        self.replay_age = replay_age
+        self.replay_by_channel = defaultdict(lambda: deque(maxlen=self.replay_size))
+        self.last_event_id = 0
+        self._lock = threading.RLock()
 
     def _get_subscribers_lists(self, channel):
         if isinstance(channel, str):
@@ -29,6 +138,37 @@ class Publisher(object):
             for channel_name in channel:
                 yield self.subscribers_by_channel[channel_name]
 
+    def _get_replay_buffers(self, channel):
+        if isinstance(channel, str):
+            if channel == Publisher.ALL_CHANNELS:
+                for channel_name in set(self.subscribers_by_channel) | set(self.replay_by_channel):
+                    yield self.replay_by_channel[channel_name]
+            else:
+                yield self.replay_by_channel[channel]
+        else:
+            for channel_name in channel:
+                yield self.replay_by_channel[channel_name]
+
+    def _expire(self, buffer, now):
+        if self.replay_age is None:
+            return
+        while buffer and now - buffer[0][1] > self.replay_age:
+            buffer.popleft()
+
+    def _replay(self, channel, last_event_id, subscriber):
+        try:
+            last_event_id = int(last_event_id)
+        except (TypeError, ValueError):
+            return
+        now, events = time.monotonic(), {}
+        for buffer in self._get_replay_buffers(channel):
+            self._expire(buffer, now)
+            for event_id, _, chunk in buffer:
+                if event_id > last_event_id:
+                    events[event_id] = chunk
+        for event_id in sorted(events):
+            subscriber.put(events[event_id])
+
     def get_subscribers(self, channel='default channel'):
         """
         Returns a generator of all subscribers in the given channel.
@@ -41,17 +181,35 @@ class Publisher(object):
             yield from subscriber_list
 
     @staticmethod
-    def _publish_single(data, queue):
+    def format_event(data, event=None, id=None):
+        """
+        Frames data as a Server-Sent-Event, with optional `event` type and
+        `id` fields, ending with a blank line.
+        """
+        lines = []
+        if id is not None:
+            lines.append('id: {}\n'.format(id))
+        if event is not None:
+            lines.append('event: {}\n'.format(event))
+        for line in str(data).split('\n'):
+            lines.append('data: {}\n'.format(line))
+        lines.append('\n')
+        return ''.join(lines)
+
+    @staticmethod
+    def _publish_single(data, subscriber):
         """
         Publishes a single piece of data to a single user. Data is encoded as
         required.
         """
-        str_data = str(data)
-        for line in str_data.split('\n'):
-            queue.put('data: {}\n'.format(line))
-        queue.put('\n')
+        subscriber.put(Publisher.format_event(data))
+
+    def _remove_disconnected(self, subscribers):
+        for subscriber in subscribers:
+            if subscriber.disconnected:
+                self.remove_subscriber(subscriber, subscriber.channel)
 
-    def publish(self, data, channel='default channel'):
+    def publish(self, data, channel='default channel', event=None, id=None):
         """
         Publishes data to all subscribers of the given channel.
 
@@ -62,18 +220,37 @@ class Publisher(object):
         If data is callable, the return of `data(properties)` will be published
         instead, for the `properties` object of each subscriber. This allows
         for customized events.
+
+        `event` and `id` are set as the event type and id fields of the event.
+        With replay enabled, ids are assigned by the publisher unless given
+        increasing, e.g. relayed by `PublisherBridge`, and events other than
+        callable data are kept for replay.
         """
-        # Note we call `str` here instead of leaving it to each subscriber's
-        # `format` call. The reason is twofold: this caches the same between
-        # subscribers, and is not prone to time differences.
-        if callable(data):
-            for queue, properties in self.get_subscribers(channel):
-                value = data(properties)
-                if value:
-                    self._publish_single(value, queue)
-        else:
-            for queue, _ in self.get_subscribers(channel):
-                self._publish_single(data, queue)
+        with self._lock:
+            if self.replay_size:
+                if id is None:
+                    id = self.last_event_id + 1
+                elif not isinstance(id, int) or id <= self.last_event_id:
+                    raise ValueError(f'Event id {id!r} not increasing from {self.last_event_id}')
+                self.last_event_id = id
+            subscribers = list(self.get_subscribers(channel))
+            if callable(data):
+                for subscriber in subscribers:
+                    value = data(subscriber.properties)
+                    if value:
+                        subscriber.put(self.format_event(value, event, id))
+            else:
+                # Framed once, the same immutable chunk is shared by subscribers,
+                # which is cheap and not prone to time differences.
+                chunk = self.format_event(data, event, id)
+                for subscriber in subscribers:
+                    subscriber.put(chunk)
+                if self.replay_size:
+                    now = time.monotonic()
+                    for buffer in self._get_replay_buffers(channel):
+                        buffer.append((id, now, chunk))
+                        self._expire(buffer, now)
+            self._remove_disconnected(subscribers)
 
     def subscribe_all(self, properties=None, initial_data=None):
         """
@@ -81,7 +258,8 @@ class Publisher(object):
         """
         return self.subscribe(Publisher.ALL_CHANNELS, properties, initial_data)
 
-    def subscribe(self, channel='default channel', properties=None, initial_data=None):
+    def subscribe(self, channel='default channel', properties=None, initial_data=None,
+                  last_event_id=None):
         """
         Subscribes to the channel, returning an infinite generator of
         Server-Sent-Events.
@@ -95,37 +273,176 @@ class Publisher(object):
 
         If the list `initial_data` is passed, all data there will be sent
         before the regular channel process starts.
+
+        If `last_event_id` is passed, e.g. `Last-Event-ID` header of a client
+        reconnected, events after it kept for replay are sent then.
+        """
+        subscriber = self.add_subscriber(channel, properties, initial_data, last_event_id)
+        generator = self._make_generator(subscriber)
+        # unsubscribe generators garbage collected before started as well
+        weakref.finalize(generator, self.remove_subscriber, subscriber, channel)
+        return generator
+
+    def add_subscriber(self, channel='default channel', properties=None, initial_data=None,
+                       last_event_id=None):
+        """
+        Subscribes to the channel like `subscribe`, returning the `Subscriber`
+        unpacked as tuple of `(queue, properties)`, where Server-Sent-Events
+        are put into the queue.
         """
-        queue = Queue()
         properties = properties or {}
-        subscriber = (queue, properties)
+        subscriber = Subscriber(self._make_queue(), properties, channel, self.policy)
 
         if initial_data is not None:
             for data in initial_data:
-                self._publish_single(data, queue)
+                self._publish_single(data, subscriber)
+
+        with self._lock:
+            if last_event_id is not None:
+                self._replay(channel, last_event_id, subscriber)
+            for subscribers_list in self._get_subscribers_lists(channel):
+                subscribers_list.append(subscriber)
 
+        return subscriber
+
+    def remove_subscriber(self, subscriber, channel='default channel'):
+        """
+        Unsubscribes the subscriber returned by `add_subscriber` from the
+        channel.
+        """
         for subscribers_list in self._get_subscribers_lists(channel):
-            subscribers_list.append(subscriber)
+            if subscriber in subscribers_list:
+                subscribers_list.remove(subscriber)
 
-        return self._make_generator(queue)
+    def stats(self, channel=ALL_CHANNELS):
+        """
+        Returns counters of each subscriber in the given channel.
+        """
+        subscribers = {id(_): _ for _ in self.get_subscribers(channel)}
+        return [_.stats() for _ in subscribers.values()]
 
-    @staticmethod
-    def _make_generator(queue):
+    def _make_queue(self):
+        return Queue(self.max_queue_size)
+
+    def _make_generator(self, subscriber):
         """
         Returns a generator that reads data from the queue, emitting data
         events, while the Publisher.END_STREAM value is not received.
+        Unsubscribes once the generator closed.
         """
-        while True:
-            data = queue.get()
-            if data is Publisher.END_STREAM:
-                return
-            yield data
+        try:
+            while True:
+                data = subscriber.queue.get()
+                if data is Publisher.END_STREAM:
+                    return
+                yield data
+        finally:
+            self.remove_subscriber(subscriber, subscriber.channel)
 
     def close(self):
         """
         Closes all active subscriptions.
         """
         for channel in self.subscribers_by_channel.values():
-            for queue, _ in channel:
-                queue.put(Publisher.END_STREAM)
+            for subscriber in channel:
+                subscriber.end()
             channel.clear()
+
+
+class AsyncSubscription(object):
+    """
+    Async iterator of Server-Sent-Events of a subscriber of `AsyncPublisher`,
+    unsubscribed once closed, ended, or garbage collected.
+    """
+
+    def __init__(self, publisher, channel, subscriber):
+        self.publisher = publisher
+        self.channel = channel
+        self.subscriber = subscriber
+        self.queue = subscriber[0]
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed:
+            raise StopAsyncIteration
+        data = await self.queue.get()
+        if data is Publisher.END_STREAM:
+            self.close()
+            raise StopAsyncIteration
+        return data
+
+    def ready(self):
+        """
+        Returns events available without waiting, so that they could be
+        written to client at once.
+        """
+        events = []
+        while not self.closed and not self.queue.empty():
+            data = self.queue.get_nowait()
+            if data is Publisher.END_STREAM:
+                # ends iteration on next wait
+                self.queue.put_nowait(data)
+                break
+            events.append(data)
+        return events
+
+    def close(self):
+        """
+        Unsubscribes, and wakes up the waiting iteration to end.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.publisher.remove_subscriber(self.subscriber, self.channel)
+        self.subscriber.end()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class AsyncPublisher(Publisher):
+    """
+    Publisher for asyncio, e.g. Tornado, with subscriptions being async
+    iterators, so that thousands of subscribers are served by the event loop
+    without a thread for each.
+
+    Subscribers and publishing are owned by the event loop, call
+    `publish_threadsafe` to publish from other threads. The loop is `loop`
+    if given, or the running loop of the first subscriber.
+    """
+
+    def __init__(self, max_queue_size=1024, policy=Subscriber.DROP_OLDEST,
+                 replay_size=0, replay_age=None, loop=None):
+        super().__init__(max_queue_size, policy, replay_size, replay_age)
+        self.loop = loop
+
+    def _make_queue(self):
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        return asyncio.Queue(self.max_queue_size)
+
+    def subscribe(self, channel='default channel', properties=None, initial_data=None,
+                  last_event_id=None):
+        """
+        Subscribes to the channel like `Publisher.subscribe`, returning an
+        `AsyncSubscription` iterated with `async for`.
+        """
+        subscriber = self.add_subscriber(channel, properties, initial_data, last_event_id)
+        return AsyncSubscription(self, channel, subscriber)
+
+    def publish_threadsafe(self, data, channel='default channel', event=None, id=None):
+        """
+        Publishes data from another thread, in the event loop.
+        """
+        with self._lock:
+            if self.loop is None:
+                # no subscriber yet, only replay buffers to update
+                self.publish(data, channel, event, id)
+                return
+        self.loop.call_soon_threadsafe(self.publish, data, channel, event, id)
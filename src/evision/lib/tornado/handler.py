@@ -4,18 +4,23 @@
 
 import cv2
 import numpy as np
+import tornado.iostream
 import tornado.web
 from webargs import ValidationError
 from webargs.tornadoparser import HTTPError
 
 from evision.lib.constant import Message, Status
 from evision.lib.log import logutil
+from evision.lib.parallel import WorkerMetrics
+from evision.lib.sse import AsyncPublisher
 from evision.lib.tornado.response import Response
 
 logger = logutil.get_logger()
 
 __all__ = [
     'BaseHandler',
+    'PrometheusMetricsHandler',
+    'SSEHandler',
     'TestIndexHandler'
 ]
 
@@ -232,6 +237,72 @@ class BaseHandler(tornado.web.RequestHandler):
         return image, filename
 
 
+class PrometheusMetricsHandler(BaseHandler):
+    """Metrics of workers in Prometheus text format
+
+    Initialized with `workers`, wrappers (e.g. `ThreadWrapper`,
+    `ProcessWrapper`), or a callable returning them, such as
+    `lambda: supervisor.workers`
+    """
+
+    def initialize(self, workers=()):
+        self.workers = workers
+
+    def _get(self):
+        workers = self.workers() if callable(self.workers) else self.workers
+        snapshots = {_.name: _.metrics.snapshot() for _ in workers}
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.finish(WorkerMetrics.to_prometheus(snapshots))
+
+
+class SSEHandler(BaseHandler):
+    """Server-Sent-Events of channel of an `AsyncPublisher`, streamed until
+    publisher closed or client disconnected
+
+    Initialized with `publisher` and `channel`, override `get_properties`
+    to subscribe with properties of the request, e.g. user of the client.
+    Clients reconnected with `Last-Event-ID` header are replayed with events
+    missed, if replay enabled for the publisher.
+    """
+
+    def initialize(self, publisher: AsyncPublisher, channel='default channel'):
+        self.publisher = publisher
+        self.channel = channel
+        self.subscription = None
+        self.disconnected = False
+
+    def set_default_headers(self):
+        super().set_default_headers()
+        self.set_header('Content-Type', 'text/event-stream; charset=UTF-8')
+        self.set_header('Cache-Control', 'no-cache')
+        # disable buffering of nginx
+        self.set_header('X-Accel-Buffering', 'no')
+
+    def get_properties(self):
+        return None
+
+    async def get(self, *args, **kwargs):
+        self.subscription = self.publisher.subscribe(
+            self.channel, self.get_properties(),
+            last_event_id=self.request.headers.get('Last-Event-ID'))
+        try:
+            async for event in self.subscription:
+                self.write(event)
+                [self.write(_) for _ in self.subscription.ready()]
+                await self.flush()
+        except tornado.iostream.StreamClosedError:
+            return
+        finally:
+            self.subscription.close()
+        if not self.disconnected:
+            self.finish()
+
+    def on_connection_close(self):
+        self.disconnected = True
+        if self.subscription is not None:
+            self.subscription.close()
+
+
 class TestIndexHandler(BaseHandler):
     # @tornado.web.authenticated
     def get(self):
@@ -8,7 +8,10 @@
 # @version: 1.0
 
 from ._cache import CacheUtil
-from ._collection import DictUtil
+from ._codec import Codec, JpegCodec, Lz4Codec, PngCodec, RawCodec, WebpCodec, ZlibCodec
+from ._collection import DictUtil, SequencedQueue
 from ._draw import DrawUtil
+from ._envelope import FrameEnvelope, FrameHeader
+from ._hash import ConsistentHashRing
 from ._path import PathUtil
 from ._sys import SysUtil
@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 13:20
+# @version: 1.0
+#
+import zlib
+
+import cv2
+import numpy as np
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+__all__ = [
+    'Codec',
+    'RawCodec',
+    'ZlibCodec',
+    'Lz4Codec',
+    'PngCodec',
+    'JpegCodec',
+    'WebpCodec'
+]
+
+
+class Codec(object):
+    """Frame encoding used before sending frames over the wire
+
+    Byte codecs compress serialized bytes, image codecs (`on_array`) encode
+    ndarray frames directly. Codec ids are kept in `FrameEnvelope` headers,
+    so that readers could decode frames without knowing the codec.
+    """
+    codec_id = None
+    name = None
+    on_array = False
+    lossless = True
+
+    _codecs = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.codec_id is not None:
+            Codec._codecs[cls.codec_id] = cls
+
+    @staticmethod
+    def get(codec_id):
+        if codec_id not in Codec._codecs:
+            raise ValueError(f'Unknown codec: {codec_id}')
+        return Codec._codecs[codec_id]()
+
+    def encode(self, data):
+        raise NotImplementedError
+
+    def decode(self, data):
+        raise NotImplementedError
+
+    def __str__(self):
+        return self.name
+
+
+class RawCodec(Codec):
+    codec_id = 0
+    name = 'raw'
+
+    def encode(self, data):
+        return data
+
+    def decode(self, data):
+        return data
+
+
+class ZlibCodec(Codec):
+    codec_id = 1
+    name = 'zlib'
+
+    def __init__(self, level=1):
+        self.level = level
+
+    def encode(self, data):
+        return zlib.compress(data, self.level)
+
+    def decode(self, data):
+        return zlib.decompress(data)
+
+
+class Lz4Codec(Codec):
+    codec_id = 2
+    name = 'lz4'
+
+    def __init__(self, level=0):
+        if lz4_frame is None:
+            raise ImportError('Package lz4 is required for lz4 codec')
+        self.level = level
+
+    def encode(self, data):
+        return lz4_frame.compress(data, compression_level=self.level)
+
+    def decode(self, data):
+        return lz4_frame.decompress(data)
+
+
+class _ImageCodec(Codec):
+    on_array = True
+    extension = None
+    dtypes = (np.uint8,)
+
+    def _params(self):
+        return []
+
+    def encode(self, frame: np.ndarray):
+        if frame.dtype not in self.dtypes:
+            raise ValueError(f'Unsupported frame dtype for {self.name}: {frame.dtype}')
+        succeed, encoded = cv2.imencode(self.extension, frame, self._params())
+        if not succeed:
+            raise ValueError(f'Failed encoding frame of {frame.shape} with {self.name}')
+        return encoded.tobytes()
+
+    def decode(self, data):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if frame is None:
+            raise ValueError(f'Failed decoding {len(data)} bytes with {self.name}')
+        return frame
+
+
+class PngCodec(_ImageCodec):
+    codec_id = 3
+    name = 'png'
+    extension = '.png'
+    dtypes = (np.uint8, np.uint16)
+
+    def __init__(self, compression=1):
+        self.compression = compression
+
+    def _params(self):
+        return [cv2.IMWRITE_PNG_COMPRESSION, self.compression]
+
+
+class JpegCodec(_ImageCodec):
+    codec_id = 4
+    name = 'jpeg'
+    extension = '.jpg'
+    lossless = False
+
+    def __init__(self, quality=90):
+        self.quality = quality
+
+    def _params(self):
+        return [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+
+
+class WebpCodec(_ImageCodec):
+    codec_id = 5
+    name = 'webp'
+    extension = '.webp'
+    lossless = False
+
+    def __init__(self, quality=90):
+        self.quality = quality
+
+    def _params(self):
+        return [cv2.IMWRITE_WEBP_QUALITY, self.quality]
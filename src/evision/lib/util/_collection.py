@@ -8,6 +8,8 @@
 # @version: 1.0
 #
 import collections
+import threading
+from queue import Queue
 from typing import Dict
 
 
@@ -24,6 +26,32 @@ class DictUtil(object):
         return map
 
 
+class SequencedQueue(Queue):
+    """Queue counting items ever put, notifying `updated` on each put
+
+    Observers (e.g. mirrors) wait on `updated` instead of `not_empty`, so
+    that they never steal wake-ups from consumers blocking on `get`.
+    """
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self.sequence = 0
+        self.updated = threading.Condition(self.mutex)
+
+    def _put(self, item):
+        super()._put(item)
+        self.sequence += 1
+        self.updated.notify_all()
+
+    def newest(self, count):
+        """Newest `count` items in chronological order, must hold `mutex`"""
+        count = min(count, len(self.queue))
+        if count <= 0:
+            return []
+        return [self.queue[i] for i in range(len(self.queue) - count, len(self.queue))]
+
+
 __all__ = [
-    'DictUtil'
+    'DictUtil',
+    'SequencedQueue'
 ]
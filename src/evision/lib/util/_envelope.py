@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 11:05
+# @version: 1.0
+#
+import struct
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from ._codec import Codec
+
+__all__ = [
+    'FrameEnvelope',
+    'FrameHeader'
+]
+
+FrameHeader = namedtuple('FrameHeader', [
+    'shape', 'dtype', 'frame_id', 'source_id', 'timestamp', 'codec', 'nbytes'
+])
+
+
+class FrameEnvelope(object):
+    """Self-describing binary frame: fixed-size header followed by raw buffer
+
+    Header layout (little endian, 64 bytes):
+        magic(2s) version(B) codec(B) dtype(4s) ndim(B) flags(B) padding(2x)
+        shape(4I) frame_id(q) source_id(q) timestamp(d) nbytes(Q) padding(4x)
+
+    Integer ids are kept in the header. String ids (flagged in `flags`) are
+    kept as utf-8 right after the header instead, frame id first, with their
+    sizes in the id fields.
+    """
+    MAGIC = b'EV'
+    VERSION = 1
+    MAX_DIMS = 4
+    CODEC_RAW = 0
+    FLAG_STR_FRAME_ID = 1
+    FLAG_STR_SOURCE_ID = 2
+
+    _struct = struct.Struct('<2sBB4sBB2x4IqqdQ4x')
+    HEADER_SIZE = _struct.size
+
+    @classmethod
+    def pack_header(cls, shape, dtype, nbytes, frame_id=0, source_id=0,
+                    timestamp=None, codec=CODEC_RAW):
+        ndim = len(shape)
+        if ndim > cls.MAX_DIMS:
+            raise ValueError(f'Frame of {ndim} dimensions not supported')
+        dims = tuple(shape) + (0,) * (cls.MAX_DIMS - ndim)
+        flags, ids = 0, []
+        if isinstance(frame_id, str):
+            flags |= cls.FLAG_STR_FRAME_ID
+            ids.append(frame_id.encode())
+            frame_id = len(ids[-1])
+        if isinstance(source_id, str):
+            flags |= cls.FLAG_STR_SOURCE_ID
+            ids.append(source_id.encode())
+            source_id = len(ids[-1])
+        header = cls._struct.pack(
+            cls.MAGIC, cls.VERSION, codec, np.dtype(dtype).str.encode(), ndim, flags,
+            *dims, int(frame_id or 0), int(source_id or 0),
+            time.time() if timestamp is None else float(timestamp), nbytes)
+        return b''.join((header, *ids)) if ids else header
+
+    @classmethod
+    def pack(cls, frame: np.ndarray, frame_id=0, source_id=0, timestamp=None,
+             codec: Codec = None) -> bytes:
+        """Pack frame and its meta into one buffer
+
+        Raw frames are copied only once, encoded frames keep the codec id in
+        header so that readers could decode them without configuration.
+        """
+        frame = np.ascontiguousarray(frame)
+        if codec is None or codec.codec_id == cls.CODEC_RAW:
+            payload = memoryview(frame).cast('B')
+        elif codec.on_array:
+            payload = codec.encode(frame)
+        else:
+            payload = codec.encode(memoryview(frame).cast('B'))
+        header = cls.pack_header(frame.shape, frame.dtype, len(payload),
+                                 frame_id, source_id, timestamp,
+                                 cls.CODEC_RAW if codec is None else codec.codec_id)
+        return b''.join((header, payload))
+
+    @classmethod
+    def unpack_header(cls, buffer) -> FrameHeader:
+        return cls._unpack_header(buffer)[0]
+
+    @classmethod
+    def _unpack_header(cls, buffer):
+        """Header and offset of payload"""
+        if len(buffer) < cls.HEADER_SIZE:
+            raise ValueError(f'Invalid frame envelope of {len(buffer)} bytes')
+        magic, version, codec, dtype, ndim, flags, *fields = cls._struct.unpack_from(buffer)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f'Invalid frame envelope: magic={magic}, version={version}')
+        dims, (frame_id, source_id, timestamp, nbytes) = fields[:cls.MAX_DIMS], fields[cls.MAX_DIMS:]
+        offset = cls.HEADER_SIZE
+        if flags & cls.FLAG_STR_FRAME_ID:
+            frame_id, offset = cls._read_id(buffer, offset, frame_id)
+        if flags & cls.FLAG_STR_SOURCE_ID:
+            source_id, offset = cls._read_id(buffer, offset, source_id)
+        return FrameHeader(tuple(dims[:ndim]), np.dtype(dtype.rstrip(b'\0').decode()),
+                           frame_id, source_id, timestamp, codec, nbytes), offset
+
+    @staticmethod
+    def _read_id(buffer, offset, size):
+        if len(buffer) < offset + size:
+            raise ValueError(f'Invalid frame envelope of {len(buffer)} bytes')
+        return bytes(buffer[offset:offset + size]).decode(), offset + size
+
+    @classmethod
+    def unpack(cls, buffer):
+        """Decode header and frame, raw frames are read-only views over the
+        buffer without copying
+
+        :return: tuple of (FrameHeader, frame)
+        """
+        header, offset = cls._unpack_header(buffer)
+        payload_size = len(buffer) - offset
+        if payload_size != header.nbytes:
+            raise ValueError(f'Frame payload of {payload_size} bytes, expected {header.nbytes}')
+        if header.codec == cls.CODEC_RAW:
+            frame = np.frombuffer(buffer, dtype=header.dtype, offset=offset)
+        else:
+            codec = Codec.get(header.codec)
+            frame = codec.decode(memoryview(buffer)[offset:])
+            if not codec.on_array:
+                frame = np.frombuffer(frame, dtype=header.dtype)
+        return header, frame.reshape(header.shape)
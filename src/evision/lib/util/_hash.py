@@ -0,0 +1,70 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 16:20
+# @version: 1.0
+#
+import bisect
+import hashlib
+
+__all__ = [
+    'ConsistentHashRing'
+]
+
+
+class ConsistentHashRing(object):
+    """Consistent hashing of keys to nodes with virtual nodes
+
+    Adding or removing one of N nodes only remaps about 1/N of keys.
+    """
+
+    def __init__(self, nodes=(), replicas=160):
+        self.replicas = replicas
+        self._nodes = []
+        self._hashes = []
+        self._ring = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(str(value).encode()).digest()[:8], 'big')
+
+    def add(self, node):
+        if node in self._nodes:
+            return
+        self._nodes.append(node)
+        for i in range(self.replicas):
+            point = self._hash(f'{node}#{i}')
+            self._ring[point] = node
+            bisect.insort(self._hashes, point)
+
+    def remove(self, node):
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        for i in range(self.replicas):
+            point = self._hash(f'{node}#{i}')
+            if self._ring.get(point) == node:
+                del self._ring[point]
+                self._hashes.remove(point)
+
+    def get(self, key):
+        """Node owning the key, None if ring is empty"""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._ring[self._hashes[index]]
+
+    @property
+    def nodes(self):
+        return list(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, node):
+        return node in self._nodes
@@ -7,60 +7,348 @@
 # @date: 2019-11-20 16:30
 # @version: 1.0
 #
+import asyncio
+import json
 import os
 import pickle
+import socket
+import threading
 import time
-from queue import Queue
-from typing import List, Tuple, Union
+import weakref
+from queue import Empty, Queue
+from typing import List, Sequence, Tuple, Union
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit
 
 import numpy as np
 from numpy import ndarray as nda
-from redis import Redis
+from redis import BlockingConnectionPool, Redis, ResponseError
 from walrus import Database
 
+try:
+    from redis import asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+from evision.lib.entity import ImageFrame
+from evision.lib.parallel import ThreadWrapper
+from evision.lib.sse import AsyncPublisher, Publisher
+from evision.lib.util import Codec, ConsistentHashRing, FrameEnvelope, SequencedQueue
+
+
+class RedisConnectionRegistry(object):
+    """Process-wide redis clients, sharing one connection pool per endpoint
+
+    Endpoint defaults to `REDIS_URL`, or `REDIS_HOST`, `REDIS_PORT` and
+    `REDIS_PASSWORD`, with `db` and `password` given explicitly overriding
+    those of the URL. Pool size, pool timeout and socket keepalive are read
+    from `REDIS_MAX_CONNECTIONS`, `REDIS_POOL_TIMEOUT` and
+    `REDIS_SOCKET_KEEPALIVE`, or set by `configure`. Pools are dropped in
+    forked children (e.g. `ProcessWrapper`), so that sockets of parent
+    process are never shared.
+
+    With shards configured (`configure(shards=...)` or comma separated URLs
+    in `REDIS_SHARDS`), queues without explicit client bind to the shard
+    owning their keys.
+
+    Once `max_connections` are checked out, callers wait up to `pool_timeout`
+    seconds for one to be released before `ConnectionError` is raised.
+    Blocking consumers hold their connection for the whole blocking call,
+    i.e. each `PopSource`, `RedisQueueMirror` (BRPOP) and pub/sub listener
+    keeps one busy, so the cap must exceed the number of such consumers
+    sharing an endpoint, or every other caller starves until they return.
+    """
+    max_connections = int(os.getenv('REDIS_MAX_CONNECTIONS', '64'))
+    pool_timeout = float(os.getenv('REDIS_POOL_TIMEOUT', '20'))
+    socket_keepalive = os.getenv('REDIS_SOCKET_KEEPALIVE', '1') not in ('0', 'false', '')
+    connection_kwargs = {}
+    router = None
+
+    _lock = threading.Lock()
+    _clients = {}
+    _async_clients = weakref.WeakKeyDictionary()
+    _pid = os.getpid()
+
+    @classmethod
+    def configure(cls, max_connections=None, socket_keepalive=None, shards: List[str] = None,
+                  pool_timeout=None, **connection_kwargs):
+        """Update pool options, applied to endpoints connected afterwards"""
+        if max_connections is not None:
+            cls.max_connections = max_connections
+        if pool_timeout is not None:
+            cls.pool_timeout = pool_timeout
+        if socket_keepalive is not None:
+            cls.socket_keepalive = socket_keepalive
+        if shards is not None:
+            cls.router = RedisShardRouter(shards) if shards else None
+        cls.connection_kwargs.update(connection_kwargs)
+
+    @staticmethod
+    def _endpoint(url=None, host=None, port=None, db=None, password=None):
+        if url is None and host is None:
+            url = os.getenv('REDIS_URL')
+        if url:
+            return RedisConnectionRegistry._override_url(url, db, password),
+        return (host or os.getenv('REDIS_HOST', 'localhost'),
+                int(port or os.getenv('REDIS_PORT', '6379')),
+                int(db or 0), password or os.getenv('REDIS_PASSWORD'))
+
+    @staticmethod
+    def _override_url(url, db=None, password=None):
+        """URL with `db` and `password` given explicitly instead of its own"""
+        if db is None and not password:
+            return url
+        parts = urlsplit(url)
+        query = [(name, value) for name, value in parse_qsl(parts.query)
+                 if not (name == 'db' and db is not None or name == 'password' and password)]
+        path, netloc = parts.path, parts.netloc
+        if db is not None:
+            if parts.scheme == 'unix':
+                query.append(('db', str(int(db))))
+            else:
+                path = f'/{int(db)}'
+        if password and parts.scheme == 'unix':
+            query.append(('password', password))
+        elif password:
+            userinfo, _, hostinfo = netloc.rpartition('@')
+            netloc = f'{userinfo.partition(":")[0]}:{quote(password, safe="")}@{hostinfo}'
+        # not urlunsplit, which drops `//` of unix:///path
+        return f'{parts.scheme}://{netloc}{path}' + (f'?{urlencode(query)}' if query else '')
+
+    @classmethod
+    def _create_pool(cls, endpoint, pool_class=BlockingConnectionPool):
+        options = dict(max_connections=cls.max_connections, timeout=cls.pool_timeout,
+                       socket_keepalive=cls.socket_keepalive,
+                       **cls.connection_kwargs)
+        if len(endpoint) == 1:
+            return pool_class.from_url(endpoint[0], **options)
+        host, port, db, password = endpoint
+        return pool_class(host=host, port=port, db=db, password=password, **options)
+
+    @classmethod
+    def get_client(cls, url=None, host=None, port=None, db=None, password=None) -> Database:
+        endpoint = cls._endpoint(url, host, port, db, password)
+        if cls._pid != os.getpid():
+            cls._after_fork()
+        client = cls._clients.get(endpoint)
+        if client is not None:
+            return client
+        with cls._lock:
+            if endpoint not in cls._clients:
+                cls._clients[endpoint] = Database(connection_pool=cls._create_pool(endpoint))
+            return cls._clients[endpoint]
+
+    @classmethod
+    def get_async_client(cls, url=None, host=None, port=None, db=None, password=None):
+        """asyncio client of current event loop, connections are bound to it"""
+        if aioredis is None:
+            raise NotImplementedError('redis>=4.2 is required for asyncio client')
+        endpoint = cls._endpoint(url, host, port, db, password)
+        if cls._pid != os.getpid():
+            cls._after_fork()
+        with cls._lock:
+            clients = cls._async_clients.setdefault(asyncio.get_event_loop(), {})
+            if endpoint not in clients:
+                pool = cls._create_pool(endpoint, aioredis.BlockingConnectionPool)
+                clients[endpoint] = aioredis.Redis(connection_pool=pool)
+            return clients[endpoint]
+
+    @classmethod
+    def get_client_for(cls, key) -> Database:
+        """Client of the shard owning `key`, or the default one"""
+        if cls.router is None:
+            return cls.get_client()
+        return cls.get_client(url=cls.router.locate(key))
+
+    @classmethod
+    def get_async_client_for(cls, key):
+        """asyncio client of the shard owning `key` on current ring, without
+        looking up previous shard during rebalance, see `locate_async_client`"""
+        if cls.router is None:
+            return cls.get_async_client()
+        return cls.get_async_client(url=cls.router.get(key))
+
+    @classmethod
+    async def locate_async_client(cls, key):
+        """asyncio client of the shard holding `key`, like `get_client_for`"""
+        if cls.router is None:
+            return cls.get_async_client()
+        return cls.get_async_client(url=await cls.router.locate_async(key))
+
+    @classmethod
+    def reset(cls):
+        """Disconnect and drop all pools of current process"""
+        with cls._lock:
+            for client in cls._clients.values():
+                client.connection_pool.disconnect()
+            cls._clients = {}
+            cls._async_clients = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def _after_fork(cls):
+        # connections belong to parent process, leave them untouched
+        cls._lock = threading.Lock()
+        cls._clients = {}
+        cls._async_clients = weakref.WeakKeyDictionary()
+        cls._pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=RedisConnectionRegistry._after_fork)
+
+
+class RedisShardRouter(object):
+    """Maps keys to redis endpoints (URLs) with consistent hashing
+
+    After `rebalance` keys are looked up on their previous shards as well,
+    until they are moved by `migrate` or the rebalance is finished.
+    """
+
+    def __init__(self, endpoints: List[str], replicas=160):
+        self.ring = ConsistentHashRing(endpoints, replicas)
+        self.previous = None
+
+    @property
+    def endpoints(self):
+        return self.ring.nodes
+
+    def get(self, key):
+        """Endpoint owning the key on current ring"""
+        return self.ring.get(key)
+
+    def locate(self, key):
+        """Endpoint holding the key, previous shard if not migrated yet"""
+        endpoint = self.ring.get(key)
+        if self.previous is None:
+            return endpoint
+        previous = self.previous.get(key)
+        if previous == endpoint:
+            return endpoint
+        if RedisConnectionRegistry.get_client(url=endpoint).exists(key):
+            return endpoint
+        if RedisConnectionRegistry.get_client(url=previous).exists(key):
+            return previous
+        return endpoint
+
+    async def locate_async(self, key):
+        """`locate` with asyncio clients"""
+        endpoint = self.ring.get(key)
+        if self.previous is None:
+            return endpoint
+        previous = self.previous.get(key)
+        if previous == endpoint:
+            return endpoint
+        if await RedisConnectionRegistry.get_async_client(url=endpoint).exists(key):
+            return endpoint
+        if await RedisConnectionRegistry.get_async_client(url=previous).exists(key):
+            return previous
+        return endpoint
+
+    def rebalance(self, endpoints: List[str]):
+        """Switch to new endpoints, returns endpoints added and removed"""
+        self.previous = self.ring
+        self.ring = ConsistentHashRing(endpoints, self.previous.replicas)
+        return (set(endpoints) - set(self.previous.nodes),
+                set(self.previous.nodes) - set(endpoints))
+
+    def migrate(self, key):
+        """Move key from its previous shard to the current one, with TTL"""
+        if self.previous is None:
+            return False
+        source, target = self.previous.get(key), self.ring.get(key)
+        if source == target:
+            return False
+        source = RedisConnectionRegistry.get_client(url=source)
+        pipe = source.pipeline()
+        pipe.dump(key)
+        pipe.pttl(key)
+        dumped, ttl = pipe.execute()
+        if dumped is None:
+            return False
+        RedisConnectionRegistry.get_client(url=target).restore(
+            key, max(ttl, 0), dumped, replace=True)
+        source.delete(key)
+        return True
+
+    def finish_rebalance(self):
+        self.previous = None
+
+
+if os.getenv('REDIS_SHARDS'):
+    RedisConnectionRegistry.configure(shards=os.getenv('REDIS_SHARDS').split(','))
+
 
 class RedisQueue(object):
     def __init__(self, key: str, queue_size=-1, alive_time=360, redis_client: Redis = None,
-                 need_list_obj: bool = True):
+                 need_list_obj: bool = True, codec: Codec = None):
         self.queue_size = int(queue_size)
-        if redis_client:
-            self.client = redis_client
-        elif os.getenv('REDIS_URL'):
-            self.client = Database.from_url(os.getenv('REDIS_URL'))
-        else:
-            self.client = Database(
-                host=os.getenv('REDIS_HOST', 'localhost'),
-                port=int(os.getenv('REDIS_PORT', '6379')),
-                password=os.getenv('REDIS_PASSWORD')
-            )
+        self.codec = codec
+        self.client = redis_client or self._default_client(key)
         self.key = key
         self.alive_time = alive_time
         self.queue = self.client.List(key) if need_list_obj else None
 
+    _block_interval = 0.002
+    _max_block_interval = 0.05
+
+    @staticmethod
+    def _default_client(key):
+        return RedisConnectionRegistry.get_client_for(key)
+
     serialize = pickle.dumps
     deserialize = pickle.loads
 
+    def _encode(self, frame):
+        if self.codec is None:
+            return self.serialize(frame)
+        if self.codec.on_array:
+            return self.codec.encode(frame)
+        return self.codec.encode(self.serialize(frame))
+
+    def _decode(self, item):
+        if self.codec is None:
+            return self.deserialize(item)
+        if self.codec.on_array:
+            return self.codec.decode(item)
+        return self.deserialize(self.codec.decode(item))
+
+    def _decode_into(self, item, target: np.ndarray):
+        np.copyto(target, self._decode(item))
+
     def put(self, frame: Union[str, bytes],
             extra_data: List[Tuple[str, Union[bytes, str], int]] = None):
+        self.put_many((frame,), extra_data)
+
+    def put_many(self, frames: Sequence,
+                 extra_data: List[Tuple[str, Union[bytes, str], int]] = None):
+        """Put frames in chronological order within a single round trip,
+        the last frame becomes the newest one"""
+        if not len(frames):
+            return
         if self.queue is not None:
             if extra_data:
                 raise NotImplementedError('Don\'t support extra data')
-            self.queue.prepend(frame)
+            # frames are stored as given unless a codec is set
+            if self.codec is not None:
+                frames = [self._encode(frame) for frame in frames]
+            self.client.lpush(self.key, *frames)
         else:
-            pipe = self.client.pipeline()
-            for ex_key, ex_val, ex_expired_time in extra_data:
-                pipe.set(ex_key, ex_val)
-                pipe.expire(ex_key, ex_expired_time)
-            pipe.lpush(self.key, self.serialize(frame))
-            pipe.ltrim(self.key, 0, self.queue_size)
-            pipe.expire(self.key, self.alive_time)
-            pipe.execute()
+            self._pipeline_put(frames, extra_data).execute()
+
+    def _pipeline_put(self, frames, extra_data, client=None):
+        pipe = (client or self.client).pipeline()
+        for ex_key, ex_val, ex_expired_time in extra_data or ():
+            pipe.set(ex_key, ex_val)
+            pipe.expire(ex_key, ex_expired_time)
+        pipe.lpush(self.key, *(self._encode(frame) for frame in frames))
+        pipe.ltrim(self.key, 0, self.queue_size)
+        pipe.expire(self.key, self.alive_time)
+        return pipe
 
     def empty(self):
-        return not self.queue
+        return self.size() == 0
 
     def size(self):
-        return len(self.queue) if self.queue is not None else -1
+        return len(self.queue) if self.queue is not None else self.client.llen(self.key)
 
     def peek(self):
         pipe = self.client.pipeline()
@@ -69,33 +357,83 @@ class RedisQueue(object):
         size, item = pipe.execute()
         if size == 0:
             return None
-        return self.deserialize(item)
+        return self._decode(item)
 
     def get(self, expected_size=1):
-        if expected_size < 1:
-            return None
-        pipe = self.client.pipeline()
-        pipe.llen(self.key)
-        pipe.lrange(self.key, 0, expected_size - 1)
-        size, items = pipe.execute()
-        if size < expected_size:
+        return self.get_many(expected_size)
+
+    def get_many(self, n, block=False, timeout=None, out: np.ndarray = None):
+        """Get newest `n` frames with a single LRANGE, newest first
+
+        :param n: number of frames expected
+        :param block: whether waiting until `n` frames available
+        :param timeout: seconds to wait if blocking, None for waiting forever
+        :param out: preallocated array of shape (N, H, W, C) to decode frames
+            into, e.g. input batch of detectors
+        :return: list of frames or `out[:n]`, None if not enough frames
+        """
+        if n < 1:
             return None
-        return [self.deserialize(item) for item in items]
+        if out is not None and len(out) < n:
+            raise ValueError(f'Output array of {len(out)} frames, expected {n}')
+        intervals = self._wait_intervals(timeout)
+        items = self.client.lrange(self.key, 0, n - 1)
+        while len(items) < n:
+            interval = next(intervals, None) if block else None
+            if interval is None:
+                return None
+            time.sleep(interval)
+            items = self.client.lrange(self.key, 0, n - 1)
+        return self._decode_items(items, n, out)
+
+    def _wait_intervals(self, timeout):
+        """Backoff intervals between polls, exhausted on timeout"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        interval = self._block_interval
+        while True:
+            if deadline is not None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return
+                interval = min(interval, remaining)
+            yield interval
+            interval = min(interval * 2, self._max_block_interval)
+
+    def _decode_items(self, items, n, out):
+        if out is None:
+            return [self._decode(item) for item in items]
+        for i, item in enumerate(items):
+            self._decode_into(item, out[i])
+        return out[:n]
 
     def lrange(self, expected_size=1):
         pipe = self.client.pipeline()
         pipe.llen(self.key)
         pipe.lrange(self.key, 0, expected_size - 1)
         len_queue, items = pipe.execute()
-        return len_queue, [self.deserialize(item) for item in items]
+        return len_queue, [self._decode(item) for item in items]
+
+    def pop(self, block=True, timeout=None):
+        """Pop the oldest frame with BRPOP, waiting up to `timeout` seconds
+        (None for waiting forever) if blocking
+
+        :return: frame, None if no frame available
+        """
+        if block:
+            item = self.client.brpop(self.key, timeout=timeout or 0)
+            item = item[1] if item else None
+        else:
+            item = self.client.rpop(self.key)
+        return None if item is None else self._decode(item)
 
     def destroy(self):
         self.client.delete(self.key)
 
 
 class RedisNdArrayQueue(RedisQueue):
-    def __init__(self, key, size, frame_shape, dtype=np.uint8):
-        super().__init__(key, size)
+    def __init__(self, key, size, frame_shape, dtype=np.uint8, codec: Codec = None,
+                 redis_client: Redis = None):
+        super().__init__(key, size, redis_client=redis_client, need_list_obj=False, codec=codec)
 
         if frame_shape is not None:
             if None in frame_shape:
@@ -113,38 +451,655 @@ class RedisNdArrayQueue(RedisQueue):
 
 class RedisNdArrayQueueReader(RedisNdArrayQueue):
     put = None
+    put_many = None
     destroy = None
 
 
 class RedisNdArrayQueueWriter(RedisNdArrayQueue):
-    def __init__(self, key, size):
-        super().__init__(key, size, None)
+    def __init__(self, key, size, codec: Codec = None, redis_client: Redis = None):
+        super().__init__(key, size, None, codec=codec, redis_client=redis_client)
+
+    peek = None
+    get = None
+    get_many = None
+    lrange = None
+    pop = None
+
+
+class RedisFrameQueue(RedisNdArrayQueue):
+    """Frames packed with `FrameEnvelope`, so that readers decode shape and
+    dtype from each frame instead of the queue configuration
+
+    `ImageFrame` could be put as well, with its frame_id, source_id and
+    timestamp kept in the envelope. Set `with_header` to get tuples of
+    (FrameHeader, frame) from readers. Codec of writer is kept in the
+    envelope too, readers don't need to specify it.
+    """
+
+    def __init__(self, key, size, with_header=False, codec: Codec = None,
+                 redis_client: Redis = None):
+        super().__init__(key, size, None, codec=codec, redis_client=redis_client)
+        self.with_header = with_header
+
+    def serialize(self, frame):
+        if isinstance(frame, ImageFrame):
+            return FrameEnvelope.pack(frame.frame, frame.frame_id, frame.source_id,
+                                      frame.timestamp, codec=self.codec)
+        return FrameEnvelope.pack(frame, codec=self.codec)
+
+    def deserialize(self, frame_bytes):
+        header, frame = FrameEnvelope.unpack(frame_bytes)
+        return (header, frame) if self.with_header else frame
+
+    def _encode(self, frame):
+        return self.serialize(frame)
+
+    def _decode(self, item):
+        return self.deserialize(item)
+
+    def _decode_into(self, item, target: np.ndarray):
+        np.copyto(target, FrameEnvelope.unpack(item)[1])
+
+
+class RedisFrameQueueReader(RedisFrameQueue):
+    put = None
+    put_many = None
+    destroy = None
+
+
+class RedisFrameQueueWriter(RedisFrameQueue):
+    peek = None
+    get = None
+    get_many = None
+    lrange = None
+    pop = None
+
+
+class RedisStreamQueue(RedisQueue):
+    """Queue backed by a redis stream, trimmed with `XADD MAXLEN ~`
+
+    Offers the same API as `RedisQueue`, where readers peek the newest
+    frames, plus consumer groups: each frame is delivered to one consumer of
+    a group through `read`, and stays pending until acknowledged by `ack`,
+    or reclaimed by another consumer after the first one died.
+    """
+    FIELD = b'frame'
+
+    def __init__(self, key: str, queue_size=-1, alive_time=360, redis_client: Redis = None,
+                 codec: Codec = None, group: str = None, consumer: str = None):
+        super().__init__(key, queue_size, alive_time, redis_client,
+                         need_list_obj=False, codec=codec)
+        self.group = group
+        self.consumer = consumer or f'{socket.gethostname()}-{os.getpid()}'
+
+    def _pipeline_put(self, frames, extra_data, client=None):
+        pipe = (client or self.client).pipeline()
+        for ex_key, ex_val, ex_expired_time in extra_data or ():
+            pipe.set(ex_key, ex_val)
+            pipe.expire(ex_key, ex_expired_time)
+        # same length as `LTRIM 0 queue_size` of list queues
+        maxlen = self.queue_size + 1 if self.queue_size >= 0 else None
+        for frame in frames:
+            pipe.xadd(self.key, {self.FIELD: self._encode(frame)},
+                      maxlen=maxlen, approximate=True)
+        pipe.expire(self.key, self.alive_time)
+        return pipe
+
+    def _decode_entries(self, entries):
+        return [(entry_id, self._decode(fields[self.FIELD])) for entry_id, fields in entries]
+
+    def size(self):
+        return self.client.xlen(self.key)
+
+    def peek(self):
+        entries = self.client.xrevrange(self.key, count=1)
+        if not entries:
+            return None
+        return self._decode(entries[0][1][self.FIELD])
+
+    def get_many(self, n, block=False, timeout=None, out: np.ndarray = None):
+        if n < 1:
+            return None
+        if out is not None and len(out) < n:
+            raise ValueError(f'Output array of {len(out)} frames, expected {n}')
+        intervals = self._wait_intervals(timeout)
+        entries = self.client.xrevrange(self.key, count=n)
+        while len(entries) < n:
+            interval = next(intervals, None) if block else None
+            if interval is None:
+                return None
+            time.sleep(interval)
+            entries = self.client.xrevrange(self.key, count=n)
+        return self._decode_items([fields[self.FIELD] for _, fields in entries], n, out)
+
+    get_many.__doc__ = RedisQueue.get_many.__doc__
+
+    def lrange(self, expected_size=1):
+        pipe = self.client.pipeline()
+        pipe.xlen(self.key)
+        pipe.xrevrange(self.key, count=expected_size)
+        len_queue, entries = pipe.execute()
+        return len_queue, [self._decode(fields[self.FIELD]) for _, fields in entries]
+
+    def create_group(self, group: str = None, start_id='$'):
+        """Create consumer group, reading frames put since `start_id`"""
+        try:
+            self.client.xgroup_create(self.key, group or self.group, id=start_id, mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read(self, count=1, timeout=None, consumer: str = None):
+        """Read frames never delivered to the group, oldest first
+
+        :param count: max number of frames to read
+        :param timeout: seconds to wait for new frames, None for not waiting,
+            0 for waiting forever
+        :param consumer: consumer name, defaults to host and pid
+        :return: list of (entry id, frame)
+        """
+        block = timeout
+        if timeout:
+            block = max(int(timeout * 1000), 1)
+        response = self.client.xreadgroup(
+            self.group, consumer or self.consumer, {self.key: '>'}, count=count, block=block)
+        if not response:
+            return []
+        return self._decode_entries(response[0][1])
+
+    def pop(self, block=True, timeout=None):
+        """Read and acknowledge the next frame of the group, waiting up to
+        `timeout` seconds (None for waiting forever) if blocking"""
+        if block:
+            entries = self.read(1, timeout or 0)
+        else:
+            entries = self.read(1)
+        if not entries:
+            return None
+        entry_id, frame = entries[0]
+        self.ack(entry_id)
+        return frame
+
+    def ack(self, *entry_ids):
+        if not entry_ids:
+            return 0
+        return self.client.xack(self.key, self.group, *entry_ids)
+
+    def pending(self, count=10, consumer: str = None):
+        """Frames delivered but not acknowledged, with their consumer, idle
+        milliseconds and times delivered"""
+        return self.client.xpending_range(self.key, self.group, '-', '+', count,
+                                          consumername=consumer)
+
+    def reclaim(self, min_idle_time, count=10, consumer: str = None):
+        """Take over frames pending longer than `min_idle_time` seconds, e.g.
+        delivered to a crashed consumer
+
+        :return: list of (entry id, frame) claimed
+        """
+        min_idle_ms = int(min_idle_time * 1000)
+        entry_ids = [entry['message_id'] for entry in self.pending(count)
+                     if entry['time_since_delivered'] >= min_idle_ms]
+        if not entry_ids:
+            return []
+        entries = self.client.xclaim(self.key, self.group, consumer or self.consumer,
+                                     min_idle_ms, entry_ids)
+        # entries trimmed from stream are returned without fields
+        return self._decode_entries(entry for entry in entries if entry[1])
+
+
+class RedisMailbox(RedisQueue):
+    """Single-slot queue keeping only the latest frame, with a version
+
+    Writer replaces the frame and increases its version in one transaction.
+    Reader fetches the frame only if its version changed since last fetch,
+    with a single script call, and counts frames dropped between fetches.
+    """
+    FIELD_FRAME = 'frame'
+    FIELD_VERSION = 'version'
+
+    _FETCH_SCRIPT = """
+local version = redis.call('HGET', KEYS[1], ARGV[1])
+if not version or version == ARGV[3] then
+    return {version, false}
+end
+return {version, redis.call('HGET', KEYS[1], ARGV[2])}
+"""
+
+    def __init__(self, key: str, alive_time=360, redis_client: Redis = None,
+                 codec: Codec = None):
+        super().__init__(key, 0, alive_time, redis_client, need_list_obj=False, codec=codec)
+        self._fetch = self.client.register_script(self._FETCH_SCRIPT)
+        self.version = 0
+        self.received = 0
+        self.dropped = 0
+        self.stale = 0
+
+    def put(self, frame, extra_data: List[Tuple[str, Union[bytes, str], int]] = None):
+        """Replace the latest frame, returns its version"""
+        return self._put(frame, 1, extra_data)
+
+    def put_many(self, frames: Sequence,
+                 extra_data: List[Tuple[str, Union[bytes, str], int]] = None):
+        """Keep the last of frames, others are counted as dropped by readers"""
+        if len(frames):
+            return self._put(frames[-1], len(frames), extra_data)
+
+    def _put(self, frame, count, extra_data):
+        pipe = self.client.pipeline()
+        for ex_key, ex_val, ex_expired_time in extra_data or ():
+            pipe.set(ex_key, ex_val)
+            pipe.expire(ex_key, ex_expired_time)
+        pipe.hset(self.key, self.FIELD_FRAME, self._encode(frame))
+        pipe.hincrby(self.key, self.FIELD_VERSION, count)
+        pipe.expire(self.key, self.alive_time)
+        return pipe.execute()[-2]
+
+    def fetch(self):
+        """Latest frame if put since last fetch, otherwise None"""
+        version, item = self._fetch(keys=[self.key], args=[
+            self.FIELD_VERSION, self.FIELD_FRAME, self.version])
+        if item is None:
+            self.stale += 1
+            return None
+        version = int(version)
+        if self.version and version > self.version:
+            self.dropped += version - self.version - 1
+        self.version = version
+        self.received += 1
+        return self._decode(item)
+
+    def stats(self):
+        """Counters of fetched, dropped (never fetched) and stale fetches"""
+        return dict(version=self.version, received=self.received,
+                    dropped=self.dropped, stale=self.stale)
+
+    def size(self):
+        return int(self.client.hexists(self.key, self.FIELD_FRAME))
+
+    def peek(self):
+        item = self.client.hget(self.key, self.FIELD_FRAME)
+        return None if item is None else self._decode(item)
+
+    def get_many(self, n, block=False, timeout=None, out: np.ndarray = None):
+        if n != 1:
+            return None
+        intervals = self._wait_intervals(timeout)
+        frame = self.peek()
+        while frame is None:
+            interval = next(intervals, None) if block else None
+            if interval is None:
+                return None
+            time.sleep(interval)
+            frame = self.peek()
+        if out is None:
+            return [frame]
+        np.copyto(out[0], frame)
+        return out[:1]
+
+    def lrange(self, expected_size=1):
+        frame = self.peek()
+        return (0, []) if frame is None else (1, [frame])
+
+    def pop(self, block=True, timeout=None):
+        """Latest frame not fetched yet, waiting up to `timeout` seconds
+        if blocking"""
+        intervals = self._wait_intervals(timeout)
+        frame = self.fetch()
+        while frame is None:
+            interval = next(intervals, None) if block else None
+            if interval is None:
+                return None
+            time.sleep(interval)
+            frame = self.fetch()
+        return frame
 
+
+class RedisMailboxReader(RedisMailbox):
+    put = None
+    put_many = None
+    destroy = None
+
+
+class RedisMailboxWriter(RedisMailbox):
+    fetch = None
     peek = None
     get = None
+    get_many = None
     lrange = None
+    pop = None
+
+
+class AsyncRedisQueue(RedisQueue):
+    """asyncio variant of `RedisQueue`, e.g. for Tornado handlers
+
+    Methods are awaitable and never block the event loop. Serialization and
+    codecs are the same as the synchronous queues, so frames written by
+    either of them could be read by the other. Unless provided, client is
+    resolved on use from the running event loop, on the shard holding the
+    key during rebalance as well.
+    """
+
+    def __init__(self, key: str, queue_size=-1, alive_time=360, redis_client=None,
+                 codec: Codec = None):
+        super().__init__(key, queue_size, alive_time, redis_client,
+                         need_list_obj=False, codec=codec)
+
+    @staticmethod
+    def _default_client(key):
+        return None
+
+    @property
+    def client(self):
+        return self._client or RedisConnectionRegistry.get_async_client_for(self.key)
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    async def _located(self):
+        if self._client is not None:
+            return self._client
+        return await RedisConnectionRegistry.locate_async_client(self.key)
+
+    async def put(self, frame, extra_data: List[Tuple[str, Union[bytes, str], int]] = None):
+        await self.put_many((frame,), extra_data)
+
+    async def put_many(self, frames: Sequence,
+                       extra_data: List[Tuple[str, Union[bytes, str], int]] = None):
+        if not len(frames):
+            return
+        await self._pipeline_put(frames, extra_data, await self._located()).execute()
+
+    async def empty(self):
+        return await self.size() == 0
+
+    async def size(self):
+        return await (await self._located()).llen(self.key)
+
+    async def peek(self):
+        item = await (await self._located()).lindex(self.key, 0)
+        if item is None:
+            return None
+        return self._decode(item)
+
+    async def get(self, expected_size=1):
+        return await self.get_many(expected_size)
+
+    async def get_many(self, n, block=False, timeout=None, out: np.ndarray = None):
+        if n < 1:
+            return None
+        if out is not None and len(out) < n:
+            raise ValueError(f'Output array of {len(out)} frames, expected {n}')
+        intervals = self._wait_intervals(timeout)
+        client = await self._located()
+        items = await client.lrange(self.key, 0, n - 1)
+        while len(items) < n:
+            interval = next(intervals, None) if block else None
+            if interval is None:
+                return None
+            await asyncio.sleep(interval)
+            items = await client.lrange(self.key, 0, n - 1)
+        return self._decode_items(items, n, out)
+
+    get_many.__doc__ = RedisQueue.get_many.__doc__
+
+    async def lrange(self, expected_size=1):
+        pipe = (await self._located()).pipeline()
+        pipe.llen(self.key)
+        pipe.lrange(self.key, 0, expected_size - 1)
+        len_queue, items = await pipe.execute()
+        return len_queue, [self._decode(item) for item in items]
+
+    async def pop(self, block=True, timeout=None):
+        client = await self._located()
+        if block:
+            item = await client.brpop(self.key, timeout=timeout or 0)
+            item = item[1] if item else None
+        else:
+            item = await client.rpop(self.key)
+        return None if item is None else self._decode(item)
+
+    async def destroy(self):
+        await (await self._located()).delete(self.key)
+
+
+class AsyncRedisNdArrayQueue(AsyncRedisQueue, RedisNdArrayQueue):
+    def __init__(self, key, size, frame_shape, dtype=np.uint8, codec: Codec = None,
+                 redis_client=None):
+        RedisNdArrayQueue.__init__(self, key, size, frame_shape, dtype, codec, redis_client)
+
+
+class AsyncRedisFrameQueue(AsyncRedisQueue, RedisFrameQueue):
+    def __init__(self, key, size, with_header=False, codec: Codec = None,
+                 redis_client=None):
+        RedisFrameQueue.__init__(self, key, size, with_header, codec, redis_client)
+
+
+class RedisQueueMirror(ThreadWrapper):
+    """Mirror frames put into a local queue to redis
+
+    For `SequencedQueue` the mirror sleeps on its `updated` condition, wakes
+    up as soon as frames are put, and pushes only frames not mirrored yet in
+    one round trip. Other queues are polled every `poll_interval` seconds,
+    and only a changed newest frame is pushed. Without a queue (None) the
+    mirror idles until stopped.
+    """
+
+    def __init__(self, queue: Queue, mirror: RedisQueue, name=None,
+                 timeout=1., poll_interval=0.05, **kwargs):
+        self.queue = queue
+        self.mirror = mirror
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._sequence = queue.sequence if isinstance(queue, SequencedQueue) else 0
+        self._newest = None
+        super().__init__(name=name or f'mirror-{mirror.key}', **kwargs)
+
+    def _wait_new_frames(self):
+        queue = self.queue
+        if isinstance(queue, SequencedQueue):
+            with queue.updated:
+                queue.updated.wait_for(
+                    lambda: queue.sequence != self._sequence or self._stop_event.is_set(),
+                    self.timeout)
+                frames = queue.newest(queue.sequence - self._sequence)
+                self._sequence = queue.sequence
+            return frames
+
+        if self._stop_event.wait(self.poll_interval) or queue is None:
+            return []
+        with queue.mutex:
+            newest = queue.queue[-1] if queue.queue else None
+        if newest is None or newest is self._newest:
+            return []
+        self._newest = newest
+        return [newest]
+
+    def process(self):
+        frames = self._wait_new_frames()
+        if frames:
+            self.mirror.put_many(frames)
+
+    def stop(self):
+        super().stop()
+        if isinstance(self.queue, SequencedQueue):
+            with self.queue.updated:
+                self.queue.updated.notify_all()
+
+
+class RedisPubSubBroker(object):
+    """Redis pub/sub, delivering messages published to every listener of the
+    topic, in all processes"""
+
+    _PUBLISH_BATCH_SCRIPT = """
+local last = redis.call('INCRBY', KEYS[1], ARGV[2])
+redis.call('PUBLISH', ARGV[1], '[' .. (last - tonumber(ARGV[2]) + 1) .. ',' .. ARGV[3] .. ']')
+return last
+"""
+
+    def __init__(self, redis_client: Redis = None):
+        self.client = redis_client or RedisConnectionRegistry.get_client()
+        self._publish_batch = self.client.register_script(self._PUBLISH_BATCH_SCRIPT)
+
+    def publish(self, topic, payload: bytes):
+        self.client.publish(topic, payload)
+
+    def publish_batch(self, topic, batch: list):
+        """Publish JSON of `[first_id, batch]`, with ids of the batch taken
+        from the sequence of topic in the same step, so that ids increase in
+        the order delivered to listeners of all processes"""
+        self._publish_batch(keys=[f'{topic}:event-id'],
+                            args=[topic, len(batch), json.dumps(batch)])
+
+    def listen(self, topic):
+        return _RedisPubSubListener(self.client, topic)
+
+
+class _RedisPubSubListener(object):
+    def __init__(self, client, topic):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(topic)
+
+    def get(self, timeout):
+        """Next payload, None if not available in time"""
+        message = self.pubsub.get_message(timeout=timeout)
+        return message['data'] if message else None
+
+    def close(self):
+        self.pubsub.close()
+
+
+class LocalPubSubBroker(object):
+    """Stand-in of `RedisPubSubBroker` in current process, e.g. for tests or
+    a single web process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = {}
+        self._event_ids = {}
+
+    def publish(self, topic, payload: bytes):
+        with self._lock:
+            listeners = list(self._listeners.get(topic, ()))
+        [_.queue.put(payload) for _ in listeners]
+
+    def publish_batch(self, topic, batch: list):
+        with self._lock:
+            first_id = self._event_ids.get(topic, 0) + 1
+            self._event_ids[topic] = first_id + len(batch) - 1
+            payload = json.dumps([first_id, batch]).encode()
+            [_.queue.put(payload) for _ in self._listeners.get(topic, ())]
+
+    def listen(self, topic):
+        listener = _LocalPubSubListener(self, topic)
+        with self._lock:
+            self._listeners.setdefault(topic, []).append(listener)
+        return listener
+
+    def _remove(self, listener):
+        with self._lock:
+            listeners = self._listeners.get(listener.topic, [])
+            if listener in listeners:
+                listeners.remove(listener)
+
+
+class _LocalPubSubListener(object):
+    def __init__(self, broker, topic):
+        self.broker = broker
+        self.topic = topic
+        self.queue = Queue()
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(True, timeout)
+        except Empty:
+            return None
+
+    def close(self):
+        self.broker._remove(self)
+
+
+class PublisherBridge(ThreadWrapper):
+    """Relay events to the `sse.Publisher` of every process over pub/sub
+
+    Events published to the bridge are batched, up to `batch_size` events
+    or `flush_interval` seconds, and sent to the `topic` of `broker` as one
+    message (redis pub/sub by default, or `LocalPubSubBroker`). Batches
+    received, including those sent by current process, are published to
+    the local publisher, so each event is framed once per process.
+    Events are str, callable data is not supported.
+
+    Event ids are assigned once by the broker when batches are sent, and
+    used by publishers with replay enabled instead of their own, so that
+    `Last-Event-ID` resumes the same events on any process. Publish to such
+    publishers only through the bridge then.
+    """
+
+    def __init__(self, publisher: Publisher, broker=None, topic='evision:sse',
+                 batch_size=256, flush_interval=0.01, name=None, **kwargs):
+        self.publisher = publisher
+        self.broker = broker or RedisPubSubBroker()
+        self.topic = topic
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._batch = []
+        self._batch_lock = threading.Lock()
+        self._listener = self.broker.listen(topic)
+        self.sent = self.received = 0
+        super().__init__(name=name or f'sse-bridge-{topic}', **kwargs)
+
+    def publish(self, data, channel='default channel', event=None):
+        """Publish data to channel of publishers of all processes"""
+        if callable(data):
+            raise TypeError('Callable data could not be relayed')
+        with self._batch_lock:
+            self._batch.append((channel, event, str(data)))
+            full = len(self._batch) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Send events batched"""
+        with self._batch_lock:
+            batch, self._batch = self._batch, []
+        if not batch:
+            return
+        self.broker.publish_batch(self.topic, batch)
+        self.sent += len(batch)
+
+    def pending(self):
+        return len(self._batch)
+
+    def _deliver(self, payload):
+        publish = self.publisher.publish_threadsafe \
+            if isinstance(self.publisher, AsyncPublisher) else self.publisher.publish
+        first_id, batch = json.loads(payload)
+        relay_id = bool(self.publisher.replay_size)
+        for event_id, (channel, event, data) in enumerate(batch, first_id):
+            self.received += 1
+            publish(data, channel, event, event_id if relay_id else None)
+
+    def process(self):
+        self.flush()
+        payload = self._listener.get(self.flush_interval)
+        while payload is not None:
+            self._deliver(payload)
+            payload = self._listener.get(0)
+
+    def on_stop(self):
+        self._listener.close()
 
 
 class RedisUtil(object):
     @staticmethod
     def mirror_queue(queue: Queue, key, size=24):
-        mirror = RedisQueue(key, size)
-        while True:
-            if queue is None or queue.empty():
-                time.sleep(0.1)
-                continue
-            mirror.put(queue.queue[0])
+        RedisQueueMirror(queue, RedisQueue(key, size, need_list_obj=False)).run()
 
     @staticmethod
     def mirror_arrays(queue: Queue, key, size=24):
-        mirror = RedisNdArrayQueueWriter(key, size)
-        while True:
-            if queue is None or queue.empty():
-                time.sleep(0.1)
-                continue
-            mirror.put(queue.queue[0])
+        RedisQueueMirror(queue, RedisNdArrayQueueWriter(key, size)).run()
 
     @staticmethod
     def remove_key(key):
-        if Database().exists(key):
-            Database().delete(key)
+        RedisConnectionRegistry.get_client_for(key).delete(key)
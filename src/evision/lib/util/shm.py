@@ -0,0 +1,464 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 10:12
+# @version: 1.0
+#
+import multiprocessing
+import os
+import re
+import uuid
+from queue import Empty
+from typing import List, Tuple, Union
+
+import numpy as np
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    resource_tracker, shared_memory = None, None
+
+__all__ = [
+    'SharedMemoryNdArrayQueue',
+    'SharedMemoryNdArrayQueueReader',
+    'SharedMemoryNdArrayQueueWriter',
+    'SharedMemoryResult',
+    'SharedMemoryResultChannel'
+]
+
+_MAGIC = 0x65766973696f6e  # b'evision'
+_MAX_DIMS = 4
+_ALIGNMENT = 64
+
+# header fields, each one is an int64
+_H_MAGIC, _H_CAPACITY, _H_NBYTES, _H_SEQUENCE, _H_DTYPE, _H_NDIM = range(6)
+_H_SHAPE = 6
+_HEADER_FIELDS = _H_SHAPE + _MAX_DIMS
+
+_WRITING = -1
+
+
+def _align(offset, alignment=_ALIGNMENT):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def _segment_name(key):
+    return 'evision-' + re.sub(r'[^0-9A-Za-z_.-]', '_', key)
+
+
+# segments created by current process, by name
+_created = {}
+
+
+def _create(name, size):
+    segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+    _created[name] = os.getpid()
+    return segment
+
+
+def _unlink(segment, name):
+    if _created.pop(name, None) != os.getpid():
+        # unregistered when attached, registered again to balance unlink
+        resource_tracker.register(segment._name, 'shared_memory')
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _attach(name):
+    """Attach to an existing segment without letting the resource tracker of
+    current process unlink it on exit, unless created by current process"""
+    segment = shared_memory.SharedMemory(name=name, create=False)
+    if _created.get(name) == os.getpid():
+        return segment
+    try:
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    except Exception:
+        pass
+    return segment
+
+
+class SharedMemoryNdArrayQueue(object):
+    """Same-host frame queue backed by a shared memory ring buffer
+
+    Follows the list semantics of `RedisNdArrayQueue`: the newest frame is
+    at index 0 and reading never removes frames. Every slot is guarded by a
+    sequence number (a seqlock): the writer marks the slot as being written,
+    copies the frame and then publishes the new sequence, so readers never
+    need a lock.
+
+    Frames are returned as read-only views on the shared buffer, which stay
+    valid until the writer wraps around the ring (`size` more frames). Use
+    `copy=True` when frames are kept longer than that.
+    """
+
+    def __init__(self, key: str, size: int, frame_shape=None, dtype=np.uint8,
+                 create: bool = None, copy: bool = False):
+        if shared_memory is None:
+            raise NotImplementedError('Shared memory queue requires python 3.8+')
+        self.key = key
+        self.name = _segment_name(key)
+        self.copy = copy
+
+        if frame_shape is not None:
+            if None in frame_shape or len(frame_shape) > _MAX_DIMS:
+                raise ValueError(f'Invalid frame shape: {frame_shape}')
+            frame_shape = tuple(int(_) for _ in frame_shape)
+        self._owner = False
+        self._segment = None
+        if create is not False:
+            self._segment = self._create(size, frame_shape, dtype, force=create is True)
+        if self._segment is None:
+            self._segment = _attach(self.name)
+        self._bind(frame_shape, dtype)
+
+    def _create(self, size, frame_shape, dtype, force=False):
+        if frame_shape is None:
+            raise ValueError('Frame shape is required to create shared memory queue')
+        capacity = max(int(size), 1)
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(frame_shape)) * dtype.itemsize
+        data_offset = _align(8 * (_HEADER_FIELDS + capacity))
+        try:
+            segment = _create(self.name, data_offset + capacity * _align(nbytes))
+        except FileExistsError:
+            if not force:
+                return None
+            # reuse existing segment if compatible, e.g. writer restarted
+            segment = _attach(self.name)
+            header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=segment.buf)
+            compatible = (header[_H_MAGIC] == _MAGIC and header[_H_CAPACITY] == capacity
+                          and header[_H_NBYTES] == nbytes)
+            del header
+            if compatible:
+                return segment
+            segment.close()
+            _unlink(segment, self.name)
+            return self._create(size, frame_shape, dtype, force=force)
+
+        self._owner = True
+        header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=segment.buf)
+        header[:] = 0
+        header[_H_CAPACITY] = capacity
+        header[_H_NBYTES] = nbytes
+        header[_H_DTYPE] = ord(dtype.char)
+        header[_H_NDIM] = len(frame_shape)
+        header[_H_SHAPE:_H_SHAPE + len(frame_shape)] = frame_shape
+        header[_H_MAGIC] = _MAGIC
+        del header
+        return segment
+
+    def _bind(self, frame_shape, dtype):
+        buf = self._segment.buf
+        self._header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        if self._header[_H_MAGIC] != _MAGIC:
+            self.close()
+            raise ValueError(f'Shared memory queue not initialized: {self.key}')
+
+        capacity = int(self._header[_H_CAPACITY])
+        ndim = int(self._header[_H_NDIM])
+        stored_shape = tuple(int(_) for _ in self._header[_H_SHAPE:_H_SHAPE + ndim])
+        stored_dtype = np.dtype(chr(self._header[_H_DTYPE]))
+        if frame_shape is not None and (frame_shape != stored_shape
+                                        or np.dtype(dtype) != stored_dtype):
+            self.close()
+            raise ValueError(f'Queue {self.key} holds frames of {stored_shape}/{stored_dtype}, '
+                             f'not {frame_shape}/{np.dtype(dtype)}')
+        self.queue_size = capacity
+        self.frame_shape = stored_shape
+        self.dtype = stored_dtype
+
+        data_offset = _align(8 * (_HEADER_FIELDS + capacity))
+        slot_nbytes = _align(int(self._header[_H_NBYTES]))
+        self._sequences = np.ndarray((capacity,), dtype=np.int64, buffer=buf,
+                                     offset=8 * _HEADER_FIELDS)
+        self._slots = [
+            np.ndarray(stored_shape, dtype=stored_dtype, buffer=buf,
+                       offset=data_offset + i * slot_nbytes)
+            for i in range(capacity)
+        ]
+
+    @property
+    def sequence(self):
+        """Sequence of the newest frame, 0 if nothing put yet"""
+        return int(self._header[_H_SEQUENCE])
+
+    def put(self, frame: np.ndarray, extra_data: List[Tuple[str, Union[bytes, str], int]] = None):
+        if extra_data:
+            raise NotImplementedError('Don\'t support extra data')
+        if frame.shape != self.frame_shape or frame.dtype != self.dtype:
+            raise ValueError(f'Invalid frame of {frame.shape}/{frame.dtype}, '
+                             f'expected {self.frame_shape}/{self.dtype}')
+        sequence = self.sequence + 1
+        slot = (sequence - 1) % self.queue_size
+        self._sequences[slot] = _WRITING
+        np.copyto(self._slots[slot], frame)
+        self._sequences[slot] = sequence
+        self._header[_H_SEQUENCE] = sequence
+
+    def _read(self, sequence):
+        """Read frame with given sequence, None if not available any more"""
+        if sequence <= 0:
+            return None
+        slot = (sequence - 1) % self.queue_size
+        if self._sequences[slot] != sequence:
+            return None
+        frame = self._slots[slot]
+        if self.copy:
+            frame = frame.copy()
+            # overwritten while copying
+            if self._sequences[slot] != sequence:
+                return None
+        else:
+            frame = frame.view()
+            frame.flags.writeable = False
+        return frame
+
+    def _read_latest(self, expected_size):
+        sequence = self.sequence
+        frames = []
+        for offset in range(min(expected_size, sequence, self.queue_size)):
+            frame = self._read(sequence - offset)
+            if frame is None:
+                break
+            frames.append(frame)
+        return frames
+
+    def empty(self):
+        return self.sequence == 0
+
+    def size(self):
+        return min(self.sequence, self.queue_size)
+
+    def peek(self):
+        return self._read(self.sequence)
+
+    def get(self, expected_size=1):
+        if expected_size < 1:
+            return None
+        frames = self._read_latest(expected_size)
+        if len(frames) < expected_size:
+            return None
+        return frames
+
+    def lrange(self, expected_size=1):
+        return self.size(), self._read_latest(expected_size)
+
+    def close(self):
+        if self._segment is None:
+            return
+        self._header = self._sequences = None
+        self._slots = []
+        try:
+            self._segment.close()
+        except BufferError:
+            # frames still referenced by caller, released along with them
+            pass
+
+    def destroy(self):
+        segment = self._segment
+        self.close()
+        self._segment = None
+        if segment is not None:
+            _unlink(segment, self.name)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class SharedMemoryNdArrayQueueReader(SharedMemoryNdArrayQueue):
+    def __init__(self, key, size=None, frame_shape=None, dtype=np.uint8, copy=False):
+        super().__init__(key, size, frame_shape, dtype, create=False, copy=copy)
+
+    put = None
+    destroy = None
+
+
+class SharedMemoryNdArrayQueueWriter(SharedMemoryNdArrayQueue):
+    def __init__(self, key, size, frame_shape, dtype=np.uint8):
+        super().__init__(key, size, frame_shape, dtype, create=True)
+
+    peek = None
+    get = None
+    lrange = None
+
+
+class SharedMemoryResult(object):
+    """Result received from `SharedMemoryResultChannel`, with arrays being
+    read-only views on its arena slot, valid until `release()`"""
+
+    def __init__(self, channel, slot, record):
+        self.channel = channel
+        self.slot = slot
+        self.record = record
+
+    @property
+    def released(self):
+        return self.channel is None
+
+    def release(self):
+        """Return the slot to writers, arrays of the record are invalid after"""
+        if self.channel is None:
+            return
+        channel, self.channel = self.channel, None
+        channel._release(self.slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def __repr__(self):
+        return f'SharedMemoryResult(slot={self.slot}, record={self.record!r})'
+
+
+class SharedMemoryResultChannel(object):
+    """Channel of results from worker processes back to the parent, with
+    ndarray payloads in a shared memory arena, and the rest in a small
+    metadata queue
+
+    A record is a dict, a pydantic model (e.g. `Detection`), or an ndarray.
+    Its ndarray fields (feature vectors, crops) are copied into a free slot
+    of `slot_size` bytes by `put` in worker, and returned to parent by `get`
+    as zero-copy views in a `SharedMemoryResult`, which should be released
+    explicitly to reuse the slot. Arrays not fitting into a slot are pickled
+    along with metadata instead.
+
+    Created by the parent (owning the arena) before starting workers, and
+    passed to them on creation. Queues are created with `context` of
+    multiprocessing, which should match start method of the workers.
+    """
+    _MODEL, _DICT, _ARRAY = 'model', 'dict', 'array'
+
+    def __init__(self, slots=16, slot_size=1 << 20, key=None, context=None):
+        if shared_memory is None:
+            raise NotImplementedError('Shared memory channel requires python 3.8+')
+        context = context or multiprocessing
+        self.slots = slots
+        self.slot_size = _align(slot_size)
+        self.name = _segment_name(key or f'channel-{uuid.uuid4().hex}')
+        self._segment = _create(self.name, self.slots * self.slot_size)
+        # kept after close, for unlinking by the parent
+        self._arena = self._segment
+        self._owner = os.getpid()
+        self._free = context.Queue()
+        self._results = context.Queue()
+        [self._free.put(_) for _ in range(slots)]
+        self._inlined = context.Value('q', 0)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_segment'] = state['_arena'] = None
+        return state
+
+    @property
+    def inlined(self):
+        """Arrays pickled with metadata for not fitting into a slot, by all
+        processes"""
+        return self._inlined.value
+
+    def _buffer(self):
+        if self._segment is None:
+            self._segment = _attach(self.name)
+        return self._segment.buf
+
+    @staticmethod
+    def _split(record):
+        """Kind, class and fields of record"""
+        if isinstance(record, np.ndarray):
+            return SharedMemoryResultChannel._ARRAY, None, {None: record}
+        if isinstance(record, dict):
+            return SharedMemoryResultChannel._DICT, None, dict(record)
+        if hasattr(record, '__fields__'):
+            return SharedMemoryResultChannel._MODEL, type(record), \
+                {_: getattr(record, _) for _ in record.__fields__}
+        raise TypeError(f'Unsupported result type: {type(record)}')
+
+    def put(self, record, timeout=None):
+        """Send record to parent, waiting up to `timeout` seconds for a free
+        slot if it has arrays
+
+        :return: False if no slot available in time
+        """
+        kind, cls, fields = self._split(record)
+        arrays = {name: value for name, value in fields.items()
+                  if isinstance(value, np.ndarray)}
+        offset, layout = 0, {}
+        for name, value in arrays.items():
+            if offset + value.nbytes > self.slot_size:
+                continue
+            layout[name] = (offset, value.shape, value.dtype.str)
+            offset = _align(offset + value.nbytes)
+
+        slot = None
+        if layout:
+            try:
+                slot = self._free.get(True, timeout)
+            except Empty:
+                return False
+            buf, base = self._buffer(), slot * self.slot_size
+            for name, (offset, shape, dtype) in layout.items():
+                target = np.ndarray(shape, dtype=dtype, buffer=buf, offset=base + offset)
+                np.copyto(target, arrays[name])
+                fields.pop(name)
+            del target
+        if len(arrays) > len(layout):
+            with self._inlined.get_lock():
+                self._inlined.value += len(arrays) - len(layout)
+        self._results.put((slot, kind, cls, fields, layout))
+        return True
+
+    def get(self, timeout=None):
+        """Next result, None if not available in time"""
+        try:
+            slot, kind, cls, fields, layout = self._results.get(True, timeout)
+        except Empty:
+            return None
+        if layout:
+            buf, base = self._buffer(), slot * self.slot_size
+            for name, (offset, shape, dtype) in layout.items():
+                view = np.ndarray(shape, dtype=dtype, buffer=buf, offset=base + offset)
+                view.flags.writeable = False
+                fields[name] = view
+        if kind == self._ARRAY:
+            record = fields[None]
+        elif kind == self._MODEL:
+            # skip validators which may copy arrays
+            record = cls.construct(**fields)
+        else:
+            record = fields
+        return SharedMemoryResult(self if slot is not None else None, slot, record)
+
+    def _release(self, slot):
+        self._free.put(slot)
+
+    def release(self, result: SharedMemoryResult):
+        result.release()
+
+    def qsize(self):
+        return self._results.qsize()
+
+    def close(self):
+        if self._segment is None:
+            return
+        segment, self._segment = self._segment, None
+        try:
+            segment.close()
+        except BufferError:
+            # views still referenced by caller, released along with them
+            pass
+
+    def destroy(self):
+        """Close and remove the arena, by the parent, even if closed before"""
+        self.close()
+        arena, self._arena = self._arena, None
+        if arena is not None and self._owner == os.getpid():
+            _unlink(arena, self.name)
@@ -0,0 +1,49 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 23:10
+# @version: 1.0
+#
+import threading
+import time
+
+from evision.lib.parallel import AtomicInteger, ShardedCounter, SharedCounter, SharedInteger
+
+
+def _add(counter, times):
+    for _ in range(times):
+        counter.count()
+
+
+def profile_contention(threads=16, times=100000):
+    for counter_class in [AtomicInteger, ShardedCounter, SharedInteger, SharedCounter]:
+        counter = counter_class()
+        workers = [threading.Thread(target=_add, args=(counter, times)) for _ in range(threads)]
+        time_start = time.perf_counter()
+        [_.start() for _ in workers]
+        [_.join() for _ in workers]
+        elapsed = time.perf_counter() - time_start
+        assert counter.value == threads * times
+        print(f'{counter_class.__name__}: {threads} threads, {elapsed:.3f}s, '
+              f'avg: {elapsed / threads / times * 1e9:.0f}ns per add')
+
+
+def profile_read(times=100000, threads=16):
+    for counter_class in [AtomicInteger, ShardedCounter, SharedInteger, SharedCounter]:
+        counter = counter_class()
+        workers = [threading.Thread(target=_add, args=(counter, 1)) for _ in range(threads)]
+        [_.start() for _ in workers]
+        [_.join() for _ in workers]
+        time_start = time.perf_counter()
+        for _ in range(times):
+            counter.value
+        elapsed = time.perf_counter() - time_start
+        print(f'{counter_class.__name__}: {elapsed / times * 1e9:.0f}ns per read')
+
+
+if __name__ == '__main__':
+    profile_contention()
+    profile_read()
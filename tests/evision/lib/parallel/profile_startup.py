@@ -0,0 +1,45 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 23:55
+# @version: 1.0
+#
+import time
+
+from evision.lib.parallel import ProcessWrapper
+
+
+class FrameWorker(ProcessWrapper):
+    def process(self):
+        import numpy as np
+        np.zeros((480, 640, 3), dtype=np.uint8).mean()
+
+
+def _wait_ticks(workers, ticks=1):
+    while any(_.ticks < ticks for _ in workers):
+        time.sleep(0.001)
+
+
+def profile_startup(workers=16):
+    for start_method in ['fork', 'spawn', 'forkserver']:
+        time_start = time.perf_counter()
+        if start_method == 'forkserver':
+            FrameWorker.preload()
+        preloaded = time.perf_counter()
+        processes = [FrameWorker(name=f'{start_method}-{_}', start_method=start_method)
+                     for _ in range(workers)]
+        [_.start() for _ in processes]
+        _wait_ticks(processes)
+        elapsed = time.perf_counter() - preloaded
+        [_.stop() for _ in processes]
+        [_.join() for _ in processes]
+        print(f'{start_method}: {workers} workers ready in {elapsed:.3f}s, '
+              f'avg: {elapsed / workers * 1000:.1f}ms per worker, '
+              f'preload: {preloaded - time_start:.3f}s')
+
+
+if __name__ == '__main__':
+    profile_startup()
@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 21:30
+# @version: 1.0
+#
+import time
+from queue import Queue
+
+from evision.lib.parallel import ConsumerThreadWrapper
+from evision.lib.sse import Publisher
+from evision.lib.util.redis import RedisQueue
+
+__test_key__ = f'consumer-test-{time.time()}'
+
+
+class Collector(ConsumerThreadWrapper):
+    def init(self):
+        self.items = []
+        self.consumed_at = []
+        self.idles = 0
+
+    def consume(self, item):
+        self.items.append(item)
+        self.consumed_at.append(time.perf_counter())
+
+    def on_idle(self):
+        self.idles += 1
+
+
+def wait_until(condition, timeout=5.):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def stop_in_time(consumer, limit=0.2):
+    started = time.perf_counter()
+    consumer.stop()
+    consumer.join(5)
+    return not consumer.is_alive() and time.perf_counter() - started < limit
+
+
+def test_queue():
+    queue = Queue()
+    consumer = Collector(queue, name='queue-consumer', timeout=0.05)
+    consumer.start()
+    time.sleep(0.2)
+    assert consumer.ticks == 0 and consumer.idles >= 2
+
+    put_at = time.perf_counter()
+    queue.put(1)
+    assert wait_until(lambda: consumer.items)
+    assert consumer.consumed_at[0] - put_at < 0.02
+    [queue.put(_) for _ in range(2, 5)]
+    assert wait_until(lambda: len(consumer.items) == 4)
+    assert consumer.items == [1, 2, 3, 4] and consumer.ticks == 4
+
+    consumer.timeout = 10
+    time.sleep(0.05)
+    assert stop_in_time(consumer)
+
+
+def test_redis_queue():
+    queue = RedisQueue(__test_key__, 10, need_list_obj=False)
+    consumer = Collector(queue, name='redis-consumer', timeout=None)
+    consumer.start()
+    queue.put_many([1, 2, 3])
+    assert wait_until(lambda: len(consumer.items) == 3)
+    assert consumer.items == [1, 2, 3] and queue.empty()
+    assert stop_in_time(consumer)
+    queue.destroy()
+
+
+def test_publisher():
+    publisher = Publisher()
+    consumer = Collector(publisher, name='sse-consumer', timeout=None)
+    consumer.start()
+    publisher.publish('hello')
+    publisher.publish('multi\nline')
+    assert wait_until(lambda: len(consumer.items) == 2)
+    assert consumer.items == ['hello', 'multi\nline']
+
+    publisher.close()
+    consumer.join(1)
+    assert not consumer.is_alive()
+    assert not list(publisher.get_subscribers())
+
+
+class SlowCollector(Collector):
+    def consume(self, item):
+        time.sleep(0.01)
+        super().consume(item)
+
+    def flush(self):
+        self.flushed = list(self.items)
+
+
+def test_drain():
+    queue = Queue()
+    consumer = SlowCollector(queue, name='drain-consumer', timeout=10)
+    consumer.start()
+    [queue.put(_) for _ in range(20)]
+    consumer.drain(5)
+    consumer.join(5)
+    assert not consumer.is_alive()
+    assert consumer.items == list(range(20)) and consumer.flushed == consumer.items
+    assert consumer.report()['dropped'] == 0 and consumer.report()['drained']
+
+    # blocked waiting on empty queue, exits right away
+    consumer = Collector(queue, name='idle-consumer', timeout=10)
+    consumer.start()
+    time.sleep(0.05)
+    started = time.perf_counter()
+    consumer.drain(5)
+    consumer.join(5)
+    assert not consumer.is_alive() and time.perf_counter() - started < 0.2
+
+
+def test_drain_timeout():
+    queue = Queue()
+    [queue.put(_) for _ in range(100)]
+    consumer = SlowCollector(queue, name='timeout-consumer')
+    consumer.start()
+    consumer.drain(0.1)
+    consumer.join(5)
+    report = consumer.report()
+    assert report['ended'] and report['dropped'] == queue.qsize() > 0
+    assert report['ticks'] + report['dropped'] == 100
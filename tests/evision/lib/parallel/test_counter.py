@@ -0,0 +1,57 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 23:00
+# @version: 1.0
+#
+import multiprocessing
+import threading
+
+import pytest
+
+from evision.lib.parallel import ShardedCounter, SharedCounter
+
+
+def _add(counter, times):
+    for _ in range(times):
+        counter.count()
+
+
+def _add_in_threads(counter, threads=8, times=10000):
+    threads = [threading.Thread(target=_add, args=(counter, times)) for _ in range(threads)]
+    [_.start() for _ in threads]
+    [_.join() for _ in threads]
+
+
+@pytest.mark.parametrize('counter_class', [ShardedCounter, SharedCounter])
+def test_threads(counter_class):
+    counter = counter_class(5)
+    _add_in_threads(counter)
+    counter.minus(5)
+    assert counter.value == 80000
+
+    counter.value = 3
+    counter.add(2)
+    assert counter.value == 5
+
+
+def test_sharded_retired_threads():
+    counter = ShardedCounter()
+    for _ in range(5):
+        _add_in_threads(counter, threads=4, times=10)
+    assert counter.value == 200
+    assert len(counter._state[1]) == 0
+
+
+def test_shared_processes():
+    counter = SharedCounter(slots=4)
+    counter.add()
+    processes = [multiprocessing.Process(target=_add_in_threads, args=(counter, 2, 1000))
+                 for _ in range(3)]
+    [_.start() for _ in processes]
+    [_.join() for _ in processes]
+    # slots exhausted, the rest share overflow slot
+    assert counter.value == 6001
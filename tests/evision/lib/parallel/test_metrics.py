@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 20:30
+# @version: 1.0
+#
+import random
+import time
+
+import pytest
+
+from evision.lib.parallel import ProcessWrapper, StreamingHistogram, ThreadWrapper, WorkerMetrics
+
+
+def test_histogram():
+    histogram = StreamingHistogram()
+    assert histogram.quantile(0.5) == 0 and histogram.count == 0
+    values = [random.uniform(0.001, 0.1) for _ in range(10000)]
+    [histogram.add(_) for _ in values]
+    values.sort()
+    for q in [0.5, 0.95, 0.99]:
+        assert histogram.quantile(q) == pytest.approx(values[int(q * len(values)) - 1], rel=0.05)
+    assert histogram.min == values[0] and histogram.max == values[-1]
+    assert histogram.sum == pytest.approx(sum(values))
+
+    histogram.add(1e-9)
+    histogram.add(1e6)
+    assert histogram.quantile(0) == 1e-9 and histogram.quantile(1) == 1e6
+    size = len(histogram._counts)
+    [histogram.add(random.random()) for _ in range(1000)]
+    assert len(histogram._counts) == size
+
+
+class SlowThread(ThreadWrapper):
+    def process(self):
+        time.sleep(0.01)
+        if self.ticks % 2:
+            raise ValueError('odd tick')
+
+
+class SlowProcess(ProcessWrapper):
+    def process(self):
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize('worker_class', [SlowThread, SlowProcess])
+def test_worker_metrics(worker_class):
+    worker = worker_class(name='slow', interval=0.02)
+    worker.start()
+    time.sleep(0.5)
+    snapshot = worker.metrics.snapshot()
+    worker.stop()
+    worker.join(5)
+    assert snapshot['ticks'] > 10
+    assert snapshot['errors'] == (snapshot['ticks'] // 2 if worker_class is SlowThread else 0)
+    assert 30 < snapshot['tps'] < 55
+    assert 0.3 < snapshot['busy_ratio'] < 0.7
+    assert 0.01 <= snapshot['latency']['p50'] < 0.015
+    assert 10 <= worker.avg_time() < 15
+
+
+def test_prometheus():
+    metrics = WorkerMetrics()
+    metrics.start()
+    metrics.observe(0.01)
+    metrics.observe(0.02, error=True)
+    text = WorkerMetrics.to_prometheus({'camera "1"': metrics.snapshot()})
+    assert 'evision_worker_ticks_total{worker="camera \\"1\\""} 2' in text
+    assert 'evision_worker_errors_total{worker="camera \\"1\\""} 1' in text
+    assert '# TYPE evision_worker_process_seconds summary' in text
+    assert 'evision_worker_process_seconds{worker="camera \\"1\\"",quantile="0.99"}' in text
+    assert 'evision_worker_process_seconds_count{worker="camera \\"1\\""} 2' in text
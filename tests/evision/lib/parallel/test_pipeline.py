@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 22:30
+# @version: 1.0
+#
+import os
+import time
+
+import pytest
+
+from evision.lib.parallel import BoundedQueue, Pipeline, ProcessBoundedQueue, QueuePolicy
+
+
+@pytest.mark.parametrize('queue_class', [BoundedQueue, ProcessBoundedQueue])
+def test_queue_policy(queue_class):
+    queue = queue_class(2, QueuePolicy.DROP_OLDEST)
+    assert all([queue.offer(1), queue.offer(2)])
+    assert not queue.offer(3)
+    assert [queue.get(timeout=1), queue.get(timeout=1)] == [2, 3] and queue.dropped == 1
+
+    queue = queue_class(2, QueuePolicy.DROP_NEWEST)
+    [queue.offer(_) for _ in range(3)]
+    assert [queue.get(timeout=1), queue.get(timeout=1)] == [0, 1] and queue.dropped == 1
+
+    queue = queue_class(1, QueuePolicy.BLOCK)
+    assert queue.offer(1)
+    started = time.monotonic()
+    assert not queue.offer(2, timeout=0.1)
+    assert time.monotonic() - started >= 0.1 and queue.dropped == 1
+
+    with pytest.raises(ValueError):
+        queue_class(1, 'unknown')
+
+
+def slow_square(value):
+    time.sleep(0.01)
+    return value * value, os.getpid()
+
+
+def test_thread_pipeline():
+    pipeline = Pipeline('test', queue_size=4, output_size=100) \
+        .stage('double', lambda x: x * 2) \
+        .stage('odd', lambda x: x + 1 if x % 4 else None, workers=2) \
+        .start()
+    try:
+        for _ in range(20):
+            assert pipeline.put(_)
+        results = [pipeline.get(timeout=2) for _ in range(10)]
+        assert sorted(results) == [_ * 2 + 1 for _ in range(20) if _ % 2]
+        assert pipeline.get(timeout=0.01) is None
+        stats = pipeline.stats()
+        assert stats['double']['ticks'] == 20 and stats['odd']['ticks'] == 20
+        assert stats['odd']['workers'] == 2 and stats['odd']['dropped'] == 0
+    finally:
+        pipeline.stop()
+
+
+def test_process_stage_and_bottleneck():
+    pipeline = Pipeline('mixed', queue_size=64, output_size=64) \
+        .stage('decode', lambda x: x + 1) \
+        .stage('detect', slow_square, workers=2, mode=Pipeline.PROCESS) \
+        .stage('publish', lambda result: result) \
+        .start()
+    try:
+        [pipeline.put(_) for _ in range(40)]
+        results = [pipeline.get(timeout=5) for _ in range(40)]
+        assert sorted(value for value, _ in results) == [_ * _ for _ in range(1, 41)]
+        assert os.getpid() not in {pid for _, pid in results}
+        stats = pipeline.stats()
+        assert stats['detect']['ticks'] == 40
+        assert stats['detect']['latency']['p50'] >= 0.01
+        assert pipeline.bottleneck() == 'detect'
+    finally:
+        pipeline.stop()
+    assert not any(_.is_alive() for stage in pipeline.stages for _ in stage.wrappers)
+
+
+def test_drop_oldest_pipeline():
+    pipeline = Pipeline('latest', queue_size=2, policy=QueuePolicy.DROP_OLDEST, output_size=10) \
+        .stage('slow', lambda x: time.sleep(0.05) or x) \
+        .start()
+    try:
+        [pipeline.put(_) for _ in range(10)]
+        time.sleep(0.3)
+        stats = pipeline.stats()['slow']
+        assert stats['dropped'] >= 6 and stats['depth'] == 0
+        results = [pipeline.get(timeout=0.1) for _ in range(stats['ticks'])]
+        assert results[-1] == 9
+    finally:
+        pipeline.stop()
+
+
+def test_drain():
+    pipeline = Pipeline('drain', queue_size=100, output_size=100) \
+        .stage('slow', lambda x: time.sleep(0.005) or x, workers=2) \
+        .stage('square', slow_square, mode=Pipeline.PROCESS) \
+        .start()
+    [pipeline.put(_) for _ in range(30)]
+    report = pipeline.drain(10)
+    assert not pipeline.put(30)
+    assert sorted(pipeline.get(timeout=1)[0] for _ in range(30)) == [_ * _ for _ in range(30)]
+    assert all(_['left'] == 0 and _['dropped'] == 0 for _ in report.values())
+    assert sum(_['ticks'] for _ in report['slow']['workers']) == 30
+    assert report['square']['workers'][0]['ended']
+    assert not any(_.is_alive() for stage in pipeline.stages for _ in stage.wrappers)
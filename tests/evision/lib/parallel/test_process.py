@@ -0,0 +1,50 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 23:50
+# @version: 1.0
+#
+import os
+import signal
+import time
+
+import pytest
+
+from evision.lib.parallel import ProcessWrapper
+
+
+class SleepWorker(ProcessWrapper):
+    def process(self):
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize('start_method', ['fork', 'spawn', 'forkserver'])
+def test_start_method(start_method):
+    worker = SleepWorker(name=f'worker-{start_method}', start_method=start_method)
+    worker.start()
+    deadline = time.monotonic() + 30
+    while worker.ticks < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert worker.ticks >= 3
+    assert worker.running
+    assert worker.metrics.snapshot()['ticks'] >= 3
+
+    worker.stop()
+    worker.join(5)
+    assert worker.exitcode == 0
+    assert worker.ended
+
+
+def test_drain_with_signal():
+    worker = SleepWorker(name='worker-signal', answer_sigterm=True)
+    worker.start()
+    deadline = time.monotonic() + 10
+    while worker.ticks < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    os.kill(worker.pid, signal.SIGTERM)
+    worker.join(5)
+    assert worker.exitcode == 0
+    assert worker.report()['drained'] and worker.report()['dropped'] == 0
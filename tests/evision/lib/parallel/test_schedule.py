@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 19:30
+# @version: 1.0
+#
+import time
+
+import pytest
+
+from evision.lib.parallel import ProcessWrapper, ThreadWrapper, TickScheduler
+
+
+class FakeClock(object):
+    """Clock advanced by processing and waiting, used as stop event as well"""
+
+    def __init__(self):
+        self.now = 100.
+
+    def __call__(self):
+        return self.now
+
+    def wait(self, delay):
+        self.now += delay
+        return False
+
+    def run(self, scheduler, elapsed):
+        self.now += elapsed
+        return scheduler.wait(elapsed, self)
+
+
+def test_deadlines():
+    clock = FakeClock()
+    scheduler = TickScheduler(fps=10, clock=clock)
+    scheduler.start()
+    for elapsed in [0.03, 0.07, 0.01]:
+        clock.run(scheduler, elapsed)
+    # no drift from processing time
+    assert clock.now == pytest.approx(100.3)
+    assert scheduler.stats()['jitter_max'] == pytest.approx(0)
+
+
+def test_skip_missed():
+    clock = FakeClock()
+    scheduler = TickScheduler(0.1, clock=clock)
+    scheduler.start()
+    clock.run(scheduler, 0.35)
+    stats = scheduler.stats()
+    assert stats['skipped'] == 2 and stats['overruns'] == 1
+    # late tick runs immediately, next one back on the grid
+    assert clock.now == pytest.approx(100.35)
+    clock.run(scheduler, 0.01)
+    assert clock.now == pytest.approx(100.4)
+
+    clock = FakeClock()
+    scheduler = TickScheduler(0.1, skip_missed=False, clock=clock)
+    scheduler.start()
+    clock.run(scheduler, 0.35)
+    [clock.run(scheduler, 0) for _ in range(3)]
+    assert scheduler.skipped == 0
+    assert clock.now == pytest.approx(100.4)
+
+
+def test_adaptive():
+    clock = FakeClock()
+    scheduler = TickScheduler(0.1, adaptive=True, max_interval=0.2, clock=clock)
+    scheduler.start()
+    [clock.run(scheduler, 0.15) for _ in range(10)]
+    # backed off until keeping up
+    assert 0.15 <= scheduler.interval <= 0.2
+    skipped = scheduler.skipped
+    [clock.run(scheduler, 0.15) for _ in range(10)]
+    assert scheduler.skipped == skipped
+    [clock.run(scheduler, 0.01) for _ in range(20)]
+    assert scheduler.interval == pytest.approx(0.1)
+
+    with pytest.raises(ValueError):
+        TickScheduler()
+
+
+class CountingThread(ThreadWrapper):
+    def process(self):
+        time.sleep(0.005)
+
+
+def test_thread_fps():
+    thread = CountingThread(name='fps-thread', fps=50)
+    thread.start()
+    time.sleep(0.5)
+    thread.stop()
+    thread.join(1)
+    assert 20 <= thread.ticks <= 30
+    assert thread.schedule.stats()['fps'] == pytest.approx(50, rel=0.2)
+
+
+class OverrunProcess(ProcessWrapper):
+    def process(self):
+        time.sleep(0.03)
+
+
+def test_process_stats():
+    process = OverrunProcess(name='fps-process', fps=50)
+    process.start()
+    time.sleep(0.5)
+    process.stop()
+    process.join(5)
+    # counted in child, read by parent
+    stats = process.schedule.stats()
+    assert stats['ticks'] >= 5 and stats['overruns'] >= 5 and stats['skipped'] >= 1
+    assert stats['fps'] > 0 and stats['jitter_max'] >= 0
@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 18:40
+# @version: 1.0
+#
+import multiprocessing
+import os
+import time
+
+from evision.lib.parallel import ConsumerProcessWrapper, ProcessPoolSupervisor, ProcessWrapper
+from evision.lib.resource.cpu import CpuAllocator
+
+
+class CameraWorker(ProcessWrapper):
+    def __init__(self, worker_id, keys, crash_after=None, stall_after=None, affinity=None):
+        self.keys = keys
+        self.crash_after = crash_after
+        self.stall_after = stall_after
+        super().__init__(name=f'camera-worker-{worker_id}', interval=0.01, affinity=affinity)
+
+    def process(self):
+        if self.crash_after is not None and self.ticks >= self.crash_after:
+            os._exit(1)
+        if self.stall_after is not None and self.ticks >= self.stall_after:
+            time.sleep(60)
+
+
+class IdleConsumer(ConsumerProcessWrapper):
+    def consume(self, item):
+        pass
+
+
+def wait_until(condition, timeout=10.):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_process_wrapper_state():
+    worker = CameraWorker(0, [])
+    worker.start()
+    assert wait_until(lambda: worker.running and worker.ticks > 3)
+    worker.stop()
+    worker.join(5)
+    assert not worker.is_alive() and worker.exitcode == 0
+    assert worker.ended and not worker.running
+
+
+def test_sharding_and_scale():
+    keys = [f'camera:{_}' for _ in range(20)]
+    supervisor = ProcessPoolSupervisor(CameraWorker, workers=2, keys=keys, interval=0.05)
+    supervisor.start()
+    try:
+        assert wait_until(lambda: all(_['ticks'] > 0 for _ in supervisor.stats().values()))
+        stats = supervisor.stats()
+        assert sorted(sum((_['keys'] for _ in stats.values()), [])) == sorted(keys)
+        previous = stats
+
+        supervisor.scale(3)
+        stats = supervisor.stats()
+        assert len(stats) == 3 and stats[2]['keys']
+        assert all(supervisor.owner(key) == 2 for key in stats[2]['keys'])
+        # only workers with shards changed are restarted
+        for worker_id in previous:
+            changed = stats[worker_id]['keys'] != previous[worker_id]['keys']
+            assert changed == (stats[worker_id]['pid'] != previous[worker_id]['pid'])
+
+        supervisor.scale(1)
+        stats = supervisor.stats()
+        assert list(stats) == [0] and sorted(stats[0]['keys']) == sorted(keys)
+        assert wait_until(lambda: supervisor.stats()[0]['running'])
+    finally:
+        supervisor.stop()
+        supervisor.join(10)
+    assert not supervisor.stats()
+
+
+def test_restart_with_backoff():
+    supervisor = ProcessPoolSupervisor(
+        lambda worker_id, keys: CameraWorker(worker_id, keys, crash_after=3),
+        workers=1, interval=0.02, backoff=0.1, max_backoff=0.4)
+    supervisor.start()
+    try:
+        assert wait_until(lambda: supervisor.stats()[0]['restarts'] >= 3)
+        assert supervisor.stats()[0]['failures'] >= 3
+    finally:
+        supervisor.stop()
+        supervisor.join(10)
+
+
+def test_restart_stalled():
+    supervisor = ProcessPoolSupervisor(
+        lambda worker_id, keys: CameraWorker(worker_id, keys, stall_after=3),
+        workers=1, interval=0.02, heartbeat_timeout=0.3, backoff=0.01)
+    supervisor.start()
+    try:
+        assert wait_until(lambda: supervisor.stats()[0]['restarts'] >= 1)
+    finally:
+        supervisor.stop()
+        supervisor.join(10)
+
+
+def test_join_workers():
+    supervisor = ProcessPoolSupervisor(
+        lambda worker_id, keys: CameraWorker(worker_id, keys, stall_after=3 if worker_id else None),
+        workers=2, keys=range(10), interval=0.02)
+    supervisor.start()
+    assert wait_until(lambda: all(_['ticks'] >= 3 for _ in supervisor.stats().values()))
+    report = supervisor.join_workers(timeout=1)
+    supervisor.join(5)
+    assert not supervisor.is_alive() and not supervisor.stats()
+    assert report[0]['exitcode'] == 0 and report[0]['ended'] and not report[0]['terminated']
+    assert report[0]['dropped'] == 0
+    # stalled worker could not drain in time, its pending work is unknown
+    assert report[1]['terminated'] and not report[1]['ended']
+    assert report[1]['dropped'] is None
+    assert sorted(report[0]['keys'] + report[1]['keys']) == list(range(10))
+
+
+def test_release_affinity():
+    allocator = CpuAllocator.default()
+    free = allocator.free_cores
+    supervisor = ProcessPoolSupervisor(
+        lambda worker_id, keys: CameraWorker(worker_id, keys, crash_after=3, affinity=1),
+        workers=1, interval=0.02, backoff=0.05, max_backoff=0.1)
+    supervisor.start()
+    assert wait_until(lambda: supervisor.stats()[0]['restarts'] >= 2)
+    supervisor.join_workers(timeout=1)
+    supervisor.join(5)
+    # cores of failed and joined workers are all returned
+    assert allocator.free_cores == free
+
+
+def test_idle_consumer_not_stalled():
+    source = multiprocessing.Queue()
+    supervisor = ProcessPoolSupervisor(
+        lambda worker_id, keys: IdleConsumer(source, name=f'idle-{worker_id}', timeout=0.1),
+        workers=1, interval=0.05, heartbeat_timeout=0.5, backoff=0.01)
+    supervisor.start()
+    try:
+        assert wait_until(lambda: supervisor.stats()[0]['running'])
+        time.sleep(1.5)
+        stats = supervisor.stats()[0]
+        assert stats['ticks'] == 0 and stats['restarts'] == 0 and stats['failures'] == 0
+    finally:
+        supervisor.stop()
+        supervisor.join(10)
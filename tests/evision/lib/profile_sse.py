@@ -0,0 +1,43 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 23:58
+# @version: 1.0
+#
+import json
+import time
+
+from evision.lib.sse import Publisher
+
+_EVENT = json.dumps(dict(camera='camera:1', track_id=42, label='person',
+                         box=[120, 80, 64, 128], score=0.93), indent=2)
+
+
+def _publish_per_subscriber(publisher, data, channel='default channel'):
+    """Publishing before encode-once, framing data for each subscriber"""
+    for queue, _ in publisher.get_subscribers(channel):
+        for line in str(data).split('\n'):
+            queue.put('data: {}\n'.format(line))
+        queue.put('\n')
+
+
+def profile_fanout(events=200):
+    for subscribers in [10, 100, 1000]:
+        for name, publish in [('per-subscriber', _publish_per_subscriber),
+                              ('encode-once', Publisher.publish)]:
+            publisher = Publisher(max_queue_size=0)
+            queues = [publisher.add_subscriber()[0] for _ in range(subscribers)]
+            time_start = time.perf_counter()
+            for _ in range(events):
+                publish(publisher, _EVENT)
+            elapsed = time.perf_counter() - time_start
+            chunks = sum(_.qsize() for _ in queues) / events / subscribers
+            print(f'{name}: {subscribers} subscribers, {elapsed / events * 1e6:.0f}us per event, '
+                  f'{chunks:.0f} chunks per subscriber')
+
+
+if __name__ == '__main__':
+    profile_fanout()
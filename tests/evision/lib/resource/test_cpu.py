@@ -0,0 +1,110 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 23:30
+# @version: 1.0
+#
+import os
+import time
+
+import pytest
+
+from evision.lib.parallel import ThreadWrapper
+from evision.lib.resource import cpu
+from evision.lib.resource.cpu import CpuAllocator, CpuTopology, get_affinity, online_cpus, select
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    """2 NUMA nodes x 2 cores x 2 SMT threads, cpu N and N + 4 are siblings"""
+    (tmp_path / 'online').write_text('0-7\n')
+    for cpu_id in range(8):
+        path = tmp_path / f'cpu{cpu_id}'
+        (path / 'topology').mkdir(parents=True)
+        (path / 'topology' / 'core_id').write_text(f'{cpu_id % 4}\n')
+        (path / 'topology' / 'physical_package_id').write_text(f'{cpu_id % 4 // 2}\n')
+        (path / f'node{cpu_id % 4 // 2}').mkdir()
+    return str(tmp_path)
+
+
+def test_topology(sysfs):
+    topology = CpuTopology.read(sysfs, allowed=set(range(8)))
+    assert topology.nodes() == {0: [0, 1, 4, 5], 1: [2, 3, 6, 7]}
+    assert len(topology.cores()) == 4
+    assert topology.siblings(1) == [1, 5]
+
+    topology = CpuTopology.read(sysfs, allowed={0, 1, 2})
+    assert topology.cpus == [0, 1, 2]
+    assert CpuTopology.read(sysfs + '/missing', allowed={0, 1}).cpus == [0, 1]
+
+
+def test_allocator(sysfs):
+    allocator = CpuAllocator(CpuTopology.read(sysfs, allowed=set(range(8))))
+    first, second = allocator.allocate(2), allocator.allocate(2)
+    # whole node for each, never sharing physical cores
+    assert first == [0, 1] and second == [2, 3]
+    assert allocator.free_cores == 0
+    assert len(allocator.allocate(1)) == 1
+    allocator.release(second)
+    assert allocator.allocate(1, node=1) in ([2], [3])
+
+    allocator = CpuAllocator(CpuTopology.read(sysfs, allowed=set(range(8))), smt=True)
+    assert allocator.allocate(1) == [0, 4]
+    with pytest.raises(ValueError):
+        allocator.allocate(1, node=3)
+
+
+class AffinityThread(ThreadWrapper):
+    def process(self):
+        self.cpus = get_affinity()
+        time.sleep(0.01)
+
+
+def test_wrapper_affinity():
+    cpus = get_affinity()
+    thread = AffinityThread(name='pinned', affinity=cpus[:1])
+    thread.start()
+    time.sleep(0.1)
+    thread.stop()
+    thread.join(1)
+    assert thread.cpus == cpus[:1]
+    # main thread not affected
+    assert get_affinity() == cpus
+
+    allocator = CpuAllocator.default()
+    free_cores = allocator.free_cores
+    thread = AffinityThread(name='reserved', affinity=1)
+    assert allocator.free_cores == max(free_cores - 1, 0)
+    thread.start()
+    time.sleep(0.05)
+    thread.stop()
+    thread.join(1)
+    assert len(thread.cpus) == 1
+    assert allocator.free_cores == free_cores
+
+
+def test_select():
+    cpus = get_affinity()
+    assert select(cpus[:1])
+    assert get_affinity() == cpus[:1]
+    assert select(None, all_=True)
+    assert set(get_affinity()) >= set(cpus)
+    os.sched_setaffinity(0, cpus)
+
+
+def test_select_all_after_pinned(sysfs, monkeypatch):
+    assert online_cpus(sysfs) == list(range(8))
+    selected = []
+    monkeypatch.setattr(CpuTopology, 'SYSFS_ROOT', sysfs)
+    monkeypatch.setattr(cpu, 'set_affinity', selected.append)
+    cpus = get_affinity()
+    try:
+        os.sched_setaffinity(0, cpus[:1])
+        assert select(None, all_=True)
+        # restored to all online CPUs, not the pinned ones
+        assert selected == [list(range(8))]
+    finally:
+        os.sched_setaffinity(0, cpus)
@@ -1,6 +1,10 @@
+import asyncio
+import gc
+import threading
+import time
 import unittest
 
-from evision.lib.sse import Publisher
+from evision.lib.sse import AsyncPublisher, Publisher, Subscriber
 
 
 class TestPublisher(unittest.TestCase):
@@ -67,6 +71,135 @@ class TestPublisher(unittest.TestCase):
         p.close()
         self.assertEqual(self.read(s), 'data: line 1\ndata: line 2')
 
+    def test_event_fields(self):
+        p = Publisher()
+        s1 = p.subscribe()
+        s2 = p.subscribe()
+        p.publish('detected\nperson', event='detection', id=7)
+        p.close()
+        expected = 'id: 7\nevent: detection\ndata: detected\ndata: person'
+        self.assertEqual(self.read(s1), expected)
+        self.assertEqual(self.read(s2), expected)
+
+    def test_shared_chunk(self):
+        p = Publisher()
+        queues = [p.add_subscriber()[0] for _ in range(3)]
+        p.publish('line 1\nline 2')
+        chunks = [queue.get_nowait() for queue in queues]
+        self.assertTrue(all(queue.empty() for queue in queues))
+        self.assertTrue(all(chunk is chunks[0] for chunk in chunks))
+
+    def test_drop_oldest(self):
+        p = Publisher(max_queue_size=2)
+        queue, properties = subscriber = p.add_subscriber(properties={'user': 1})
+        self.assertEqual(properties, {'user': 1})
+        for i in range(5):
+            p.publish(i)
+        self.assertEqual([queue.get_nowait() for _ in range(2)], ['data: 3\n\n', 'data: 4\n\n'])
+        self.assertEqual(p.stats(), [dict(channel='default channel', published=5, dropped=3,
+                                          lag=0, disconnected=False)])
+        p.close()
+        self.assertIs(queue.get_nowait(), Publisher.END_STREAM)
+        self.assertEqual(subscriber.lag, 0)
+
+    def test_disconnect(self):
+        p = Publisher(max_queue_size=2, policy=Subscriber.DISCONNECT)
+        slow = p.subscribe()
+        fast = p.add_subscriber()
+        for i in range(3):
+            p.publish(i)
+            self.assertEqual(fast.queue.get_nowait(), 'data: {}\n\n'.format(i))
+        self.assertEqual(list(p.get_subscribers()), [fast])
+        # oldest event dropped to end the stream
+        self.assertEqual(self.read(slow), 'data: 1')
+        self.assertEqual(p.stats()[0]['published'], 3)
+
+    def test_unsubscribe_on_close(self):
+        p = Publisher()
+        s1 = p.subscribe()
+        s2 = p.subscribe('another')
+        p.publish('test')
+        self.assertEqual(next(s1), 'data: test\n\n')
+        s1.close()
+        del s2
+        gc.collect()
+        self.assertEqual(list(p.get_subscribers(Publisher.ALL_CHANNELS)), [])
+
+    def test_replay(self):
+        p = Publisher(replay_size=3)
+        for i in range(5):
+            p.publish('test{}'.format(i), 'channel {}'.format(i % 2))
+        p.publish('all', Publisher.ALL_CHANNELS)
+        self.assertEqual(p.last_event_id, 6)
+        s1 = p.subscribe('channel 0', last_event_id='1')
+        s2 = p.subscribe(['channel 0', 'channel 1'], last_event_id=3)
+        s3 = p.subscribe('channel 1')
+        p.publish('test6', 'channel 1')
+        p.close()
+        self.assertEqual(self.read(s1), 'id: 3\ndata: test2\n\nid: 5\ndata: test4\n\n'
+                                        'id: 6\ndata: all')
+        self.assertEqual(self.read(s2), 'id: 4\ndata: test3\n\nid: 5\ndata: test4\n\n'
+                                        'id: 6\ndata: all\n\nid: 7\ndata: test6')
+        self.assertEqual(self.read(s3), 'id: 7\ndata: test6')
+        with self.assertRaises(ValueError):
+            p.publish('test', id=1)
+
+    def test_replay_age(self):
+        p = Publisher(replay_size=10, replay_age=0.05)
+        p.publish('old')
+        time.sleep(0.1)
+        p.publish('new')
+        s = p.subscribe(last_event_id=0)
+        p.close()
+        self.assertEqual(self.read(s), 'id: 2\ndata: new')
+
+
+class TestAsyncPublisher(unittest.TestCase):
+    def test_subscribe(self):
+        async def read(subscription):
+            return ''.join([_ async for _ in subscription]).strip()
+
+        async def main():
+            p = AsyncPublisher()
+            s1 = p.subscribe()
+            s2 = p.subscribe(initial_data=['start'])
+            readers = asyncio.gather(read(s1), read(s2))
+            p.publish('test', event='message')
+            p.close()
+            return await readers
+
+        s1, s2 = asyncio.run(main())
+        self.assertEqual(s1, 'event: message\ndata: test')
+        self.assertEqual(s2, 'data: start\n\nevent: message\ndata: test')
+
+    def test_close_subscription(self):
+        async def main():
+            p = AsyncPublisher()
+            subscription = p.subscribe()
+            p.publish_threadsafe('test')
+            self.assertEqual(await subscription.__anext__(), 'data: test\n\n')
+            waiting = asyncio.ensure_future(subscription.__anext__())
+            await asyncio.sleep(0.01)
+            subscription.close()
+            with self.assertRaises(StopAsyncIteration):
+                await waiting
+            return p
+
+        p = asyncio.run(main())
+        self.assertEqual(list(p.get_subscribers()), [])
+
+    def test_publish_threadsafe_before_subscribed(self):
+        p = AsyncPublisher(replay_size=4)
+        publisher = threading.Thread(target=p.publish_threadsafe, args=('early',))
+        publisher.start()
+        publisher.join()
+
+        async def main():
+            subscription = p.subscribe(last_event_id=0)
+            return await subscription.__anext__()
+
+        self.assertEqual(asyncio.run(main()), 'id: 1\ndata: early\n\n')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 20:40
+# @version: 1.0
+#
+import tornado.gen
+import tornado.web
+from tornado.testing import AsyncHTTPTestCase
+
+from evision.lib.parallel import ThreadWrapper
+from evision.lib.sse import AsyncPublisher
+from evision.lib.tornado.handler import PrometheusMetricsHandler, SSEHandler
+
+
+class IdleThread(ThreadWrapper):
+    def process(self):
+        pass
+
+
+class PrometheusMetricsHandlerTest(AsyncHTTPTestCase):
+    def get_app(self):
+        self.worker = IdleThread(name='idle')
+        self.worker.metrics.start()
+        self.worker.metrics.observe(0.005)
+        return tornado.web.Application([
+            (r'/metrics', PrometheusMetricsHandler, dict(workers=lambda: [self.worker]))
+        ])
+
+    def test_metrics(self):
+        response = self.fetch('/metrics')
+        self.assertEqual(response.code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+        body = response.body.decode()
+        self.assertIn('evision_worker_ticks_total{worker="idle"} 1', body)
+        self.assertIn('evision_worker_process_seconds_count{worker="idle"} 1', body)
+
+
+class SSEHandlerTest(AsyncHTTPTestCase):
+    def get_app(self):
+        self.publisher = AsyncPublisher()
+        return tornado.web.Application([
+            (r'/events', SSEHandler, dict(publisher=self.publisher, channel='detections'))
+        ])
+
+    def test_stream(self):
+        def publish():
+            self.publisher.publish('person', 'detections', event='detection', id=1)
+            self.publisher.publish('car', 'detections', event='detection', id=2)
+            self.publisher.close()
+
+        chunks = []
+        self.io_loop.call_later(0.1, publish)
+        response = self.fetch('/events', streaming_callback=chunks.append)
+        self.assertEqual(response.code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/event-stream'))
+        self.assertEqual(b''.join(chunks).decode(),
+                         'id: 1\nevent: detection\ndata: person\n\n'
+                         'id: 2\nevent: detection\ndata: car\n\n')
+
+    def test_disconnect(self):
+        self.io_loop.call_later(0.2, lambda: self.publisher.publish('ping', 'detections'))
+        with self.assertRaises(Exception):
+            self.fetch('/events', request_timeout=0.1, raise_error=True)
+        self.io_loop.run_sync(lambda: tornado.gen.sleep(0.3))
+        self.assertEqual(list(self.publisher.get_subscribers('detections')), [])
+
+    def test_last_event_id(self):
+        self.publisher.replay_size = 10
+        [self.publisher.publish(_, 'detections') for _ in ['person', 'car', 'bike']]
+        self.io_loop.call_later(0.1, self.publisher.close)
+        response = self.fetch('/events', headers={'Last-Event-ID': '1'})
+        self.assertEqual(response.body.decode(), 'id: 2\ndata: car\n\nid: 3\ndata: bike\n\n')
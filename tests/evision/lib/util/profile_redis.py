@@ -12,7 +12,9 @@ import time
 import numpy as np
 from walrus import Database
 
-from evision.lib.util.redis import RedisNdArrayQueue, RedisQueue
+from evision.lib.util import FrameEnvelope, JpegCodec, Lz4Codec, PngCodec, WebpCodec, ZlibCodec
+from evision.lib.util import _codec
+from evision.lib.util.redis import RedisFrameQueue, RedisNdArrayQueue, RedisQueue
 
 
 def profile_serialization(times=5):
@@ -22,7 +24,7 @@ def profile_serialization(times=5):
     key = f'test:serialization:{int(time.time())}'
 
     time_start = time.time_ns()
-    queue = RedisQueue(key, 24)
+    queue = RedisQueue(key, 24, need_list_obj=False)
     [queue.put(frame) for frame in frames]
     [queue.get() for _ in range(times)]
     queue.destroy()
@@ -44,5 +46,47 @@ def profile_serialization(times=5):
     print(f'Using np.tobuffer: {elapsed / 1000000000}s, avg: {elapsed / times / 1000000}ms')
 
 
+def _camera_like_frame(shape=(1080, 1920, 3)):
+    """Smooth gradient with sensor noise, closer to camera frames than random data"""
+    height, width, channels = shape
+    gradient = np.add.outer(np.linspace(0, 127, height), np.linspace(0, 127, width))
+    frame = np.dstack([gradient] * channels) + np.random.normal(0, 4, shape)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def profile_codecs(times=20):
+    frame = _camera_like_frame()
+    codecs = [None, ZlibCodec(), PngCodec(), JpegCodec(90), JpegCodec(75), WebpCodec(75)]
+    if _codec.lz4_frame is not None:
+        codecs.insert(1, Lz4Codec())
+    key = f'test:codec:{int(time.time())}'
+
+    print(f'Frame of {frame.shape}, {frame.nbytes / 1024:.1f}KB, {times} times')
+    for codec in codecs:
+        name = str(codec or 'raw')
+        if hasattr(codec, 'quality'):
+            name += f'({codec.quality})'
+
+        time_start = time.perf_counter()
+        packed = [FrameEnvelope.pack(frame, codec=codec) for _ in range(times)][-1]
+        encode_time = (time.perf_counter() - time_start) / times
+
+        time_start = time.perf_counter()
+        [FrameEnvelope.unpack(packed) for _ in range(times)]
+        decode_time = (time.perf_counter() - time_start) / times
+
+        writer = RedisFrameQueue(key, 24, codec=codec)
+        time_start = time.perf_counter()
+        for _ in range(times):
+            writer.put(frame)
+            writer.peek()
+        fps = times / (time.perf_counter() - time_start)
+        writer.destroy()
+
+        print(f'{name:>10}: encode {encode_time * 1000:7.2f}ms, decode {decode_time * 1000:7.2f}ms, '
+              f'{len(packed) / 1024:8.1f}KB on wire, {fps:6.1f} fps end-to-end')
+
+
 if __name__ == '__main__':
     profile_serialization()
+    profile_codecs()
@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 14:05
+# @version: 1.0
+#
+import numpy as np
+import pytest
+
+from evision.lib.util import Codec, FrameEnvelope, JpegCodec, PngCodec, WebpCodec, ZlibCodec
+from evision.lib.util import _codec
+
+
+def _frame():
+    x = np.linspace(0, 255, 64, dtype=np.uint8)
+    return np.dstack([np.tile(x, (48, 1))] * 3)
+
+
+@pytest.mark.parametrize('codec', [ZlibCodec(), PngCodec()])
+def test_lossless(codec):
+    frame = _frame()
+    header, decoded = FrameEnvelope.unpack(FrameEnvelope.pack(frame, codec=codec))
+    assert header.codec == codec.codec_id
+    assert header.nbytes < frame.nbytes
+    assert (decoded == frame).all()
+
+
+@pytest.mark.parametrize('codec', [JpegCodec(quality=95), WebpCodec(quality=95)])
+def test_lossy(codec):
+    frame = _frame()
+    header, decoded = FrameEnvelope.unpack(FrameEnvelope.pack(frame, codec=codec))
+    assert decoded.shape == frame.shape
+    assert np.abs(decoded.astype(np.int16) - frame).mean() < 4
+    with pytest.raises(ValueError):
+        codec.encode(frame.astype(np.float32))
+
+
+@pytest.mark.skipif(_codec.lz4_frame is None, reason='lz4 not installed')
+def test_lz4():
+    frame = _frame()
+    header, decoded = FrameEnvelope.unpack(FrameEnvelope.pack(frame, codec=Codec.get(2)))
+    assert (decoded == frame).all()
+
+
+def test_get():
+    assert isinstance(Codec.get(1), ZlibCodec)
+    with pytest.raises(ValueError):
+        Codec.get(255)
@@ -7,7 +7,7 @@
 # @date: 2019-10-31 09:47
 # @version: 1.0
 #
-from evision.lib.util import DictUtil
+from evision.lib.util import DictUtil, SequencedQueue
 
 
 def test_filter_values():
@@ -31,3 +31,15 @@ def test_filter_values():
     map = {1: [Dummy(2), Dummy(3)], 2: [Dummy(4)]}
     filtered_map = DictUtil.filter_values(map, Dummy.is_odd)
     assert filtered_map == {1: [Dummy(3), ]}
+
+
+def test_sequenced_queue():
+    queue = SequencedQueue()
+    [queue.put(_) for _ in range(5)]
+    assert queue.sequence == 5
+    assert queue.get() == 0
+    assert queue.sequence == 5
+    with queue.mutex:
+        assert queue.newest(2) == [3, 4]
+        assert queue.newest(10) == [1, 2, 3, 4]
+        assert queue.newest(0) == []
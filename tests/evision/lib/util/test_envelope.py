@@ -0,0 +1,60 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 11:30
+# @version: 1.0
+#
+import numpy as np
+import pytest
+
+from evision.lib.util import FrameEnvelope
+
+
+def test_pack_and_unpack():
+    frame = np.arange(2 * 3 * 4, dtype=np.uint16).reshape((2, 3, 4))
+    buffer = FrameEnvelope.pack(frame, frame_id=7, source_id=3, timestamp=1.5)
+    assert len(buffer) == FrameEnvelope.HEADER_SIZE + frame.nbytes
+
+    header, decoded = FrameEnvelope.unpack(buffer)
+    assert header.shape == (2, 3, 4)
+    assert header.dtype == np.uint16
+    assert (header.frame_id, header.source_id, header.timestamp) == (7, 3, 1.5)
+    assert header.nbytes == frame.nbytes
+    assert (decoded == frame).all()
+    assert not decoded.flags.writeable
+
+
+def test_str_ids():
+    frame = np.arange(12, dtype=np.uint8).reshape((3, 4))
+    buffer = FrameEnvelope.pack(frame, frame_id='frame-7', source_id='相机-01', timestamp=1.5)
+    header, decoded = FrameEnvelope.unpack(buffer)
+    assert (header.frame_id, header.source_id, header.timestamp) == ('frame-7', '相机-01', 1.5)
+    assert header.shape == (3, 4) and (decoded == frame).all()
+
+    header, decoded = FrameEnvelope.unpack(FrameEnvelope.pack(frame, frame_id=7, source_id='camera'))
+    assert (header.frame_id, header.source_id) == (7, 'camera')
+    assert (decoded == frame).all()
+    with pytest.raises(ValueError):
+        FrameEnvelope.unpack(buffer[:FrameEnvelope.HEADER_SIZE + 3])
+
+
+def test_non_contiguous():
+    frame = np.arange(24, dtype=np.float32).reshape((4, 6))[:, ::2]
+    header, decoded = FrameEnvelope.unpack(FrameEnvelope.pack(frame))
+    assert header.shape == (4, 3)
+    assert (decoded == frame).all()
+
+
+def test_invalid_envelope():
+    buffer = FrameEnvelope.pack(np.zeros((2, 2), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        FrameEnvelope.unpack(buffer[:10])
+    with pytest.raises(ValueError):
+        FrameEnvelope.unpack(buffer[:-1])
+    with pytest.raises(ValueError):
+        FrameEnvelope.unpack(b'XX' + buffer[2:])
+    with pytest.raises(ValueError):
+        FrameEnvelope.pack(np.zeros((1,) * 5))
@@ -0,0 +1,36 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 16:50
+# @version: 1.0
+#
+from evision.lib.util import ConsistentHashRing
+
+
+def test_get():
+    assert ConsistentHashRing().get('key') is None
+    ring = ConsistentHashRing(['a', 'b', 'c'])
+    assert len(ring) == 3 and 'a' in ring
+    keys = [f'camera:{_}' for _ in range(3000)]
+    owners = [ring.get(key) for key in keys]
+    assert owners == [ring.get(key) for key in keys]
+    for node in ['a', 'b', 'c']:
+        assert 600 < owners.count(node) < 1400
+
+
+def test_remap():
+    ring = ConsistentHashRing(['a', 'b', 'c'])
+    keys = [f'camera:{_}' for _ in range(3000)]
+    owners = {key: ring.get(key) for key in keys}
+
+    ring.add('d')
+    moved = [key for key in keys if ring.get(key) != owners[key]]
+    assert all(ring.get(key) == 'd' for key in moved)
+    assert len(moved) < 1200
+
+    ring.remove('d')
+    assert owners == {key: ring.get(key) for key in keys}
+    assert ring.nodes == ['a', 'b', 'c']
@@ -7,12 +7,22 @@
 # @date: 2019-11-20 16:45
 # @version: 1.0
 #
+import asyncio
 import pickle
+import threading
 import time
 
+import numpy as np
+import pytest
 from walrus import Database
 
-from evision.lib.util.redis import RedisQueue
+from evision.lib.entity import ImageFrame
+from evision.lib.sse import Publisher
+from evision.lib.util import PngCodec, SequencedQueue, ZlibCodec
+from evision.lib.util.redis import RedisFrameQueueReader, RedisFrameQueueWriter, RedisNdArrayQueue, RedisQueue
+from evision.lib.util.redis import AsyncRedisFrameQueue, AsyncRedisQueue, RedisConnectionRegistry, RedisQueueMirror
+from evision.lib.util.redis import LocalPubSubBroker, PublisherBridge, RedisPubSubBroker
+from evision.lib.util.redis import RedisMailboxReader, RedisMailboxWriter, RedisStreamQueue
 
 __test_key__ = f'redis-test-{time.time()}'
 
@@ -22,6 +32,15 @@ def remove_key(key):
         Database().delete(key)
 
 
+def wait_until(condition, timeout=1.):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
 class TestRedisQueue(object):
     def setup_class(self):
         remove_key(__test_key__)
@@ -74,6 +93,40 @@ class TestRedisQueue(object):
         assert self.queue.lrange(5) == (5, [1, 2, 3, 4, 5])
         assert self.queue.lrange(100) == (5, [1, 2, 3, 4, 5])
 
+    def test_put_many(self):
+        queue = RedisQueue(__test_key__, 3, need_list_obj=False)
+        queue.put_many([1, 2, 3, 4, 5])
+        assert queue.size() == 4
+        assert queue.get(4) == [5, 4, 3, 2]
+
+    def test_get_many(self):
+        self.val_queue.extend([pickle.dumps(_) for _ in [1, 2, 3]])
+        assert self.queue.get_many(3) == [1, 2, 3]
+        assert self.queue.get_many(4) is None
+        time_start = time.perf_counter()
+        assert self.queue.get_many(4, block=True, timeout=0.1) is None
+        assert time.perf_counter() - time_start >= 0.1
+
+    def test_pop(self):
+        queue = RedisQueue(__test_key__ + '-pop', 10, need_list_obj=False)
+        queue.put_many([1, 2])
+        assert queue.pop() == 1
+        assert queue.pop(block=False) == 2
+        assert queue.pop(block=False) is None
+        assert queue.pop(timeout=0.05) is None
+
+    def test_codec(self):
+        queue = RedisQueue(__test_key__, 10, need_list_obj=False, codec=ZlibCodec())
+        queue.put(dict(a=1, b='b' * 100))
+        assert len(self.val_queue[0]) < 100
+        assert queue.peek() == dict(a=1, b='b' * 100)
+
+    def test_codec_list_obj(self):
+        queue = RedisQueue(__test_key__, 10, codec=ZlibCodec())
+        queue.put_many([dict(a=1, b='b' * 100), dict(a=2, b='b' * 100)])
+        assert len(self.val_queue[0]) < 100
+        assert queue.get_many(2) == [dict(a=2, b='b' * 100), dict(a=1, b='b' * 100)]
+
     def test_destroy(self):
         mock_key = 'another-' + __test_key__
         queue = RedisQueue(mock_key, 10)
@@ -82,3 +135,295 @@ class TestRedisQueue(object):
         assert queue.size() == 1
         queue.destroy()
         assert not Database().exists(mock_key)
+
+
+class TestRedisConnectionRegistry(object):
+    def test_shared_client(self):
+        client = RedisConnectionRegistry.get_client()
+        assert RedisConnectionRegistry.get_client() is client
+        assert RedisConnectionRegistry.get_client(db=1) is not client
+        assert RedisQueue('a-' + __test_key__).client is client
+        assert client.ping()
+
+    def test_fork(self):
+        client = RedisConnectionRegistry.get_client()
+        pid = RedisConnectionRegistry._pid
+        RedisConnectionRegistry._pid = -1
+        try:
+            forked = RedisConnectionRegistry.get_client()
+            assert forked is not client
+            assert RedisConnectionRegistry._pid == pid
+        finally:
+            RedisConnectionRegistry.reset()
+
+    def test_url_overridden(self, monkeypatch):
+        monkeypatch.setenv('REDIS_URL', 'redis://localhost:6379/0')
+        try:
+            client = RedisConnectionRegistry.get_client(db=1)
+            assert client is not RedisConnectionRegistry.get_client()
+            assert client.connection_pool.connection_kwargs['db'] == 1
+            assert RedisConnectionRegistry.get_client(db=1, password='secret') \
+                .connection_pool.connection_kwargs['password'] == 'secret'
+        finally:
+            RedisConnectionRegistry.reset()
+
+    def test_pool_exhausted(self):
+        max_connections = RedisConnectionRegistry.max_connections
+        RedisConnectionRegistry.reset()
+        RedisConnectionRegistry.configure(max_connections=1, pool_timeout=5)
+        try:
+            client = RedisConnectionRegistry.get_client()
+            pool = client.connection_pool
+            connection = pool.get_connection('PING')
+            threading.Timer(0.2, pool.release, (connection,)).start()
+            # waits for the held connection instead of raising
+            assert client.ping()
+        finally:
+            RedisConnectionRegistry.configure(max_connections=max_connections, pool_timeout=20)
+            RedisConnectionRegistry.reset()
+
+
+class TestRedisNdArrayQueue(object):
+    def teardown_method(self):
+        remove_key(__test_key__)
+
+    def test_get_many_into(self):
+        queue = RedisNdArrayQueue(__test_key__, 10, (2, 3))
+        queue.put_many([np.full((2, 3), _, dtype=np.uint8) for _ in range(4)])
+        batch = np.full((8, 2, 3), 255, dtype=np.uint8)
+        frames = queue.get_many(3, out=batch)
+        assert frames.shape == (3, 2, 3) and np.shares_memory(frames, batch)
+        assert [int(_[0, 0]) for _ in batch[:3]] == [3, 2, 1]
+        # rows beyond `n` untouched
+        assert (batch[3:] == 255).all()
+
+
+class TestRedisFrameQueue(object):
+    def teardown_method(self):
+        remove_key(__test_key__)
+
+    def test_mixed_shapes(self):
+        writer = RedisFrameQueueWriter(__test_key__, 10)
+        reader = RedisFrameQueueReader(__test_key__, 10)
+        writer.put(np.ones((4, 6, 3), dtype=np.uint8))
+        writer.put(np.zeros((2, 3), dtype=np.float32))
+        assert reader.size() == 2
+        latest, earliest = reader.get(2)
+        assert latest.shape == (2, 3) and latest.dtype == np.float32
+        assert earliest.shape == (4, 6, 3) and (earliest == 1).all()
+
+    def test_image_frame(self):
+        writer = RedisFrameQueueWriter(__test_key__, 10)
+        reader = RedisFrameQueueReader(__test_key__, 10, with_header=True)
+        frame = ImageFrame(3, 42, np.ones((4, 6, 3), dtype=np.uint8))
+        writer.put(frame)
+        header, decoded = reader.peek()
+        assert (header.source_id, header.frame_id) == (3, 42)
+        assert header.timestamp == frame.timestamp
+        assert (decoded == frame.frame).all()
+
+        writer.put(ImageFrame('camera-01', 'frame-7', np.ones((4, 6, 3), dtype=np.uint8)))
+        header, decoded = reader.peek()
+        assert (header.source_id, header.frame_id) == ('camera-01', 'frame-7')
+        assert decoded.shape == (4, 6, 3)
+
+    def test_codec(self):
+        writer = RedisFrameQueueWriter(__test_key__, 10, codec=PngCodec())
+        reader = RedisFrameQueueReader(__test_key__, 10)
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        writer.put(frame)
+        assert len(Database().List(__test_key__)[0]) < frame.nbytes
+        assert (reader.peek() == frame).all()
+
+
+class TestRedisStreamQueue(object):
+    def teardown_method(self):
+        remove_key(__test_key__)
+
+    def test_queue(self):
+        queue = RedisStreamQueue(__test_key__, 3)
+        assert queue.empty()
+        assert queue.peek() is None
+        queue.put_many([1, 2, 3])
+        queue.put(4)
+        assert queue.peek() == 4
+        assert queue.get(2) == [4, 3]
+        assert queue.get(10) is None
+        size, frames = queue.lrange(2)
+        assert size == queue.size() and frames == [4, 3]
+
+    def test_consumer_group(self):
+        queue = RedisStreamQueue(__test_key__, 10, group='detectors', consumer='a')
+        queue.create_group()
+        queue.create_group()
+        queue.put_many([1, 2, 3])
+
+        entries = queue.read(2)
+        assert [frame for _, frame in entries] == [1, 2]
+        another = RedisStreamQueue(__test_key__, 10, group='detectors', consumer='b')
+        assert [frame for _, frame in another.read(10, timeout=0.01)] == [3]
+        assert another.read(10, timeout=0.01) == []
+
+        assert queue.ack(entries[0][0]) == 1
+        assert len(queue.pending()) == 2
+        time.sleep(0.02)
+        reclaimed = another.reclaim(0.01)
+        assert sorted(frame for _, frame in reclaimed) == [2, 3]
+        assert {_['consumer'] for _ in queue.pending()} == {b'b'}
+
+        queue.put(4)
+        assert queue.pop(timeout=0.1) == 4
+        assert queue.pop(block=False) is None
+        assert len(queue.pending()) == 2
+
+
+class TestRedisMailbox(object):
+    def teardown_method(self):
+        remove_key(__test_key__)
+
+    def test_latest_frame(self):
+        writer = RedisMailboxWriter(__test_key__)
+        reader = RedisMailboxReader(__test_key__)
+        assert reader.empty()
+        assert reader.fetch() is None
+        assert writer.put(1) == 1
+        assert reader.fetch() == 1
+        assert reader.fetch() is None
+        assert reader.peek() == 1 and reader.size() == 1
+
+        assert writer.put_many([2, 3, 4]) == 4
+        writer.put(5)
+        assert reader.fetch() == 5
+        assert reader.get() == [5]
+        # frames 2, 3 and 4 never fetched
+        assert reader.stats() == dict(version=5, received=2, dropped=3, stale=2)
+
+    def test_ndarray(self):
+        writer = RedisMailboxWriter(__test_key__, codec=ZlibCodec())
+        reader = RedisMailboxReader(__test_key__, codec=ZlibCodec())
+        frame = np.arange(24, dtype=np.uint8).reshape(2, 4, 3)
+        writer.put(frame)
+        assert (reader.fetch() == frame).all()
+
+
+class TestAsyncRedisQueue(object):
+    def teardown_method(self):
+        remove_key(__test_key__)
+
+    def test_queue(self):
+        async def _test():
+            queue = AsyncRedisQueue(__test_key__, 10)
+            assert await queue.empty()
+            assert await queue.peek() is None
+            await queue.put_many([1, 2])
+            await queue.put(3)
+            assert await queue.size() == 3
+            assert await queue.peek() == 3
+            assert await queue.get(2) == [3, 2]
+            assert await queue.get_many(4, block=True, timeout=0.05) is None
+            assert await queue.lrange(5) == (3, [3, 2, 1])
+            await queue.destroy()
+            assert await queue.empty()
+
+        asyncio.run(_test())
+        # shares serialization with synchronous queues
+        RedisQueue(__test_key__, 10, need_list_obj=False).put('a')
+        assert asyncio.run(AsyncRedisQueue(__test_key__, 10).peek()) == 'a'
+
+    def test_frame_queue(self):
+        writer = RedisFrameQueueWriter(__test_key__, 10, codec=ZlibCodec())
+        writer.put(np.ones((4, 6, 3), dtype=np.uint8))
+        frame = asyncio.run(AsyncRedisFrameQueue(__test_key__, 10).peek())
+        assert frame.shape == (4, 6, 3) and (frame == 1).all()
+
+
+class TestRedisQueueMirror(object):
+    def teardown_method(self):
+        remove_key(__test_key__)
+
+    def test_mirror(self):
+        queue = SequencedQueue()
+        target = RedisQueue(__test_key__, 10, need_list_obj=False)
+        mirror = RedisQueueMirror(queue, target, timeout=10)
+        mirror.start()
+        [queue.put(_) for _ in range(3)]
+        time_start = time.perf_counter()
+        while target.size() < 3 and time.perf_counter() - time_start < 1:
+            time.sleep(0.01)
+        assert target.get(3) == [2, 1, 0]
+
+        queue.get()
+        queue.put(3)
+        time_start = time.perf_counter()
+        while target.size() < 4 and time.perf_counter() - time_start < 1:
+            time.sleep(0.01)
+        assert target.get(4) == [3, 2, 1, 0]
+
+        mirror.stop()
+        mirror.join(1)
+        assert not mirror.is_alive()
+
+    def test_mirror_none(self):
+        target = RedisQueue(__test_key__, 10, need_list_obj=False)
+        mirror = RedisQueueMirror(None, target, poll_interval=0.01)
+        mirror.start()
+        time.sleep(0.1)
+        assert mirror.is_alive() and target.empty()
+        mirror.stop()
+        mirror.join(1)
+        assert not mirror.is_alive()
+
+
+@pytest.mark.parametrize('broker_class', [LocalPubSubBroker, RedisPubSubBroker])
+def test_publisher_bridge(broker_class):
+    broker = broker_class()
+    publishers = [Publisher(), Publisher()]
+    queues = [_.add_subscriber('detections').queue for _ in publishers]
+    bridges = [PublisherBridge(_, broker, topic=__test_key__, batch_size=3, flush_interval=0.05)
+               for _ in publishers]
+    [_.start() for _ in bridges]
+    try:
+        time.sleep(0.1)
+        # one batch sent, once full
+        [bridges[0].publish(f'person {_}', 'detections', event='detection') for _ in range(3)]
+        assert bridges[0].sent == 3 and bridges[0].pending() == 0
+        # sent after flush interval
+        bridges[1].publish('car', 'detections')
+        for queue in queues:
+            chunks = [queue.get(timeout=1) for _ in range(4)]
+            assert chunks == [f'event: detection\ndata: person {_}\n\n' for _ in range(3)] \
+                + ['data: car\n\n']
+        assert all(_.received == 4 for _ in bridges)
+        with pytest.raises(TypeError):
+            bridges[0].publish(lambda properties: properties)
+    finally:
+        [_.stop() for _ in bridges]
+        [_.join(1) for _ in bridges]
+        remove_key(f'{__test_key__}:event-id')
+
+
+@pytest.mark.parametrize('broker_class', [LocalPubSubBroker, RedisPubSubBroker])
+def test_publisher_bridge_event_ids(broker_class):
+    broker = broker_class()
+    publishers = [Publisher(replay_size=10), Publisher(replay_size=10)]
+    bridges = [PublisherBridge(publishers[0], broker, topic=__test_key__, flush_interval=0.01)]
+    bridges[0].start()
+    try:
+        bridges[0].publish('before')
+        assert wait_until(lambda: bridges[0].received == 1)
+        # second process started later, with its own publisher
+        bridges.append(PublisherBridge(publishers[1], broker, topic=__test_key__,
+                                       flush_interval=0.01))
+        bridges[1].start()
+        time.sleep(0.05)
+        [bridges[1].publish(_) for _ in ('a', 'b')]
+        assert wait_until(lambda: bridges[0].received == 3 and bridges[1].received == 2)
+        # resumed on either process with the same ids
+        for publisher in publishers:
+            subscriber = publisher.add_subscriber(last_event_id=1)
+            assert [subscriber.queue.get(timeout=1) for _ in range(2)] == \
+                ['id: 2\ndata: a\n\n', 'id: 3\ndata: b\n\n']
+    finally:
+        [_.stop() for _ in bridges]
+        [_.join(1) for _ in bridges]
+        remove_key(f'{__test_key__}:event-id')
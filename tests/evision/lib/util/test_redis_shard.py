@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 17:05
+# @version: 1.0
+#
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import time
+
+import pytest
+from redis import Redis
+
+from evision.lib.util.redis import AsyncRedisQueue, RedisConnectionRegistry, RedisQueue, RedisShardRouter
+
+REDIS_SERVER = os.getenv('REDIS_SERVER', shutil.which('redis-server'))
+
+
+class LocalRedisServers(object):
+    """Launch a few throwaway `redis-server` processes on free local ports"""
+
+    def __init__(self, count=3):
+        self.count = count
+        self.ports = []
+        self.processes = []
+
+    @staticmethod
+    def _free_port():
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    @property
+    def urls(self):
+        return [f'redis://127.0.0.1:{port}/0' for port in self.ports]
+
+    def start(self):
+        for _ in range(self.count):
+            port = self._free_port()
+            self.processes.append(subprocess.Popen(
+                [REDIS_SERVER, '--port', str(port), '--save', '', '--appendonly', 'no'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            self.ports.append(port)
+        for port in self.ports:
+            self._wait(port)
+        return self
+
+    @staticmethod
+    def _wait(port, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if Redis(port=port).ping():
+                    return
+            except Exception:
+                time.sleep(0.05)
+        raise TimeoutError(f'redis-server not started on port {port}')
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+            process.wait(5)
+
+
+@pytest.fixture(scope='module')
+def servers():
+    if not REDIS_SERVER:
+        pytest.skip('redis-server not available')
+    servers = LocalRedisServers().start()
+    yield servers
+    servers.stop()
+    RedisConnectionRegistry.configure(shards=[])
+    RedisConnectionRegistry.reset()
+
+
+def test_bind_to_shard(servers):
+    RedisConnectionRegistry.configure(shards=servers.urls)
+    router = RedisConnectionRegistry.router
+    keys = [f'shard-test:{_}' for _ in range(30)]
+    for key in keys:
+        RedisQueue(key, 10, need_list_obj=False).put(key)
+
+    for key in keys:
+        owner = Redis.from_url(router.get(key))
+        assert owner.exists(key)
+        assert RedisQueue(key, 10, need_list_obj=False).peek() == key
+    assert len({router.get(key) for key in keys}) == len(servers.urls)
+
+
+def test_rebalance(servers):
+    router = RedisShardRouter(servers.urls[:2])
+    RedisConnectionRegistry.router = router
+    keys = [f'rebalance-test:{_}' for _ in range(30)]
+    for key in keys:
+        RedisQueue(key, 10, need_list_obj=False).put(key)
+
+    added, removed = router.rebalance(servers.urls)
+    assert added == {servers.urls[2]} and not removed
+    moved = [key for key in keys if router.get(key) != router.previous.get(key)]
+    assert moved
+    # not migrated yet, found on previous shard
+    for key in moved:
+        assert router.locate(key) == router.previous.get(key)
+        assert RedisQueue(key, 10, need_list_obj=False).peek() == key
+        assert asyncio.run(AsyncRedisQueue(key, 10).peek()) == key
+
+    for key in moved:
+        assert router.migrate(key)
+        assert router.locate(key) == router.get(key)
+        assert RedisQueue(key, 10, need_list_obj=False).peek() == key
+    router.finish_rebalance()
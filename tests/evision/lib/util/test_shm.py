@@ -0,0 +1,187 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019 eVision.ai Inc. All Rights Reserved.
+#
+# @author: Chen Shijiang(chenshijiang@evision.ai)
+# @date: 2026-10-17 10:40
+# @version: 1.0
+#
+import multiprocessing
+import time
+
+import numpy as np
+import pytest
+from pydantic import BaseModel
+
+from evision.lib.util import shm
+from evision.lib.util.shm import SharedMemoryNdArrayQueueReader, SharedMemoryNdArrayQueueWriter
+
+pytestmark = pytest.mark.skipif(shm.shared_memory is None,
+                                reason='multiprocessing.shared_memory not available')
+
+
+class Feature(BaseModel):
+    label: str
+    vector: np.ndarray
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+__test_key__ = f'shm-test-{time.time()}'
+__shape__ = (4, 6, 3)
+
+
+def _frame(value):
+    return np.full(__shape__, value, dtype=np.uint8)
+
+
+class TestSharedMemoryNdArrayQueue(object):
+    def setup_method(self):
+        self.writer = SharedMemoryNdArrayQueueWriter(__test_key__, 3, __shape__)
+        self.reader = SharedMemoryNdArrayQueueReader(__test_key__)
+
+    def teardown_method(self):
+        self.reader.close()
+        self.writer.destroy()
+
+    def test_attach(self):
+        assert self.reader.frame_shape == __shape__
+        assert self.reader.dtype == np.uint8
+        assert self.reader.queue_size == 3
+        with pytest.raises(ValueError):
+            SharedMemoryNdArrayQueueReader(__test_key__, frame_shape=(1, 2, 3))
+        with pytest.raises(FileNotFoundError):
+            SharedMemoryNdArrayQueueReader('another-' + __test_key__)
+
+    def test_put_and_peek(self):
+        assert self.reader.empty()
+        assert self.reader.peek() is None
+        self.writer.put(_frame(1))
+        assert not self.reader.empty()
+        assert self.reader.size() == 1
+        assert (self.reader.peek() == 1).all()
+        self.writer.put(_frame(2))
+        assert (self.reader.peek() == 2).all()
+        with pytest.raises(ValueError):
+            self.writer.put(np.zeros((2, 2, 3), dtype=np.uint8))
+        # never cast silently, e.g. 300.7 stored as 44
+        with pytest.raises(ValueError):
+            self.writer.put(np.full(__shape__, 300.7))
+        assert (self.reader.peek() == 2).all()
+
+    def test_attach_in_creator(self, monkeypatch):
+        unregistered = []
+        monkeypatch.setattr(shm.resource_tracker, 'unregister',
+                            lambda *args: unregistered.append(args))
+        # registered once by the writer, unregistered by its destroy() only
+        SharedMemoryNdArrayQueueReader(__test_key__).close()
+        assert unregistered == []
+
+    def test_get_and_lrange(self):
+        [self.writer.put(_frame(_)) for _ in range(5)]
+        assert self.reader.size() == 3
+        assert [int(_[0, 0, 0]) for _ in self.reader.get(3)] == [4, 3, 2]
+        assert self.reader.get(4) is None
+        size, frames = self.reader.lrange(10)
+        assert size == 3
+        assert [int(_[0, 0, 0]) for _ in frames] == [4, 3, 2]
+
+    def test_zero_copy(self):
+        self.writer.put(_frame(1))
+        frame = self.reader.peek()
+        assert not frame.flags.writeable
+        assert not frame.flags.owndata
+        [self.writer.put(_frame(_)) for _ in range(2, 5)]
+        # slot reused by writer after wrapping around the ring
+        assert (frame == 4).all()
+
+        copy_reader = SharedMemoryNdArrayQueueReader(__test_key__, copy=True)
+        frame = copy_reader.peek()
+        self.writer.put(_frame(5))
+        assert (frame == 4).all()
+        copy_reader.close()
+
+
+def _send_results(channel, count):
+    for i in range(count):
+        channel.put(dict(track_id=i, feature=np.full(128, i, dtype=np.float32),
+                         crop=np.full((8, 8, 3), i, dtype=np.uint8)), timeout=5)
+    channel.put(np.arange(4))
+    channel.put(dict(feature=np.ones(1024)))
+    channel.close()
+
+
+class TestSharedMemoryResultChannel(object):
+    def setup_method(self):
+        self.channel = shm.SharedMemoryResultChannel(slots=2, slot_size=4096)
+
+    def teardown_method(self):
+        self.channel.destroy()
+
+    def test_put_and_release(self):
+        assert self.channel.put(dict(score=0.9, feature=np.ones(16)))
+        assert self.channel.put(dict(score=0.8, feature=np.ones(16) * 2))
+        # all slots taken until released
+        assert not self.channel.put(dict(feature=np.ones(16)), timeout=0.05)
+
+        result = self.channel.get(timeout=1)
+        assert result.record['score'] == 0.9 and (result.record['feature'] == 1).all()
+        feature = result.record['feature']
+        assert not feature.flags.writeable and not feature.flags.owndata
+        result.release()
+        assert result.released
+        assert self.channel.put(dict(feature=np.ones(16) * 3), timeout=0.05)
+
+        with self.channel.get(timeout=1) as result:
+            assert (result.record['feature'] == 2).all()
+        # slot reused after released
+        assert self.channel.put(dict(feature=np.ones(16) * 4), timeout=0.05)
+        assert (feature == 3).all()
+
+    def test_inline_and_plain_records(self):
+        assert self.channel.put(dict(feature=np.ones(1024), label='person'))
+        assert self.channel.put(dict(label='car'))
+        result = self.channel.get(timeout=1)
+        assert result.record['feature'].flags.writeable and result.slot is None
+        assert self.channel.inlined == 1
+        assert self.channel.get(timeout=1).record == dict(label='car')
+        assert self.channel.get(timeout=0.01) is None
+        with pytest.raises(TypeError):
+            self.channel.put('text')
+
+    def test_destroy_after_close(self):
+        self.channel.close()
+        self.channel.destroy()
+        with pytest.raises(FileNotFoundError):
+            shm.shared_memory.SharedMemory(name=self.channel.name)
+
+    def test_model(self):
+        assert self.channel.put(Feature(label='face', vector=np.arange(8)))
+        with self.channel.get(timeout=1) as result:
+            assert isinstance(result.record, Feature) and result.record.label == 'face'
+            assert list(result.record.vector) == list(range(8))
+            assert not result.record.vector.flags.writeable
+
+    @pytest.mark.parametrize('start_method', ['fork', 'spawn'])
+    def test_processes(self, start_method):
+        context = multiprocessing.get_context(start_method)
+        channel = shm.SharedMemoryResultChannel(slots=4, slot_size=4096, context=context)
+        try:
+            process = context.Process(target=_send_results, args=(channel, 20))
+            process.start()
+            for i in range(20):
+                with channel.get(timeout=10) as result:
+                    assert result.record['track_id'] == i
+                    assert (result.record['feature'] == i).all()
+                    assert result.record['crop'].shape == (8, 8, 3)
+            with channel.get(timeout=10) as result:
+                assert list(result.record) == [0, 1, 2, 3]
+            assert channel.get(timeout=10).record['feature'].shape == (1024,)
+            # counted by the worker, read by the parent
+            assert channel.inlined == 1
+            process.join(5)
+            assert process.exitcode == 0
+        finally:
+            channel.destroy()